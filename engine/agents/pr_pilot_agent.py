@@ -1,9 +1,7 @@
 import logging
-import os
-import shlex
-import subprocess
+import re
 from pathlib import Path
-from typing import Optional, Union, List, Dict
+from typing import Optional, Union, List, Dict, Iterator
 
 from django.conf import settings
 from github import Github
@@ -19,6 +17,7 @@ from langchain_core.prompts import (
     HumanMessagePromptTemplate,
     PromptTemplate,
 )
+from langchain_core.pydantic_v1 import BaseModel, Field
 from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
 
@@ -32,12 +31,13 @@ from engine.agents.github_agent import (
     remove_label_from_issue,
 )
 from engine.agents.web_search_agent import scrape_website
-from engine.file_system import FileSystem
+from engine.file_system.edits import EditError, apply_edits, parse_edits, unified_diff
+from engine.file_system.transaction import FileTransaction, TransactionError
 from engine.langchain.cost_tracking import CostTrackerCallback
 from engine.models.task import Task
 from engine.models.task_event import TaskEvent
 from engine.project import Project
-from engine.util import replace_string_in_directory_path
+from engine.repository import Workspace
 
 logger = logging.getLogger(__name__)
 
@@ -55,7 +55,9 @@ All issues, PR, files and code you have access to are in the context of the `{gi
 
 # How to handle user requests
 - If the user mentions files, you can read them using the `read_files` function
-- If the user mentions classes, methods, etc in the code, you can find them using the `search_for_code_snippets` function
+- If the user mentions classes, methods, etc in the code, find where they are defined and used with the `find_symbol` function
+- To find other text in the code, use the `search_for_code_snippets` function
+- To find the files that deal with a topic (e.g. "billing"), use the `find_relevant_files` function
 - If necessary, search the internet to make sure your answers are accurate
 - Keep your answers short and to the point, unless the user asks for a detailed explanation
 - If your answer is based on internet research, make sure to mention the source
@@ -66,7 +68,11 @@ Never return the code changes in your response.
 
 # How to handle files
 - Reading files is EXPENSIVE. Only read the files you really need to solve the task
-- When writing files, ALWAYS write the entire file content, do not leave anything out.
+- For large files, get their structure with `outline_file`, then read only the lines you need using `read_file_lines`
+- To see the code around search matches, set `context_lines` in `search_for_code_snippets` instead of reading the whole files
+- To change existing files, use `edit_file` with search/replace blocks
+- To change several files at once, e.g. in a refactoring, use `apply_file_changes`
+- When writing files with `write_file`, ALWAYS write the entire file content, do not leave anything out.
 
 # How to handle Github issues and PRs
 - When creating a new issue, include a link back to the original issue or PR in the body
@@ -78,6 +84,7 @@ template = """
 # Hints for you to better understand the project
 {pilot_hints}
 
+{repository_map}
 # User Request
 {user_request}
 """
@@ -86,51 +93,58 @@ template = """
 @tool
 def delete_file(path: str):
     """Delete a file from the repository."""
-    fs = FileSystem()
-    if not fs.get_node(Path(path)):
+    file_system = Workspace.current().file_system
+    if not file_system.get_node(Path(path)):
         return f"File not found: `{path}`"
-    TaskEvent.add(
+    event = TaskEvent.add(
         actor="Darwin",
         action="delete_file",
         target=path,
         message=f"Deleting file {path}",
     )
-    FileSystem().delete_file(path)
-    Project.commit_all_changes(f"Deleted file {path}")
+    file_system.delete_file(path)
+    Workspace.current().update_code_indexes([path])
+    Project.record_change(f"Deleted file {path}", [path], event)
     return f"File deleted: `{path}`"
 
 
 @tool
 def copy_file(source: str, destination: str):
     """Copy a file from one location to another."""
-    fs = FileSystem()
-    if not fs.get_node(Path(source)):
+    file_system = Workspace.current().file_system
+    if not file_system.get_node(Path(source)):
         return f"File not found: `{source}`"
-    TaskEvent.add(
+    event = TaskEvent.add(
         actor="Darwin",
         action="copy_file",
         target=source,
         message=f"Copying file {source} to {destination}",
     )
-    FileSystem().copy_file(source, destination)
-    Project.commit_all_changes(f"Copied file {source} to {destination}")
+    file_system.copy_file(source, destination)
+    Workspace.current().update_code_indexes([destination])
+    Project.record_change(
+        f"Copied file {source} to {destination}", [destination], event
+    )
     return f"File copied from {source} to {destination}."
 
 
 @tool
 def move_file(source: str, destination: str):
     """Move a file from one location to another."""
-    fs = FileSystem()
-    if not fs.get_node(Path(source)):
+    file_system = Workspace.current().file_system
+    if not file_system.get_node(Path(source)):
         return f"File not found: `{source}`"
-    TaskEvent.add(
+    event = TaskEvent.add(
         actor="Darwin",
         action="move_file",
         target=source,
         message=f"Moving file {source} to {destination}",
     )
-    FileSystem().move_file(source, destination)
-    Project.commit_all_changes(f"Moved file {source} to {destination}")
+    file_system.move_file(source, destination)
+    Workspace.current().update_code_indexes([source, destination])
+    Project.record_change(
+        f"Moved file {source} to {destination}", [source, destination], event
+    )
     return f"File moved from {source} to {destination}."
 
 
@@ -142,20 +156,153 @@ def write_file(path: str, complete_entire_file_content: str, commit_message: str
     :param commit_message: Short commit message for the change
     """
     path = path.lstrip("/")
-    file_system = FileSystem()
-    TaskEvent.add(actor="assistant", action="write_file", target=path)
+    file_system = Workspace.current().file_system
+    event = TaskEvent.add(actor="assistant", action="write_file", target=path)
     file_system.save(complete_entire_file_content, Path(path))
-    Project.commit_all_changes(commit_message)
+    Workspace.current().update_code_indexes([path])
+    Project.record_change(commit_message, [path], event)
     return f"Successfully wrote content to `{path}`"
 
 
+@tool
+def edit_file(path: str, edits: str, commit_message: str):
+    """Change parts of a file. Prefer it over `write_file` for changes to existing files.
+    :param path: Path to the file
+    :param edits: One or more search/replace blocks, each in this format:
+        <<<<<<< SEARCH
+        lines to replace, copied from the file, with a few unchanged lines around them
+        =======
+        the new lines
+        >>>>>>> REPLACE
+      Unified diff hunks starting with `@@ -line,count +line,count @@` work too.
+    :param commit_message: Short commit message for the change
+    """
+    path = path.lstrip("/")
+    file_system = Workspace.current().file_system
+    file_node = file_system.get_node(Path(path))
+    if not file_node and Project.materialize(path):
+        file_node = file_system.get_node(Path(path))
+    if not file_node or file_node.is_directory:
+        return f"File not found: `{path}`. Use `write_file` to create it."
+    content = file_node.read()
+    if not content.readable or "\ufffd" in content.text:
+        return (
+            f"`{path}` is not a text file that can be edited, use `write_file` instead"
+        )
+    try:
+        new_text, inexact = apply_edits(content.text, parse_edits(edits))
+    except EditError as e:
+        return f"Could not edit `{path}`, the file was not changed. {e}"
+    if new_text == content.text:
+        return f"The edits do not change `{path}`"
+    diff = unified_diff(path, content.text, new_text)
+    event = TaskEvent.add(
+        actor="assistant",
+        action="edit_file",
+        target=path,
+        message=f"Editing `{path}`\n\n```diff\n{diff}```",
+    )
+    file_system.save(new_text, Path(path))
+    Workspace.current().update_code_indexes([path])
+    Project.record_change(commit_message, [path], event)
+    added = sum(
+        1 for line in diff.splitlines() if line[:1] == "+" and line[:3] != "+++"
+    )
+    removed = sum(
+        1 for line in diff.splitlines() if line[:1] == "-" and line[:3] != "---"
+    )
+    response = f"Successfully edited `{path}` (+{added} -{removed} lines)"
+    if inexact:
+        response += (
+            f". {inexact} of the edits did not match the file exactly and were applied "
+            "to the most similar lines, check the result with `read_file_lines`"
+        )
+    return response
+
+
+class FileOperation(BaseModel):
+    action: str = Field(description="One of `write`, `edit`, `move` or `delete`")
+    path: str = Field(description="Path to the file")
+    content: str = Field(
+        default="", description="`write`: Complete content of the file"
+    )
+    edits: str = Field(
+        default="", description="`edit`: Search/replace blocks, as for `edit_file`"
+    )
+    destination: str = Field(default="", description="`move`: New path of the file")
+
+
+def _stage_operation(transaction: FileTransaction, operation: FileOperation) -> int:
+    """Add an operation to a transaction. Returns the number of inexact edits."""
+    path = operation.path.lstrip("/")
+    root_directory = Workspace.current().file_system.root_directory
+    if operation.action != "write" and not (root_directory / path).exists():
+        # Outside of a sparse checkout
+        Project.materialize(path)
+    if operation.action == "write":
+        transaction.write(path, operation.content)
+    elif operation.action == "edit":
+        return transaction.edit(path, operation.edits)
+    elif operation.action == "move":
+        if not operation.destination:
+            raise TransactionError(f"Moving `{path}` needs a `destination`")
+        transaction.move(path, operation.destination.lstrip("/"))
+    elif operation.action == "delete":
+        transaction.delete(path)
+    else:
+        raise TransactionError(f"Unknown action `{operation.action}` for `{path}`")
+    return 0
+
+
+@tool
+def apply_file_changes(operations: List[FileOperation], commit_message: str):
+    """Write, edit, move and delete several files at once. Use it for changes that span files.
+    All operations are checked before any file is written. If one of them fails, no file is changed.
+    :param operations: Operations to apply, in order. Later operations see the result of earlier ones.
+    :param commit_message: Short commit message for all changes
+    """
+    transaction = FileTransaction(Workspace.current().file_system)
+    inexact = 0
+    for number, operation in enumerate(operations, start=1):
+        try:
+            inexact += _stage_operation(transaction, operation)
+        except TransactionError as e:
+            return f"Operation {number} failed, no file was changed. {e}"
+    if not transaction.paths:
+        return "The operations do not change any file"
+    diff = transaction.diff()
+    summary = ", ".join(f"`{path}`" for path in transaction.paths)
+    event = TaskEvent.add(
+        actor="assistant",
+        action="apply_file_changes",
+        # The target column holds 200 characters
+        target=", ".join(transaction.paths)[:200],
+        message=f"Changing {summary}\n\n```diff\n{diff}```",
+    )
+    try:
+        paths = transaction.commit()
+    except OSError as e:
+        return f"Could not write the files, no file was changed. {e}"
+    Workspace.current().update_code_indexes(paths)
+    Project.record_change(commit_message, paths, event)
+    response = f"Successfully changed {len(paths)} files: {summary}"
+    if inexact:
+        response += (
+            f". {inexact} of the edits did not match the files exactly and were applied "
+            "to the most similar lines, check the result with `read_file_lines`"
+        )
+    return response
+
+
 @tool
 def list_directory(path: str):
     """List the contents of a directory."""
     path = path.lstrip("/")
-    file_system = FileSystem()
-    node = file_system.get_node(Path(path))
-    if not node:
+    file_system = Workspace.current().file_system
+    children = file_system.list_directory(path)
+    if children is None and Project.materialize(path):
+        children = file_system.list_directory(path)
+    if children is None:
         TaskEvent.add(
             actor="assistant",
             action="list_directory",
@@ -164,14 +311,8 @@ def list_directory(path: str):
         )
         return f"Directory not found: `{path}`"
     directory_content = f"Content of `{path}`:\n\n"
-    for child in sorted(node.nodes, key=lambda x: x.path):
-        # Replace the root path with an empty string
-        clipped_path = str(child.path).replace(str(settings.REPO_DIR), "")
-        # Replace the directory path with an empty string, leaving file name untouched
-        clipped_path = replace_string_in_directory_path(clipped_path, path, "").lstrip(
-            "/"
-        )
-        directory_content += f"- {clipped_path}\n"
+    for child in children:
+        directory_content += f"- {child.path.name}\n"
     TaskEvent.add(
         actor="assistant",
         action="list_directory",
@@ -186,25 +327,122 @@ def read_files(file_paths: list[str]):
     """Read the content of the given files."""
     if len(file_paths) > settings.MAX_READ_FILES:
         return f"Too many files ({len(file_paths)}) to read. Please limit to {settings.MAX_READ_FILES} files."
-    file_system = FileSystem()
+    file_system = Workspace.current().file_system
     message = "Reading files: \n" + "\n- ".join(
         f"`{file_path}`\n" for file_path in file_paths
     )
     TaskEvent.add(actor="assistant", action="read_files", message=message)
-    output = ""
+    sections = []
+    non_empty_line_count = 0
     for file_path in file_paths:
         file_path = file_path.lstrip("/")
         file_node = file_system.get_node(Path(file_path))
-        if file_node:
-            output += f"### {file_path}\n"
-            output += file_node.content
-            output += "\n\n"
+        if not file_node and Project.materialize(file_path):
+            file_node = file_system.get_node(Path(file_path))
+        if not file_node:
+            sections.append(f"File not found: `{file_path}`\n")
+        elif file_node.is_directory:
+            sections.append(f"`{file_path}` is a directory\n")
         else:
-            output += f"File not found: `{file_path}`\n"
-    non_empty_line_count = len([line for line in output.split("\n") if line.strip()])
+            content = file_node.read()
+            if content.binary:
+                sections.append(f"`{file_path}` is a binary file\n")
+            elif content.oversized:
+                sections.append(
+                    f"`{file_path}` is too large to read ({content.size} bytes)\n"
+                )
+            else:
+                sections.append(f"### {file_path}\n{content.text}\n\n")
+                non_empty_line_count += content.non_empty_lines
+        non_empty_line_count += 1
     if non_empty_line_count > settings.MAX_FILE_LINES:
-        return f"The content of {file_paths} is longer than {settings.MAX_FILE_LINES} lines and too expensive to analyze. Abort!"
-    return output
+        return (
+            f"The content of {file_paths} is longer than {settings.MAX_FILE_LINES} lines and too expensive to analyze. "
+            "Use `outline_file` and `read_file_lines` to read the parts you need."
+        )
+    return "".join(sections)
+
+
+@tool
+def read_file_lines(
+    path: str,
+    start_line: int = 1,
+    end_line: Optional[int] = None,
+    around: Optional[str] = None,
+    context: int = 30,
+):
+    """Read a range of lines of a file. Use it for files that are too large for `read_files`.
+    :param path: Path to the file
+    :param start_line: First line to read, counting from 1
+    :param end_line: Last line to read
+    :param around: Text to look for instead of a line range, e.g. `def my_function`. Reads the lines around its first occurrence
+    :param context: Number of lines to read before and after `around`
+    """
+    path = path.lstrip("/")
+    file_system = Workspace.current().file_system
+    file_node = file_system.get_node(Path(path))
+    if not file_node and Project.materialize(path):
+        file_node = file_system.get_node(Path(path))
+    if not file_node or file_node.is_directory:
+        return f"File not found: `{path}`"
+    index = file_node.line_index()
+    if index.binary:
+        return f"`{path}` is a binary file"
+    if around:
+        line = file_node.find_line(around)
+        if line is None:
+            return f"`{around}` not found in `{path}`"
+        start_line, end_line = line - context, line + context
+    start_line = max(start_line, 1)
+    end_line = min(end_line or index.line_count, index.line_count)
+    end_line = min(end_line, start_line + settings.MAX_FILE_LINES - 1)
+    if start_line > end_line:
+        return f"`{path}` has only {index.line_count} lines"
+    TaskEvent.add(
+        actor="assistant",
+        action="read_file_lines",
+        target=path,
+        message=f"Reading lines {start_line}-{end_line} of `{path}`",
+    )
+    lines = file_node.read_lines(start_line, end_line).splitlines()
+    width = len(str(end_line))
+    numbered = "\n".join(
+        f"{number:>{width}} | {line}"
+        for number, line in enumerate(lines, start=start_line)
+    )
+    return f"### {path} (lines {start_line}-{end_line} of {index.line_count})\n{numbered}\n"
+
+
+@tool
+def outline_file(path: str):
+    """Outline the classes, functions and methods of a file with their line numbers.
+    Use it to find the lines to read with `read_file_lines` in large files.
+    :param path: Path to the file
+    """
+    path = path.lstrip("/")
+    workspace = Workspace.current()
+    file_system = workspace.file_system
+    file_node = file_system.get_node(Path(path))
+    if not file_node and Project.materialize(path):
+        file_node = file_system.get_node(Path(path))
+    if not file_node or file_node.is_directory:
+        return f"File not found: `{path}`"
+    TaskEvent.add(
+        actor="assistant",
+        action="outline_file",
+        target=path,
+        message=f"Outlining `{path}`",
+    )
+    symbols = workspace.file_symbols(path)
+    if symbols is None:
+        return f"No outline available for `{path}`, use `read_file_lines` instead"
+    outline = symbols.outline()
+    if not outline:
+        return f"`{path}` defines no classes or functions"
+    line_count = file_node.line_index().line_count
+    if len(outline) > settings.MAX_FILE_LINES:
+        outline = outline[: settings.MAX_FILE_LINES] + ["..."]
+    return f"### {path} ({line_count} lines)\n" + "\n".join(outline) + "\n"
 
 
 @tool
@@ -245,14 +483,31 @@ def search_github_code(query: str, sort: Optional[str], order: Optional[str]):
     return response
 
 
+def _format_windows(windows) -> Iterator[str]:
+    """Lines of search windows, grouped by file. Matching lines are marked with `:`, context with `-`."""
+    path = None
+    for window in windows:
+        if window.path != path:
+            path = window.path
+            yield f"### {path}"
+        else:
+            yield "--"
+        for line_number, line in enumerate(window.lines, start=window.start):
+            marker = ":" if line_number in window.matches else "-"
+            yield f"{line_number}{marker}{line}"
+
+
 @tool
-def search_for_code_snippets(search_regex: str, glob: str) -> str:
+def search_for_code_snippets(
+    search_regex: str, glob: str, context_lines: int = 0
+) -> str:
     """
     Search the code base for a specific regex pattern.
 
     Args:
     - search_regex: Regex pattern used for searching file contents (e.g. 'def function_name', '\b\w*Controller\b')
     - glob: Glob pattern to limit the search to specific files / directories (e.g., 'src' or '*.{c,h}').
+    - context_lines: Number of lines to show before and after each match, grouped by file. Saves reading the files afterwards.
 
     Returns:
     A list of code snippets and their location in the code base.
@@ -260,31 +515,97 @@ def search_for_code_snippets(search_regex: str, glob: str) -> str:
     Note:
         - Do NOT use file names in the `search_regex` parameter. Use the `glob` parameter to limit the search to specific files.
     """
-    search_path = os.path.join(settings.REPO_DIR, glob)
-    command = f"rg -n {shlex.quote(search_regex)} {shlex.quote(str(search_path))}"
     TaskEvent.add(
         actor="assistant",
         action="search_code",
         message=f"Searching code for pattern: `{search_regex}` in `{glob}`.",
     )
+    code_index = Workspace.current().code_index
     try:
-        result = subprocess.run(
-            shlex.split(command),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-        )
-        if result.returncode == 0:
-            if not result.stdout:
-                return f"No matches found for pattern `{search_regex}` in `{glob}`."
-            result = result.stdout.strip()
-            root_path_replaced = result.replace(str(settings.REPO_DIR), "")
-            max_100_lines = root_path_replaced.split("\n")[:150]
-            return "\n".join(max_100_lines)
+        if context_lines > 0:
+            lines = _format_windows(
+                code_index.search_windows(search_regex, glob, context_lines)
+            )
         else:
-            return "An error occurred." + result.stderr
-    except Exception as e:
-        return f"An error occurred while running ripgrep: {e}"
+            lines = code_index.search(search_regex, glob)
+        # Files are read lazily, so stop reading once the budget is spent
+        output, size, truncated = [], 0, False
+        for line in lines:
+            size += len(line) + 1
+            if (
+                len(output) >= settings.MAX_CODE_SEARCH_LINES
+                or size > settings.MAX_CODE_SEARCH_CHARS
+            ):
+                truncated = True
+                break
+            output.append(line)
+    except re.error as e:
+        return f"Invalid regex `{search_regex}`: {e}"
+    if not output:
+        return f"No matches found for pattern `{search_regex}` in `{glob}`."
+    if truncated:
+        output.append(
+            "... more matches not shown, narrow down the search with `search_regex` or `glob`"
+        )
+    return "\n".join(output)
+
+
+@tool
+def find_symbol(name: str, glob: str = ""):
+    """Find where a class, function, method or variable is defined and where it is used.
+    :param name: Name of the symbol, e.g. `Project` or `Project.checkout_branch`
+    :param glob: Directory, file or glob pattern to limit the lookup to (e.g. 'src' or '*.py')
+    """
+    TaskEvent.add(
+        actor="assistant",
+        action="find_symbol",
+        target=name,
+        message=f"Looking up symbol `{name}`",
+    )
+    workspace = Workspace.current()
+    symbol_index = workspace.symbol_index
+    definitions = symbol_index.definitions(name, glob)
+    references = symbol_index.references(name, glob)
+    if not definitions and not references:
+        return f"Symbol `{name}` not found."
+    response = [f"### Definitions of `{name}`"]
+    for path, definition in definitions:
+        response.append(
+            f"- {path}:{definition.line}-{definition.end_line} {definition.kind} `{definition.qualified_name}`"
+        )
+    if not definitions:
+        response.append("No definitions found")
+    response.append(f"### References to `{name}` ({len(references)})")
+    file_system = workspace.file_system
+    for path, line in references[: settings.MAX_FILE_SEARCH_RESULTS]:
+        file_node = file_system.get_node(Path(path))
+        text = file_node.read_lines(line, line).strip() if file_node else ""
+        response.append(f"{path}:{line}: {text}")
+    if len(references) > settings.MAX_FILE_SEARCH_RESULTS:
+        response.append(
+            f"... and {len(references) - settings.MAX_FILE_SEARCH_RESULTS} more, use `glob` to narrow down the lookup"
+        )
+    return "\n".join(response)
+
+
+@tool
+def find_relevant_files(query: str, glob: str = ""):
+    """Find the files most relevant to a topic, ranked by their paths, identifiers, comments and docs.
+    :param query: A few words describing the topic, e.g. 'billing invoice'
+    :param glob: Directory, file or glob pattern to limit the search to (e.g. 'src' or '*.py')
+    """
+    TaskEvent.add(
+        actor="assistant",
+        action="find_relevant_files",
+        target=query,
+        message=f"Looking for files about `{query}`",
+    )
+    results = Workspace.current().relevance_index.search(
+        query, glob, settings.MAX_RELEVANT_FILES
+    )
+    if not results:
+        return f"No files found for `{query}`."
+    return "\n".join(f"- {path} (score {score:.2f})" for path, score in results)
 
 
 @tool
@@ -371,9 +692,15 @@ def create_pr_pilot_agent(gpt_model=settings.DEFAULT_GPT_MODEL):
         read_pull_request,
         create_github_issue,
         write_file,
+        edit_file,
+        apply_file_changes,
         read_files,
+        read_file_lines,
+        outline_file,
         list_directory,
         search_for_code_snippets,
+        find_symbol,
+        find_relevant_files,
         search_github_issues,
         edit_github_issue,
         copy_file,
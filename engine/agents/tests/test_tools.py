@@ -25,12 +25,279 @@ def test_list_directories(task):
 
     settings.REPO_DIR = temp_dir_name
     markdown_result = list_directory("subdir")
-    assert (
-        markdown_result.strip()
-        == """Content of `subdir`:
+    assert markdown_result.strip() == """Content of `subdir`:
 
 - file1.yaml
 - file2.py
 - subdir.py
 """.strip()
+
+
+@pytest.mark.django_db
+def test_tools_share_the_file_system_of_the_task(task, tmp_path, monkeypatch):
+    from engine.agents.pr_pilot_agent import copy_file, read_files, write_file
+    from engine.file_system import FileSystem
+    from engine.repository import Workspace
+
+    scans = []
+    original_rescan = FileSystem.rescan
+    monkeypatch.setattr(
+        FileSystem,
+        "rescan",
+        lambda self: (scans.append(self), original_rescan(self))[1],
+    )
+    monkeypatch.setattr(
+        "engine.agents.pr_pilot_agent.Project.record_change", lambda *args: None
+    )
+    (tmp_path / "README.md").write_text("# Project\n")
+    Workspace(root=tmp_path).activate(task.id)
+    try:
+        write_file.invoke(
+            {
+                "path": "src/main.py",
+                "complete_entire_file_content": "print('hello')\n",
+                "commit_message": "Add main",
+            }
+        )
+        copy_file.invoke({"source": "src/main.py", "destination": "lib/main.py"})
+        assert "- main.py" in list_directory.invoke({"path": "lib"})
+        assert "print('hello')" in read_files.invoke({"file_paths": ["lib/main.py"]})
+    finally:
+        Workspace.deactivate(task.id)
+    assert len(scans) == 1
+
+
+@pytest.mark.django_db
+def test_read_files_skips_binary_files(task, tmp_path):
+    from engine.agents.pr_pilot_agent import read_files
+    from engine.repository import Workspace
+
+    (tmp_path / "data.dat").write_bytes(b"\x89PNG\0\0")
+    (tmp_path / "main.py").write_text("print('hello')\n")
+    Workspace(root=tmp_path).activate(task.id)
+    try:
+        output = read_files.invoke({"file_paths": ["data.dat", "main.py"]})
+    finally:
+        Workspace.deactivate(task.id)
+    assert output == (
+        "`data.dat` is a binary file\n" "### main.py\nprint('hello')\n\n\n"
+    )
+
+
+@pytest.mark.django_db
+def test_read_file_lines(task, tmp_path):
+    from engine.agents.pr_pilot_agent import read_file_lines
+    from engine.repository import Workspace
+
+    (tmp_path / "main.py").write_text("".join(f"line {i}\n" for i in range(1, 101)))
+    Workspace(root=tmp_path).activate(task.id)
+    try:
+        ranged = read_file_lines.invoke(
+            {"path": "main.py", "start_line": 9, "end_line": 10}
+        )
+        window = read_file_lines.invoke(
+            {"path": "main.py", "around": "line 50\n", "context": 1}
+        )
+    finally:
+        Workspace.deactivate(task.id)
+    assert ranged == "### main.py (lines 9-10 of 100)\n 9 | line 9\n10 | line 10\n"
+    assert window == (
+        "### main.py (lines 49-51 of 100)\n49 | line 49\n50 | line 50\n51 | line 51\n"
+    )
+
+
+@pytest.mark.django_db
+def test_find_symbol(task, tmp_path, monkeypatch):
+    from engine.agents.pr_pilot_agent import find_symbol, write_file
+    from engine.repository import Workspace
+
+    monkeypatch.setattr(
+        "engine.agents.pr_pilot_agent.Project.record_change", lambda *args: None
+    )
+    (tmp_path / "models.py").write_text(
+        "class User:\n    def greet(self):\n        return 'hi'\n"
+    )
+    (tmp_path / "views.py").write_text("from models import User\n\nUser().greet()\n")
+    Workspace(root=tmp_path).activate(task.id)
+    try:
+        output = find_symbol.invoke({"name": "User.greet"})
+        write_file.invoke(
+            {
+                "path": "views.py",
+                "complete_entire_file_content": "print('bye')\n",
+                "commit_message": "Remove greeting",
+            }
+        )
+        after_write = find_symbol.invoke({"name": "greet"})
+        missing = find_symbol.invoke({"name": "Missing"})
+    finally:
+        Workspace.deactivate(task.id)
+    assert output == (
+        "### Definitions of `User.greet`\n"
+        "- models.py:2-3 method `User.greet`\n"
+        "### References to `User.greet` (1)\n"
+        "views.py:3: User().greet()"
+    )
+    assert after_write.endswith("### References to `greet` (0)")
+    assert missing == "Symbol `Missing` not found."
+
+
+@pytest.mark.django_db
+def test_find_relevant_files(task, tmp_path):
+    from engine.agents.pr_pilot_agent import find_relevant_files
+    from engine.repository import Workspace
+
+    (tmp_path / "billing.py").write_text("def create_invoice():\n    pass\n")
+    (tmp_path / "users.py").write_text("class User:\n    pass\n")
+    Workspace(root=tmp_path).activate(task.id)
+    try:
+        output = find_relevant_files.invoke({"query": "invoices"})
+        missing = find_relevant_files.invoke({"query": "payments"})
+    finally:
+        Workspace.deactivate(task.id)
+    assert output.startswith("- billing.py (score ")
+    assert "users.py" not in output
+    assert missing == "No files found for `payments`."
+
+
+@pytest.mark.django_db
+def test_search_for_code_snippets(task, tmp_path, settings):
+    from engine.agents.pr_pilot_agent import search_for_code_snippets
+    from engine.repository import Workspace
+
+    (tmp_path / "a.py").write_text("import os\n\n\ndef a():\n    return os.sep\n")
+    (tmp_path / "b.py").write_text("def b():\n    pass\n")
+    Workspace(root=tmp_path).activate(task.id)
+    try:
+        windows = search_for_code_snippets.invoke(
+            {"search_regex": "def a", "glob": "", "context_lines": 1}
+        )
+        settings.MAX_CODE_SEARCH_LINES = 3
+        truncated = search_for_code_snippets.invoke(
+            {"search_regex": "def|pass|os", "glob": "*.py"}
+        )
+    finally:
+        Workspace.deactivate(task.id)
+    assert windows == "### a.py\n3-\n4:def a():\n5-    return os.sep"
+    assert truncated.splitlines() == [
+        "a.py:1:import os",
+        "a.py:4:def a():",
+        "a.py:5:    return os.sep",
+        "... more matches not shown, narrow down the search with `search_regex` or `glob`",
+    ]
+
+
+@pytest.mark.django_db
+def test_outline_file(task, tmp_path):
+    from engine.agents.pr_pilot_agent import outline_file
+    from engine.repository import Workspace
+
+    (tmp_path / "models.py").write_text(
+        "class User:\n    def greet(self):\n        return 'hi'\n"
+    )
+    (tmp_path / "notes.txt").write_text("Nothing to outline\n")
+    Workspace(root=tmp_path).activate(task.id)
+    try:
+        outline = outline_file.invoke({"path": "/models.py"})
+        no_parser = outline_file.invoke({"path": "notes.txt"})
+    finally:
+        Workspace.deactivate(task.id)
+    assert outline == (
+        "### models.py (3 lines)\n"
+        "class User (lines 1-3)\n"
+        "  method greet (lines 2-3)\n"
+    )
+    assert (
+        no_parser
+        == "No outline available for `notes.txt`, use `read_file_lines` instead"
+    )
+
+
+@pytest.mark.django_db
+def test_edit_file(task, tmp_path, monkeypatch):
+    from engine.agents.pr_pilot_agent import edit_file
+    from engine.models.task_event import TaskEvent
+    from engine.repository import Workspace
+
+    changes = []
+    monkeypatch.setattr(
+        "engine.agents.pr_pilot_agent.Project.record_change",
+        lambda *args: changes.append(args),
+    )
+    (tmp_path / "main.py").write_text("import os\n\nprint('hello')\n")
+    Workspace(root=tmp_path).activate(task.id)
+    try:
+        edited = edit_file.invoke(
+            {
+                "path": "main.py",
+                "edits": "<<<<<<< SEARCH\nprint('hello')\n=======\nprint('bye')\n>>>>>>> REPLACE",
+                "commit_message": "Say bye",
+            }
+        )
+        failed = edit_file.invoke(
+            {
+                "path": "main.py",
+                "edits": "<<<<<<< SEARCH\nprint('missing')\n=======\n\n>>>>>>> REPLACE",
+                "commit_message": "Nothing",
+            }
+        )
+    finally:
+        Workspace.deactivate(task.id)
+    assert edited == "Successfully edited `main.py` (+1 -1 lines)"
+    assert failed.startswith("Could not edit `main.py`, the file was not changed.")
+    assert (tmp_path / "main.py").read_text() == "import os\n\nprint('bye')\n"
+    assert [message for message, _, _ in changes] == ["Say bye"]
+    event = TaskEvent.objects.get(action="edit_file")
+    assert "-print('hello')\n+print('bye')" in event.message
+
+
+@pytest.mark.django_db
+def test_apply_file_changes(task, tmp_path, monkeypatch):
+    from engine.agents.pr_pilot_agent import apply_file_changes
+    from engine.models.task_event import TaskEvent
+    from engine.repository import Workspace
+
+    changes = []
+    monkeypatch.setattr(
+        "engine.agents.pr_pilot_agent.Project.record_change",
+        lambda *args: changes.append(args),
+    )
+    (tmp_path / "main.py").write_text("from util import greet\n\ngreet()\n")
+    (tmp_path / "util.py").write_text("def greet():\n    print('hello')\n")
+    Workspace(root=tmp_path).activate(task.id)
+    try:
+        applied = apply_file_changes.invoke(
+            {
+                "operations": [
+                    {"action": "move", "path": "util.py", "destination": "lib.py"},
+                    {
+                        "action": "edit",
+                        "path": "main.py",
+                        "edits": "<<<<<<< SEARCH\nfrom util import greet\n=======\nfrom lib import greet\n>>>>>>> REPLACE",
+                    },
+                ],
+                "commit_message": "Rename util to lib",
+            }
+        )
+        failed = apply_file_changes.invoke(
+            {
+                "operations": [
+                    {"action": "write", "path": "new.py", "content": "x = 1\n"},
+                    {"action": "delete", "path": "missing.py"},
+                ],
+                "commit_message": "Nothing",
+            }
+        )
+    finally:
+        Workspace.deactivate(task.id)
+    assert applied == "Successfully changed 3 files: `util.py`, `lib.py`, `main.py`"
+    assert (
+        failed
+        == "Operation 2 failed, no file was changed. File not found: `missing.py`"
     )
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["lib.py", "main.py"]
+    assert (tmp_path / "main.py").read_text() == "from lib import greet\n\ngreet()\n"
+    assert changes[0][:2] == ("Rename util to lib", ["util.py", "lib.py", "main.py"])
+    assert len(changes) == 1
+    event = TaskEvent.objects.get(action="apply_file_changes")
+    assert "+from lib import greet" in event.message
@@ -0,0 +1 @@
+"""Benchmarks for the task engine, run with `python manage.py run_benchmark <name>`."""
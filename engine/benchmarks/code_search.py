@@ -0,0 +1,114 @@
+"""Compare code search through the trigram index with ripgrep and a full scan."""
+
+import random
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from itertools import islice
+from pathlib import Path
+
+from engine.benchmarks.util import print_results, timed
+from engine.code_search import TrigramIndex
+from engine.file_system import FileSystem
+
+WORDS = [
+    "request",
+    "response",
+    "user",
+    "account",
+    "session",
+    "token",
+    "value",
+    "result",
+    "config",
+    "handler",
+    "cache",
+    "queue",
+    "event",
+    "record",
+    "buffer",
+    "client",
+]
+
+QUERIES = {
+    "rare identifier": "refresh_token_7919",
+    "regex": r"def \w+_handler_4\d\b",
+    "common word": "return",
+}
+
+
+def create_source_tree(root: Path, files: int, functions_per_file: int = 20):
+    """Python modules full of functions with pseudo-random names."""
+    rng = random.Random(0)
+    for i in range(files):
+        directory = root / f"pkg_{i // 1000}"
+        directory.mkdir(exist_ok=True)
+        functions = []
+        for j in range(functions_per_file):
+            name = "_".join(rng.sample(WORDS, 2)) + f"_{i * functions_per_file + j}"
+            body = " + ".join(rng.sample(WORDS, 3))
+            functions.append(
+                f"def {name}({WORDS[j % len(WORDS)]}):\n    return {body}\n"
+            )
+        if i == files // 2:
+            functions.append("def refresh_token_7919():\n    return None\n")
+        (directory / f"module_{i}.py").write_text("\n\n".join(functions))
+
+
+def scan(root: Path, paths, pattern: str, limit: int):
+    """Match every file, as a search without an index does."""
+    regex = re.compile(pattern, re.MULTILINE)
+    results = []
+    for path in paths:
+        text = (root / path).read_text()
+        for match in regex.finditer(text):
+            results.append(f"{path}:{match.group(0)}")
+            if len(results) >= limit:
+                return results
+    return results
+
+
+def run(files=20_000, limit=150, repetitions=5):
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        with timed("create source tree", results):
+            create_source_tree(root, files)
+        store = FileSystem(root).store
+        paths = [path for path, index in store.walk() if not store.is_dir(index)]
+        with timed("build index", results):
+            index = TrigramIndex.build(root, paths)
+        with timed("save index", results):
+            index.save(root.parent / f"{root.name}-index")
+        with timed("load index", results):
+            index = TrigramIndex.load(root.parent / f"{root.name}-index", root)
+        shutil.rmtree(root.parent / f"{root.name}-index")
+        rg = shutil.which("rg")
+        for label, pattern in QUERIES.items():
+            results[f"{label}: candidate files"] = len(index.candidates(pattern))
+            list(islice(index.search(pattern), limit))  # Warm the content cache
+            start = time.perf_counter()
+            for _ in range(repetitions):
+                list(islice(index.search(pattern), limit))
+            results[f"{label}: trigram index"] = (
+                time.perf_counter() - start
+            ) / repetitions
+            start = time.perf_counter()
+            for _ in range(repetitions):
+                scan(root, paths, pattern, limit)
+            results[f"{label}: full scan"] = (time.perf_counter() - start) / repetitions
+            if rg:
+                start = time.perf_counter()
+                for _ in range(repetitions):
+                    subprocess.run(
+                        [rg, "-n", pattern, str(root)],
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.PIPE,
+                    )
+                results[f"{label}: rg"] = (time.perf_counter() - start) / repetitions
+    if not rg:
+        results["rg"] = "not installed"
+    print_results(f"Code search, {files} files", results)
+    return results
@@ -0,0 +1,71 @@
+"""Measure index build time, node lookup latency and update cost of `FileSystem`."""
+
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from engine.benchmarks.util import print_results, timed
+from engine.file_system import FileSystem
+
+
+def create_synthetic_tree(root: Path, files: int, files_per_directory: int = 100):
+    """Create `files` empty files, spread over two levels of directories."""
+    paths = []
+    for i in range(files):
+        directory = root / f"pkg_{i // 10_000}" / f"mod_{i // files_per_directory}"
+        if i % files_per_directory == 0:
+            directory.mkdir(parents=True)
+        path = directory / f"file_{i}.py"
+        path.touch()
+        paths.append(path.relative_to(root))
+    return paths
+
+
+def walk(node, path: Path):
+    """Find a node by walking the tree, as `get_node` did before the index."""
+    if node.path == path:
+        return node
+    for child in node.nodes:
+        if child.path == path:
+            return child
+        if child.nodes:
+            result = walk(child, path)
+            if result:
+                return result
+    return None
+
+
+def run(files=200_000, lookups=1_000):
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        with timed("create synthetic tree", results):
+            paths = create_synthetic_tree(root, files)
+        with timed("build tree and index", results):
+            file_system = FileSystem(root)
+        sample = random.Random(0).sample(paths, lookups)
+
+        start = time.perf_counter()
+        for path in sample:
+            assert file_system.get_node(path)
+        results["get_node, per lookup"] = (time.perf_counter() - start) / lookups
+
+        directories = [path.parent for path in sample]
+        start = time.perf_counter()
+        for directory in directories:
+            file_system.list_directory(directory)
+        results["list_directory, per listing"] = (time.perf_counter() - start) / lookups
+
+        with timed("save one file", results):
+            file_system.save("x = 1\n", Path("pkg_0/mod_0/new_file.py"))
+        with timed("rescan", results):
+            file_system.rescan()
+
+        walked = sample[:10]
+        start = time.perf_counter()
+        for path in walked:
+            assert walk(file_system.tree, root / path)
+        results["tree walk, per lookup"] = (time.perf_counter() - start) / len(walked)
+    print_results(f"FileSystem index, {files} files", results)
+    return results
@@ -0,0 +1,90 @@
+"""Compare memory and build time of the node store with the pydantic tree it replaced."""
+
+import gc
+import os
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from engine.benchmarks.file_system_index import create_synthetic_tree
+from engine.benchmarks.util import print_results, timed
+from engine.file_system import FileSystem
+from engine.file_system.ignore import IgnoreMatcher
+
+
+class LegacyNode(BaseModel):
+    """A node of the tree as `FileSystemNode` was before the node store."""
+
+    path: Path
+    nodes: List["LegacyNode"] = []
+    parent: Optional["LegacyNode"] = None
+
+
+def build_legacy_tree(root: Path):
+    """Build the pydantic tree, with its path and children indexes."""
+    ignore = IgnoreMatcher(root)
+    index = {}
+    children = {}
+
+    def build(path: Path, key: str, parent: LegacyNode = None) -> LegacyNode:
+        node = LegacyNode(path=path, parent=parent)
+        index[key] = node
+        children[key] = {}
+        with os.scandir(path) as entries:
+            for entry in entries:
+                is_dir = entry.is_dir()
+                child_key = f"{key}/{entry.name}" if key else entry.name
+                if ignore.is_ignored(child_key, is_dir):
+                    continue
+                if is_dir:
+                    child = build(path / entry.name, child_key, node)
+                else:
+                    child = LegacyNode(path=path / entry.name, parent=node)
+                    index[child_key] = child
+                children[key][entry.name] = child
+                node.nodes.append(child)
+        return node
+
+    return build(root, ""), index, children
+
+
+def retained_bytes(build) -> int:
+    """Memory still allocated once `build` returned, while its result is alive."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def compare(files: int) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        with timed("create synthetic tree", results):
+            create_synthetic_tree(root, files)
+        # Warm the dentry cache so that both builds see the same disk state
+        FileSystem(root)
+        with timed("build pydantic tree", results):
+            legacy = build_legacy_tree(root)
+        del legacy
+        with timed("build node store", results):
+            file_system = FileSystem(root)
+        del file_system
+        legacy_size = retained_bytes(lambda: build_legacy_tree(root))
+        store_size = retained_bytes(lambda: FileSystem(root))
+        results["pydantic tree, MB"] = f"{legacy_size / 2**20:.1f}"
+        results["node store, MB"] = f"{store_size / 2**20:.1f}"
+        results["memory ratio"] = f"{legacy_size / store_size:.1f}x"
+    print_results(f"File tree, {files} files", results)
+    return results
+
+
+def run(sizes=(50_000, 500_000)):
+    return {files: compare(files) for files in sizes}
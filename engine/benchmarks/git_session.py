@@ -0,0 +1,41 @@
+"""Compare per-call latency of a fresh `git.Repo` per call with a `GitSession`."""
+
+import tempfile
+from pathlib import Path
+
+import git
+
+from engine.benchmarks.util import create_synthetic_repo, print_results, timed
+from engine.repository import GitSession
+
+
+def run(commits=2_000, calls=200):
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = create_synthetic_repo(Path(temp_dir) / "repo", commits)
+        file_path = "src/module_0/file_0.py"
+
+        with timed("fresh repo: resolve ref", results):
+            for _ in range(calls):
+                git.Repo(path).git.rev_parse("HEAD")
+        with timed("fresh repo: read file", results):
+            for _ in range(calls):
+                git.Repo(path).git.show(f"HEAD:{file_path}")
+        with timed("fresh repo: status", results):
+            for _ in range(calls):
+                git.Repo(path).is_dirty(untracked_files=True)
+
+        session = GitSession(path)
+        with timed("session: resolve ref", results):
+            for _ in range(calls):
+                session.resolve("HEAD")
+        with timed("session: read file", results):
+            for _ in range(calls):
+                session.read_blob("HEAD", file_path)
+        with timed("session: status", results):
+            for _ in range(calls):
+                session.is_dirty()
+        session.close()
+    per_call = {label: value / calls for label, value in results.items()}
+    print_results(f"Git session, mean latency per call over {calls} calls", per_call)
+    return per_call
@@ -0,0 +1,88 @@
+"""Compare tree building with the old fnmatch ignore loop and the compiled matcher."""
+
+import tempfile
+from fnmatch import fnmatch
+from pathlib import Path
+
+from engine.benchmarks.util import print_results, timed
+from engine.file_system import FileSystem
+from engine.file_system.ignore import DEFAULT_IGNORE_FILE
+
+GITIGNORE = """
+node_modules/
+dist/
+build/
+coverage/
+.next/
+*.log
+*.tsbuildinfo
+.env
+.env.local
+.DS_Store
+"""
+
+
+def create_node_project(root: Path, source_files: int, packages: int):
+    """A project with a few source files and a large node_modules directory."""
+    (root / ".gitignore").write_text(GITIGNORE)
+    for i in range(source_files):
+        directory = root / "src" / f"feature_{i // 50}"
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"component_{i}.tsx").touch()
+    for i in range(packages):
+        package = root / "node_modules" / f"package-{i}"
+        for directory in ("lib", "dist", "types"):
+            (package / directory).mkdir(parents=True)
+            for j in range(10):
+                (package / directory / f"file_{j}.js").touch()
+        (package / "package.json").touch()
+
+
+def legacy_should_be_ignored(path: Path, root: Path, patterns) -> bool:
+    """`FileSystem.should_be_ignored` before the compiled matcher."""
+    relative_path = str(path.relative_to(root)).rstrip("/")
+    for pattern in patterns:
+        if (
+            relative_path.startswith(pattern.rstrip("/") + "/")
+            or relative_path == pattern
+        ):
+            return True
+        if fnmatch(path.name, pattern) or fnmatch(relative_path, pattern):
+            return True
+    return False
+
+
+def legacy_walk(path: Path, root: Path, patterns) -> int:
+    count = 0
+    for item in path.iterdir():
+        if legacy_should_be_ignored(item, root, patterns):
+            continue
+        count += 1
+        if item.is_dir():
+            count += legacy_walk(item, root, patterns)
+    return count
+
+
+def run(source_files=2_000, packages=2_000):
+    results = {}
+    default_patterns = set(DEFAULT_IGNORE_FILE.read_text().splitlines())
+    gitignore_patterns = default_patterns | {
+        line for line in GITIGNORE.splitlines() if line
+    }
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        create_node_project(root, source_files, packages)
+        with timed("fnmatch loop, default patterns", results):
+            results["paths (fnmatch, default patterns)"] = legacy_walk(
+                root, root, default_patterns
+            )
+        with timed("fnmatch loop, with .gitignore patterns", results):
+            legacy_walk(root, root, gitignore_patterns)
+        with timed("compiled matcher", results):
+            file_system = FileSystem(root)
+        results["paths (compiled matcher)"] = len(file_system.store) - 1
+    print_results(
+        f"Ignore matching, {source_files} source files, {packages} packages in node_modules",
+        results,
+    )
+    return results
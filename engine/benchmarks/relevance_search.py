@@ -0,0 +1,45 @@
+"""Build, update and query the BM25 relevance index."""
+
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from engine.benchmarks.code_search import create_source_tree
+from engine.benchmarks.util import print_results, timed
+from engine.code_search import RelevanceIndex
+from engine.file_system import FileSystem
+
+QUERIES = ["session token", "refresh token handler", "user account cache"]
+
+
+def run(files=20_000, changed=200, repetitions=20):
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        with timed("create source tree", results):
+            create_source_tree(root, files)
+        store = FileSystem(root).store
+        paths = [path for path, index in store.walk() if not store.is_dir(index)]
+        with timed("build index", results):
+            index = RelevanceIndex.build(root, paths)
+        saved = root.parent / f"{root.name}-relevance"
+        with timed("save index", results):
+            index.save(saved)
+        with timed("load index", results):
+            index = RelevanceIndex.load(saved, root)
+        for path in paths[:changed]:
+            (root / path).write_text("def refresh_session():\n    return token\n")
+        with timed(f"update {changed} files and compact", results):
+            index.update(paths[:changed])
+            index = index.compact()
+        with timed("rebuild instead", results):
+            RelevanceIndex.build(root, paths)
+        for query in QUERIES:
+            start = time.perf_counter()
+            for _ in range(repetitions):
+                index.search(query)
+            results[f"query `{query}`"] = (time.perf_counter() - start) / repetitions
+        shutil.rmtree(saved)
+    print_results(f"Relevance search, {files} files", results)
+    return results
@@ -0,0 +1,38 @@
+"""Compare cold and warm task startup with the repository mirror cache."""
+
+import tempfile
+from pathlib import Path
+
+from engine.benchmarks.util import (
+    add_commit,
+    create_synthetic_repo,
+    print_results,
+    timed,
+)
+from engine.repository import MirrorCache, WorktreePool
+
+
+def run(commits=50_000):
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        with timed("create synthetic repo", results):
+            origin = create_synthetic_repo(temp_dir / "origin", commits)
+        remote_url = origin.as_uri()
+        pool = WorktreePool(
+            mirror_cache=MirrorCache(cache_dir=temp_dir / "cache", max_bytes=10**12),
+            pool_dir=temp_dir / "pool",
+            max_idle=1,
+        )
+        with timed("cold start (empty cache)", results):
+            worktree = pool.acquire("bench/repo", remote_url, "main")
+        pool.release(worktree)
+        add_commit(origin, "src/new_file.py", "print('hello')\n")
+        with timed("warm start (one new commit)", results):
+            worktree = pool.acquire("bench/repo", remote_url, "main")
+        pool.release(worktree)
+        with timed("warm start (no changes)", results):
+            worktree = pool.acquire("bench/repo", remote_url, "main")
+        pool.release(worktree)
+    print_results(f"Repository mirror cache, {commits} commits", results)
+    return results
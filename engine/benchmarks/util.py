@@ -0,0 +1,75 @@
+import subprocess
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+@contextmanager
+def timed(label: str, results: dict):
+    """Measure the wall time of a block and store it in `results[label]`."""
+    start = time.perf_counter()
+    yield
+    results[label] = time.perf_counter() - start
+
+
+def print_results(title: str, results: dict):
+    print(f"\n{title}")
+    width = max(len(label) for label in results)
+    for label, value in results.items():
+        if isinstance(value, float):
+            print(f"  {label:<{width}}  {value * 1000:10.2f} ms")
+        else:
+            print(f"  {label:<{width}}  {value:>10}")
+
+
+def create_synthetic_repo(path: Path, commits: int, files: int = 1000) -> Path:
+    """
+    Create a git repository with a long history using `git fast-import`.
+    :param path: Directory of the new repository
+    :param commits: Number of commits on the `main` branch
+    :param files: Number of distinct files touched by the history
+    :return: Path of the repository
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    subprocess.run(["git", "init", "-q", "-b", "main", str(path)], check=True)
+    importer = subprocess.Popen(
+        ["git", "fast-import", "--quiet"], cwd=path, stdin=subprocess.PIPE
+    )
+    timestamp = 1700000000
+    for i in range(commits):
+        content = f"# revision {i}\nvalue = {i * 7919 % 104729}\n".encode()
+        message = f"Commit {i}".encode()
+        chunks = [
+            b"commit refs/heads/main\n",
+            b"committer Bench <bench@example.com> %d +0000\n" % (timestamp + i),
+            b"data %d\n%s\n" % (len(message), message),
+        ]
+        chunks.append(b"M 644 inline src/module_%d/file_%d.py\n" % (i % 50, i % files))
+        chunks.append(b"data %d\n%s\n" % (len(content), content))
+        importer.stdin.write(b"".join(chunks))
+    importer.stdin.close()
+    importer.wait()
+    subprocess.run(["git", "checkout", "-q", "main"], cwd=path, check=True)
+    return path
+
+
+def add_commit(path: Path, file_name: str, content: str):
+    """Add a commit on top of the current branch of the repository at `path`."""
+    (Path(path) / file_name).write_text(content)
+    subprocess.run(["git", "add", file_name], cwd=path, check=True)
+    subprocess.run(
+        [
+            "git",
+            "-c",
+            "user.name=Bench",
+            "-c",
+            "user.email=bench@example.com",
+            "commit",
+            "-q",
+            "-m",
+            f"Update {file_name}",
+        ],
+        cwd=path,
+        check=True,
+    )
@@ -2,7 +2,7 @@ import json
 import logging
 import subprocess
 
-from django.conf import settings
+from engine.repository import Workspace
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +23,7 @@ def run_semgrep(search_path: str, config="p/r2c"):
 
 def json_to_markdown(json_data):
     findings = json.loads(json_data)
+    root = Workspace.current().root
     logger.info("Generating Semgrep report")
     markdown_lines = ["# Report\n"]
 
@@ -35,7 +36,7 @@ def json_to_markdown(json_data):
     for result in results:
 
         rule_id = result.get("check_id")
-        path = result.get("path").replace(str(settings.REPO_DIR), "").lstrip("/")
+        path = result.get("path").replace(str(root), "").lstrip("/")
         start_line = result.get("start", {}).get("line")
         message = result.get("extra", {}).get("message")
         logger.info(f"Found issue: {message} in {path}:{start_line}")
@@ -45,7 +46,7 @@ def json_to_markdown(json_data):
         markdown_lines.append("\n")  # Add an empty line for spacing
     markdown_lines.append("\n\n")  # Add an empty line for spacing
     for error in errors:
-        message = error.get("message").replace(str(settings.REPO_DIR), "").lstrip("/")
+        message = error.get("message").replace(str(root), "").lstrip("/")
         logger.info(f"[{error['level']}] {message}")
         markdown_lines.append(f"[{error['level']}] {message}")
 
@@ -53,6 +54,6 @@ def json_to_markdown(json_data):
 
 
 def generate_semgrep_report(semgrep_config="p/python"):
-    semgrep_output = run_semgrep(settings.REPO_DIR, semgrep_config)
+    semgrep_output = run_semgrep(str(Workspace.current().root), semgrep_config)
     markdown_report = json_to_markdown(semgrep_output)
     return markdown_report
@@ -0,0 +1,24 @@
+from .relevance_index import RelevanceIndex, open_relevance_index
+from .repository_map import load_repository_map
+from .symbol_index import (
+    SymbolIndex,
+    open_symbol_index,
+    parse_file,
+    symbol_cache_directory,
+)
+from .symbol_parsers import SymbolParser, register_parser
+from .trigram_index import TrigramIndex, open_index
+
+__all__ = [
+    "RelevanceIndex",
+    "SymbolIndex",
+    "SymbolParser",
+    "TrigramIndex",
+    "load_repository_map",
+    "open_index",
+    "open_relevance_index",
+    "open_symbol_index",
+    "parse_file",
+    "register_parser",
+    "symbol_cache_directory",
+]
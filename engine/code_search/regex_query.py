@@ -0,0 +1,88 @@
+from dataclasses import dataclass, field
+from re import IGNORECASE
+from typing import List, Optional, Union
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+
+@dataclass
+class Literal:
+    """A string that every match contains."""
+
+    text: str
+
+
+@dataclass
+class AllOf:
+    """Every part must match."""
+
+    parts: List["Query"] = field(default_factory=list)
+
+
+@dataclass
+class AnyOf:
+    """At least one part must match."""
+
+    parts: List["Query"] = field(default_factory=list)
+
+
+Query = Union[Literal, AllOf, AnyOf, None]  # None matches everything
+
+
+def _literal(run: str, ignore_case: bool) -> Optional[Literal]:
+    # Indexes fold the case of ASCII letters only
+    if not run or (ignore_case and not run.isascii()):
+        return None
+    return Literal(run)
+
+
+def _sequence(items, ignore_case: bool) -> Query:
+    parts = []
+    run = ""
+    for op, value in items:
+        if op is sre_parse.LITERAL:
+            run += chr(value)
+            continue
+        if op is sre_parse.IN and len(value) == 1 and value[0][0] is sre_parse.LITERAL:
+            # A character class with a single character
+            run += chr(value[0][1])
+            continue
+        parts.append(_literal(run, ignore_case))
+        run = ""
+        if op is sre_parse.SUBPATTERN:
+            _, add_flags, _, pattern = value
+            parts.append(
+                _sequence(pattern, ignore_case or bool(add_flags & IGNORECASE))
+            )
+        elif op is sre_parse.BRANCH:
+            alternatives = [_sequence(branch, ignore_case) for branch in value[1]]
+            if all(alternative is not None for alternative in alternatives):
+                parts.append(AnyOf(alternatives))
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and value[0] >= 1:
+            parts.append(_sequence(value[2], ignore_case))
+    parts.append(_literal(run, ignore_case))
+    parts = [part for part in parts if part is not None]
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else AllOf(parts)
+
+
+def required_literals(pattern: str) -> Query:
+    """
+    Strings a text must contain to match a regular expression.
+    :return: None if nothing can be said, e.g. for `.*`
+    """
+    parsed = sre_parse.parse(pattern)
+    return _sequence(parsed, bool(parsed.state.flags & IGNORECASE))
+
+
+def trigrams(text: Union[str, bytes]) -> Optional[List[bytes]]:
+    """The case-folded trigrams of a string, None if it is shorter than three bytes."""
+    data = text.encode("utf-8") if isinstance(text, str) else text
+    data = data.lower()
+    if len(data) < 3:
+        return None
+    return sorted({bytes(trigram) for trigram in zip(data, data[1:], data[2:])})
@@ -0,0 +1,424 @@
+import logging
+import math
+import re
+import shutil
+import tempfile
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import git
+import numpy as np
+from django.conf import settings
+
+from engine.file_system import FileSystem
+from engine.repository import GitSession
+from engine.repository.mirror_cache import sparse_checkout_enabled
+from .trigram_index import (
+    _prune,
+    _read_text,
+    _relative_files,
+    changed_paths,
+    index_key,
+    path_filter,
+)
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+INDEX_DIR = "pr-pilot-relevance"
+
+# Words in paths say more about a file than words in its content
+PATH_WEIGHT = 3
+K1 = 1.2
+B = 0.75
+
+# Splits identifiers into words: `BillingAccount_id` is `billing`, `account`, `id`
+WORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+")
+
+STOP_WORDS = frozenset("""
+    a an and are as at be but by for from if in into is it no not of on or so
+    that the their then there these this to was will with you your
+    async await bool break case catch class const continue def default del elif
+    else except false finally for func function if import int let new none null
+    pass raise return self static str string this true try type var void while
+    """.split())
+
+_terms_cache: Dict[str, Optional[str]] = {}
+
+
+def _stem(term: str) -> str:
+    """A light stemmer, so `invoice`, `invoices`, `invoiced` and `invoicing` are one term."""
+    if term.endswith("ies") and len(term) > 4:
+        return term[:-3] + "y"
+    if term.endswith(("sses", "xes", "ches", "shes")):
+        term = term[:-2]
+    elif term.endswith("s") and not term.endswith(("ss", "us", "is")):
+        term = term[:-1]
+    for suffix in ("ing", "ed", "e"):
+        if term.endswith(suffix) and len(term) - len(suffix) >= 3:
+            return term[: -len(suffix)]
+    return term
+
+
+def _term(word: str) -> Optional[str]:
+    """Normalize a word, None for stop words and noise."""
+    term = _terms_cache.get(word)
+    if term is None and word not in _terms_cache:
+        term = word.lower()
+        term = None if len(term) < 2 or term in STOP_WORDS else _stem(term)
+        if len(_terms_cache) < 1_000_000:
+            _terms_cache[word] = term
+    return term
+
+
+def terms(text: str) -> Counter:
+    """Term frequencies of a text."""
+    counts = Counter()
+    for word, count in Counter(WORD.findall(text)).items():
+        term = _term(word)
+        if term:
+            counts[term] += count
+    return counts
+
+
+def document_terms(path: str, text: str) -> Counter:
+    """Term frequencies of a file: the words of its path, its identifiers, comments and docs."""
+    counts = terms(text)
+    for term, count in terms(path).items():
+        counts[term] += count * PATH_WEIGHT
+    return counts
+
+
+class RelevanceIndex:
+    """Rank files by their relevance to a natural-language query with BM25.
+
+    The postings are array-backed, as in `TrigramIndex`: per term, where its
+    postings start, and per posting the file id and the term frequency.
+    Changed files are masked and indexed again in a small in-memory delta,
+    `compact` merges the delta into the arrays.
+    """
+
+    def __init__(
+        self,
+        root_directory,
+        paths: List[str],
+        vocabulary: List[str],
+        starts: np.ndarray,
+        ids: np.ndarray,
+        frequencies: np.ndarray,
+        lengths: np.ndarray,
+    ):
+        self.root_directory = Path(root_directory)
+        self.paths = list(paths)
+        self.vocabulary = list(vocabulary)
+        self._term_ids = {term: i for i, term in enumerate(self.vocabulary)}
+        self._ids_by_path = {path: i for i, path in enumerate(self.paths)}
+        self._starts = starts
+        self._ids = ids
+        self._frequencies = frequencies
+        self._lengths = lengths
+        self._removed = set()
+        self._delta: Dict[str, Dict[int, int]] = {}
+        self._delta_lengths: Dict[int, int] = {}
+
+    @classmethod
+    def _from_documents(
+        cls, root_directory, documents: List[Tuple[str, Counter]]
+    ) -> "RelevanceIndex":
+        vocabulary = sorted({term for _, counts in documents for term in counts})
+        term_ids = {term: i for i, term in enumerate(vocabulary)}
+        posting_terms, posting_ids, posting_frequencies = [], [], []
+        for i, (_, counts) in enumerate(documents):
+            posting_terms.extend(term_ids[term] for term in counts)
+            posting_ids.extend([i] * len(counts))
+            posting_frequencies.extend(counts.values())
+        return cls._from_postings(
+            root_directory,
+            [path for path, _ in documents],
+            vocabulary,
+            np.array(posting_terms, dtype=np.uint32),
+            np.array(posting_ids, dtype=np.uint32),
+            np.array(posting_frequencies, dtype=np.uint32),
+            np.array(
+                [sum(counts.values()) for _, counts in documents], dtype=np.uint32
+            ),
+        )
+
+    @classmethod
+    def _from_postings(
+        cls, root_directory, paths, vocabulary, term_ids, ids, frequencies, lengths
+    ) -> "RelevanceIndex":
+        order = np.lexsort((ids, term_ids))
+        starts = np.searchsorted(
+            term_ids[order], np.arange(len(vocabulary) + 1)
+        ).astype(np.uint64)
+        return cls(
+            root_directory,
+            paths,
+            vocabulary,
+            starts,
+            ids[order],
+            frequencies[order],
+            lengths,
+        )
+
+    @classmethod
+    def build(cls, root_directory, paths: Iterable[str]) -> "RelevanceIndex":
+        """
+        Index files.
+        :param root_directory: Directory the paths are relative to
+        :param paths: Relative paths of the files
+        """
+        root_directory = Path(root_directory)
+        documents = []
+        for path in paths:
+            data = _read_text(root_directory / path)
+            if data is not None:
+                text = data.decode("utf-8", errors="replace")
+                documents.append((path, document_terms(path, text)))
+        return cls._from_documents(root_directory, documents)
+
+    def save(self, directory: Path):
+        """Write the index to a directory, replacing it atomically."""
+        directory = Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        temporary = Path(tempfile.mkdtemp(dir=directory.parent))
+        np.save(temporary / "starts.npy", self._starts)
+        np.save(temporary / "ids.npy", self._ids)
+        np.save(temporary / "frequencies.npy", self._frequencies)
+        np.save(temporary / "lengths.npy", self._lengths)
+        (temporary / "vocabulary.txt").write_text("\n".join(self.vocabulary))
+        (temporary / "paths.txt").write_text("\0".join(self.paths))
+        try:
+            temporary.rename(directory)
+        except OSError:
+            # Another task saved the same index first
+            shutil.rmtree(temporary, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: Path, root_directory) -> "RelevanceIndex":
+        """Map a saved index into memory."""
+        directory = Path(directory)
+        paths_text = (directory / "paths.txt").read_text()
+        vocabulary_text = (directory / "vocabulary.txt").read_text()
+        return cls(
+            root_directory,
+            paths_text.split("\0") if paths_text else [],
+            vocabulary_text.split("\n") if vocabulary_text else [],
+            np.load(directory / "starts.npy", mmap_mode="r"),
+            np.load(directory / "ids.npy", mmap_mode="r"),
+            np.load(directory / "frequencies.npy", mmap_mode="r"),
+            np.load(directory / "lengths.npy", mmap_mode="r"),
+        )
+
+    def update(self, paths: Iterable[str]):
+        """Index changed, added or deleted files again."""
+        for path in paths:
+            path = path.lstrip("/")
+            old_id = self._ids_by_path.pop(path, None)
+            if old_id is not None:
+                self._removed.add(old_id)
+            data = _read_text(self.root_directory / path)
+            if data is None:
+                continue
+            new_id = len(self.paths)
+            self.paths.append(path)
+            self._ids_by_path[path] = new_id
+            counts = document_terms(path, data.decode("utf-8", errors="replace"))
+            for term, count in counts.items():
+                self._delta.setdefault(term, {})[new_id] = count
+            self._delta_lengths[new_id] = sum(counts.values())
+
+    def compact(self) -> "RelevanceIndex":
+        """A new index with the delta merged into the arrays and removed files dropped."""
+        live_ids = np.array(sorted(self._ids_by_path.values()), dtype=np.int64)
+        remap = np.full(len(self.paths), -1, dtype=np.int64)
+        remap[live_ids] = np.arange(len(live_ids))
+
+        vocabulary = sorted(set(self.vocabulary) | set(self._delta))
+        term_ids = {term: i for i, term in enumerate(vocabulary)}
+        old_to_new = np.array(
+            [term_ids[term] for term in self.vocabulary], dtype=np.uint32
+        )
+        base_terms = np.repeat(
+            old_to_new, np.diff(np.asarray(self._starts, dtype=np.int64))
+        )
+        base_ids = remap[np.asarray(self._ids, dtype=np.int64)]
+        keep = base_ids >= 0
+        delta_terms, delta_ids, delta_frequencies = [], [], []
+        for term, postings in self._delta.items():
+            for i, count in postings.items():
+                if remap[i] >= 0:
+                    delta_terms.append(term_ids[term])
+                    delta_ids.append(remap[i])
+                    delta_frequencies.append(count)
+        lengths = np.array(
+            [self._length(i) for i in live_ids.tolist()], dtype=np.uint32
+        )
+        return self._from_postings(
+            self.root_directory,
+            [self.paths[i] for i in live_ids.tolist()],
+            vocabulary,
+            np.concatenate([base_terms[keep], np.array(delta_terms, dtype=np.uint32)]),
+            np.concatenate(
+                [base_ids[keep], np.array(delta_ids, dtype=np.int64)]
+            ).astype(np.uint32),
+            np.concatenate(
+                [
+                    np.asarray(self._frequencies)[keep],
+                    np.array(delta_frequencies, dtype=np.uint32),
+                ]
+            ),
+            lengths,
+        )
+
+    def _is_live(self, i: int) -> bool:
+        return self._ids_by_path.get(self.paths[i]) == i
+
+    def _length(self, i: int) -> int:
+        if i < len(self._lengths):
+            return int(self._lengths[i])
+        return self._delta_lengths[i]
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids of the live files that contain a term, and its frequencies."""
+        term_id = self._term_ids.get(term)
+        if term_id is None:
+            ids = np.empty(0, dtype=np.uint32)
+            frequencies = np.empty(0, dtype=np.uint32)
+        else:
+            start = int(self._starts[term_id])
+            end = int(self._starts[term_id + 1])
+            ids = np.asarray(self._ids[start:end])
+            frequencies = np.asarray(self._frequencies[start:end])
+        if self._removed:
+            keep = ~np.isin(ids, np.fromiter(self._removed, dtype=np.uint32))
+            ids, frequencies = ids[keep], frequencies[keep]
+        delta = self._delta.get(term)
+        if delta:
+            live = [i for i in delta if self._is_live(i)]
+            ids = np.concatenate([ids, np.array(live, dtype=np.uint32)])
+            frequencies = np.concatenate(
+                [frequencies, np.array([delta[i] for i in live], dtype=np.uint32)]
+            )
+        return ids, frequencies
+
+    def search(
+        self, query: str, glob: str = "", limit: int = 10
+    ) -> List[Tuple[str, float]]:
+        """
+        The files most relevant to a query, as `(path, score)` by descending score.
+        :param query: Words to look for, e.g. `billing invoice`
+        :param glob: Directory, file or glob pattern to limit the search to
+        :param limit: Maximum number of results
+        """
+        query_terms = set(terms(query))
+        if not query_terms or not self._ids_by_path:
+            return []
+        lengths = np.zeros(len(self.paths), dtype=np.float64)
+        lengths[np.arange(len(self._lengths))] = self._lengths
+        for i, length in self._delta_lengths.items():
+            lengths[i] = length
+        live_ids = np.fromiter(self._ids_by_path.values(), dtype=np.int64)
+        average_length = lengths[live_ids].mean() or 1.0
+        scores = np.zeros(len(self.paths), dtype=np.float64)
+        for term in query_terms:
+            ids, frequencies = self._postings(term)
+            if not len(ids):
+                continue
+            idf = math.log(1 + (len(live_ids) - len(ids) + 0.5) / (len(ids) + 0.5))
+            frequencies = frequencies.astype(np.float64)
+            norms = K1 * (1 - B + B * lengths[ids] / average_length)
+            np.add.at(scores, ids, idf * frequencies * (K1 + 1) / (frequencies + norms))
+        matches_path = path_filter(glob)
+        results = []
+        for i in np.argsort(-scores, kind="stable").tolist():
+            if scores[i] <= 0 or len(results) >= limit:
+                break
+            if matches_path(self.paths[i]):
+                results.append((self.paths[i], float(scores[i])))
+        return results
+
+
+def _previous_index(directory: Path, key: str) -> Optional[Tuple[str, Path]]:
+    """The most recently saved index with the same version and sparse patterns, with its commit."""
+    suffix = key.rpartition("-")[2]
+    candidates = sorted(
+        (
+            path
+            for path in directory.glob(f"*-{suffix}")
+            if path.is_dir() and path.name != key
+        ),
+        key=lambda path: path.stat().st_mtime,
+        reverse=True,
+    )
+    if not candidates:
+        return None
+    return candidates[0].name.rpartition("-")[0], candidates[0]
+
+
+def open_relevance_index(
+    file_system: FileSystem, session: Optional[GitSession]
+) -> RelevanceIndex:
+    """
+    The relevance index of a working tree. Indexes of clean checkouts are saved
+    in the git directory of the mirror. The index of a new commit is derived
+    from the last saved one, indexing only the files changed in between.
+    :param file_system: Tree of the files to index
+    :param session: Git session of the working tree, None if it is not a repository
+    """
+    root = file_system.root_directory
+
+    def indexed(paths):
+        # Deleted files, and files that are not ignored
+        return [
+            path
+            for path in paths
+            if file_system.exists(path) or not (root / path).exists()
+        ]
+
+    if session is None:
+        return RelevanceIndex.build(root, _relative_files(file_system))
+    try:
+        repo = session.repo
+        commit = session.resolve("HEAD")
+        sparse_patterns = (
+            repo.git.sparse_checkout("list")
+            if sparse_checkout_enabled(repo.git)
+            else ""
+        )
+        changed = changed_paths(repo)
+    except (git.InvalidGitRepositoryError, git.GitCommandError, ValueError) as e:
+        logger.info(f"Indexing {root} without saving the index: {e}")
+        return RelevanceIndex.build(root, _relative_files(file_system))
+    key = index_key(commit, sparse_patterns, INDEX_VERSION)
+    directory = Path(repo.common_dir) / INDEX_DIR / key
+    if directory.exists():
+        index = RelevanceIndex.load(directory, root)
+        index.update(indexed(changed))
+        return index
+    index = None
+    previous = (
+        _previous_index(directory.parent, key) if directory.parent.exists() else None
+    )
+    if previous:
+        previous_commit, previous_directory = previous
+        try:
+            committed = repo.git.diff(
+                "--name-only", "-z", "--no-renames", previous_commit, commit
+            )
+        except git.GitCommandError as e:
+            logger.info(f"Cannot reuse the relevance index of {previous_commit}: {e}")
+        else:
+            index = RelevanceIndex.load(previous_directory, root)
+            index.update(indexed(path for path in committed.split("\0") if path))
+            index = index.compact()
+    if index is None:
+        index = RelevanceIndex.build(root, _relative_files(file_system))
+    if changed:
+        index.update(indexed(changed))
+    else:
+        index.save(directory)
+        _prune(directory.parent, settings.CODE_SEARCH_INDEXES_PER_REPOSITORY)
+    return index
@@ -0,0 +1,214 @@
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import git
+from django.conf import settings
+
+from engine.file_system import FileSystem
+from engine.repository import GitSession
+from engine.repository.mirror_cache import sparse_checkout_enabled
+from .symbol_index import SymbolIndex
+from .trigram_index import _prune, _relative_files, changed_paths
+
+logger = logging.getLogger(__name__)
+
+MAP_VERSION = 1
+MAP_DIR = "pr-pilot-maps"
+MAPS_PER_REPOSITORY = 20
+MAX_SYMBOLS_PER_FILE = 6
+OUTLINED_KINDS = ("class", "function", "interface", "type")
+
+
+def _tree(paths: List[str]) -> Dict:
+    """Nested dicts of directories, with None for files."""
+    root = {}
+    for path in paths:
+        *directories, name = path.split("/")
+        node = root
+        for directory in directories:
+            node = node.setdefault(directory, {})
+        node[name] = None
+    return root
+
+
+def _top_level_symbols(symbol_index: SymbolIndex, path: str) -> List[str]:
+    symbols = symbol_index.files.get(path)
+    if symbols is None:
+        return []
+    return [
+        definition.name
+        for definition in symbols.definitions
+        if definition.kind in OUTLINED_KINDS
+        and definition.qualified_name == definition.name
+        # Private helpers and tests tell little about the layout
+        and not definition.name.startswith(("_", "test"))
+    ]
+
+
+def _file_count(tree: Dict) -> int:
+    return sum(1 if child is None else _file_count(child) for child in tree.values())
+
+
+def _has_symbols(tree: Dict, symbol_index: SymbolIndex, prefix: str) -> bool:
+    return any(
+        (
+            _top_level_symbols(symbol_index, prefix + name)
+            if child is None
+            else _has_symbols(child, symbol_index, f"{prefix}{name}/")
+        )
+        for name, child in tree.items()
+    )
+
+
+def _render(
+    tree: Dict,
+    symbol_index: Optional[SymbolIndex],
+    show_files: bool,
+    collapse: bool,
+    lines: List[str],
+    prefix: str = "",
+    indent: str = "",
+):
+    # Files first, then directories, as in `Directory.simple_dict`
+    files = sorted(name for name, child in tree.items() if child is None)
+    directories = sorted(name for name, child in tree.items() if child is not None)
+    if show_files:
+        for name in files:
+            line = f"{indent}{name}"
+            if symbol_index is not None:
+                symbols = _top_level_symbols(symbol_index, prefix + name)
+                if symbols:
+                    more = ", ..." if len(symbols) > MAX_SYMBOLS_PER_FILE else ""
+                    shown = ", ".join(symbols[:MAX_SYMBOLS_PER_FILE])
+                    line += f": {shown}{more}"
+            lines.append(line)
+    for name in directories:
+        child = tree[name]
+        child_prefix = f"{prefix}{name}/"
+        if collapse and not _has_symbols(child, symbol_index, child_prefix):
+            # Directories without code, e.g. templates or assets
+            lines.append(f"{indent}{name}/ ({_file_count(child)} files)")
+            continue
+        if show_files:
+            lines.append(f"{indent}{name}/")
+        else:
+            file_count = sum(1 for grandchild in child.values() if grandchild is None)
+            lines.append(f"{indent}{name}/ ({file_count} files)")
+        _render(
+            child,
+            symbol_index,
+            show_files,
+            collapse,
+            lines,
+            child_prefix,
+            indent + "  ",
+        )
+
+
+def render_repository_map(
+    paths: List[str], symbol_index: Optional[SymbolIndex], max_chars: int
+) -> str:
+    """
+    Outline directories, files and their top-level classes and functions. Less
+    detail is shown until the outline fits: first directories without symbols
+    are collapsed, then symbols and then files are left out. The last resort
+    is to cut the outline off.
+    :param paths: Relative paths of the files
+    :param symbol_index: Index to take the symbols from
+    :param max_chars: Maximum length of the outline
+    """
+    tree = _tree(sorted(paths))
+    text = ""
+    levels = [(False, True, False), (False, False, False)]
+    if symbol_index is not None:
+        levels[:0] = [(True, True, False), (True, True, True)]
+    for with_symbols, show_files, collapse in levels:
+        lines = []
+        _render(
+            tree,
+            symbol_index if with_symbols else None,
+            show_files,
+            collapse,
+            lines,
+        )
+        text = "\n".join(lines)
+        if len(text) <= max_chars:
+            return text
+    cut = text.rfind("\n", 0, max_chars - 4)
+    return text[: max(cut, 0)] + "\n..."
+
+
+def map_key(tree: str, sparse_patterns: str, max_chars: int) -> str:
+    """Name of the saved map of a tree checked out with given sparse patterns."""
+    digest = hashlib.sha1(
+        f"{MAP_VERSION}\0{sparse_patterns}\0{max_chars}".encode(),
+        usedforsecurity=False,
+    ).hexdigest()
+    return f"{tree}-{digest[:12]}.txt"
+
+
+def load_repository_map(
+    file_system: FileSystem,
+    session: Optional[GitSession],
+    symbol_index: Callable[[], SymbolIndex],
+    max_chars: int = None,
+) -> str:
+    """
+    The repository map of a working tree. Maps of clean checkouts are saved in
+    the git directory of the mirror by tree SHA, so tasks on the same tree
+    share them without parsing anything. Otherwise the map is rendered from
+    the symbol index, which parses only blobs it has not seen before.
+    :param file_system: Tree of the files to outline
+    :param session: Git session of the working tree, None if it is not a repository
+    :param symbol_index: Returns the symbol index of the working tree, called on a cache miss
+    :param max_chars: Maximum length of the map
+    """
+    max_chars = (
+        max_chars if max_chars is not None else settings.REPOSITORY_MAP_MAX_CHARS
+    )
+
+    def render() -> str:
+        return render_repository_map(
+            _relative_files(file_system), symbol_index(), max_chars
+        )
+
+    if session is None:
+        return render()
+    try:
+        repo = session.repo
+        tree = session.resolve("HEAD^{tree}")
+        sparse_patterns = (
+            repo.git.sparse_checkout("list")
+            if sparse_checkout_enabled(repo.git)
+            else ""
+        )
+        changed = changed_paths(repo)
+    except (git.InvalidGitRepositoryError, git.GitCommandError, ValueError) as e:
+        logger.info(f"Rendering the repository map without saving it: {e}")
+        return render()
+    if tree is None or changed:
+        return render()
+    path = Path(repo.common_dir) / MAP_DIR / map_key(tree, sparse_patterns, max_chars)
+    try:
+        return path.read_text()
+    except FileNotFoundError:
+        pass
+    text = render()
+    try:
+        if changed_paths(repo):
+            # The working tree changed while the map was rendered
+            return text
+    except git.GitCommandError as e:
+        logger.info(f"Not saving the repository map: {e}")
+        return text
+    path.parent.mkdir(parents=True, exist_ok=True)
+    file_descriptor, temporary = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(file_descriptor, "w") as file:
+        file.write(text)
+    os.replace(temporary, path)
+    _prune(path.parent, MAPS_PER_REPOSITORY)
+    return text
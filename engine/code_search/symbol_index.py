@@ -0,0 +1,274 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import git
+from django.conf import settings
+
+from engine.file_system import FileSystem
+from engine.repository import GitSession
+from .symbol_parsers import Definition, FileSymbols, SymbolParser, parser_for
+from .trigram_index import _read_text, _relative_files, changed_paths, path_filter
+
+logger = logging.getLogger(__name__)
+
+SYMBOL_DIR = "pr-pilot-symbols"
+
+
+def blob_sha(data: bytes) -> str:
+    """The SHA git gives a blob with this content, as `git hash-object` does."""
+    header = b"blob %d\0" % len(data)
+    return hashlib.sha1(header + data, usedforsecurity=False).hexdigest()
+
+
+def staged_blob_shas(repo: git.Repo) -> Dict[str, str]:
+    """Blob SHAs of the files in the index, by relative path."""
+    shas = {}
+    for entry in repo.git.ls_files("--stage", "-z").split("\0"):
+        if entry:
+            info, _, path = entry.partition("\t")
+            shas[path] = info.split()[1]
+    return shas
+
+
+class SymbolCache:
+    """Parse results by parser and blob SHA.
+
+    Results are kept in memory, and on disk if a directory is given, so a file
+    is parsed once no matter how many tasks and commits contain it.
+    """
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = (
+            max_entries if max_entries is not None else settings.SYMBOL_CACHE_ENTRIES
+        )
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _file(directory: Path, parser: SymbolParser, sha: str) -> Path:
+        return directory / parser.cache_key / sha[:2] / f"{sha[2:]}.json"
+
+    def get(
+        self, parser: SymbolParser, sha: str, directory: Optional[Path] = None
+    ) -> Optional[FileSymbols]:
+        key = (parser.cache_key, sha)
+        with self._lock:
+            symbols = self._entries.get(key)
+            if symbols is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return symbols
+        if directory is not None:
+            try:
+                data = json.loads(self._file(directory, parser, sha).read_text())
+            except (FileNotFoundError, ValueError):
+                pass
+            else:
+                symbols = FileSymbols.from_json(data)
+                self._remember(key, symbols)
+                with self._lock:
+                    self.hits += 1
+                return symbols
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(
+        self,
+        parser: SymbolParser,
+        sha: str,
+        symbols: FileSymbols,
+        directory: Optional[Path] = None,
+    ):
+        self._remember((parser.cache_key, sha), symbols)
+        if directory is None:
+            return
+        path = self._file(directory, parser, sha)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        file_descriptor, temporary = tempfile.mkstemp(dir=path.parent)
+        with os.fdopen(file_descriptor, "w") as file:
+            json.dump(symbols.to_json(), file, separators=(",", ":"))
+        os.replace(temporary, path)
+
+    def _remember(self, key, symbols: FileSymbols):
+        with self._lock:
+            self._entries[key] = symbols
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+symbol_cache = SymbolCache()
+
+
+def parse_file(
+    root_directory,
+    path: str,
+    sha: Optional[str] = None,
+    cache_directory: Optional[Path] = None,
+) -> Optional[FileSymbols]:
+    """
+    The symbols of a file, parsed only if its blob is not in the cache.
+    :param root_directory: Directory the path is relative to
+    :param path: Relative path of the file
+    :param sha: Blob SHA of the file, None to hash its content
+    :param cache_directory: Where parse results are saved, if at all
+    :return: None if no parser handles the file, or it is not a text file
+    """
+    parser = parser_for(path)
+    if parser is None:
+        return None
+    if sha is not None:
+        symbols = symbol_cache.get(parser, sha, cache_directory)
+        if symbols is not None:
+            return symbols
+    data = _read_text(Path(root_directory) / path)
+    if data is None:
+        return None
+    if sha is None:
+        sha = blob_sha(data)
+        symbols = symbol_cache.get(parser, sha, cache_directory)
+        if symbols is not None:
+            return symbols
+    symbols = parser.parse(data.decode("utf-8", errors="replace"))
+    symbol_cache.put(parser, sha, symbols, cache_directory)
+    return symbols
+
+
+def symbol_cache_directory(session: Optional[GitSession]) -> Optional[Path]:
+    """Where parse results of a repository are saved, None if it is not a repository."""
+    if session is None:
+        return None
+    return Path(session.repo.common_dir) / SYMBOL_DIR
+
+
+class SymbolIndex:
+    """Where names are defined and used, by file and line.
+
+    Files are parsed by the parser registered for their extension, see
+    `symbol_parsers.register_parser`. Files without a parser are skipped.
+    """
+
+    def __init__(self, root_directory, cache_directory: Optional[Path] = None):
+        self.root_directory = Path(root_directory)
+        self.cache_directory = cache_directory
+        self.files: Dict[str, FileSymbols] = {}
+        self._definitions: Dict[str, Dict[str, List[Definition]]] = defaultdict(dict)
+        self._references: Dict[str, Dict[str, List[int]]] = defaultdict(dict)
+
+    @classmethod
+    def build(
+        cls,
+        root_directory,
+        blobs: Dict[str, Optional[str]],
+        cache_directory: Optional[Path] = None,
+    ) -> "SymbolIndex":
+        """
+        Index files.
+        :param root_directory: Directory the paths are relative to
+        :param blobs: Blob SHAs by relative path, None if the file must be hashed
+        :param cache_directory: Where parse results are saved, if at all
+        """
+        index = cls(root_directory, cache_directory)
+        for path, sha in blobs.items():
+            index._index(path, sha)
+        return index
+
+    def _index(self, path: str, sha: Optional[str]):
+        symbols = parse_file(self.root_directory, path, sha, self.cache_directory)
+        if symbols is None:
+            return
+        self.files[path] = symbols
+        for definition in symbols.definitions:
+            self._definitions[definition.name].setdefault(path, []).append(definition)
+        for name, line in symbols.references:
+            self._references[name].setdefault(path, []).append(line)
+
+    def _forget(self, path: str):
+        symbols = self.files.pop(path, None)
+        if symbols is None:
+            return
+        for definition in symbols.definitions:
+            self._definitions[definition.name].pop(path, None)
+        for name, _ in symbols.references:
+            self._references[name].pop(path, None)
+
+    def update(self, paths: Iterable[str]):
+        """Index changed, added or deleted files again."""
+        for path in paths:
+            path = path.lstrip("/")
+            self._forget(path)
+            self._index(path, None)
+
+    def definitions(self, name: str, glob: str = "") -> List[Tuple[str, Definition]]:
+        """
+        Definitions of a symbol, sorted by path and line.
+        :param name: Name of the symbol, optionally qualified, e.g. `Project.materialize`
+        :param glob: Directory, file or glob pattern to limit the lookup to
+        """
+        short_name = name.rpartition(".")[2]
+        matches_path = path_filter(glob)
+        return sorted(
+            (
+                (path, definition)
+                for path, definitions in self._definitions.get(short_name, {}).items()
+                if matches_path(path)
+                for definition in definitions
+                if definition.qualified_name == name
+                or definition.qualified_name.endswith("." + name)
+            ),
+            key=lambda match: (match[0], match[1].line),
+        )
+
+    def references(self, name: str, glob: str = "") -> List[Tuple[str, int]]:
+        """
+        Lines that use a name, as `(path, line)` sorted by path and line. Uses
+        of qualified names are looked up by their last part.
+        """
+        short_name = name.rpartition(".")[2]
+        matches_path = path_filter(glob)
+        return [
+            (path, line)
+            for path, lines in sorted(self._references.get(short_name, {}).items())
+            if matches_path(path)
+            for line in sorted(set(lines))
+        ]
+
+
+def open_symbol_index(
+    file_system: FileSystem, session: Optional[GitSession]
+) -> SymbolIndex:
+    """
+    The symbol index of a working tree. Files that are unchanged since the last
+    commit are looked up by their blob SHA and parsed only if no task parsed
+    the same content before.
+    :param file_system: Tree of the files to index
+    :param session: Git session of the working tree, None if it is not a repository
+    """
+    paths = [path for path in _relative_files(file_system) if parser_for(path)]
+    staged, changed, cache_directory = {}, set(), None
+    if session is not None:
+        try:
+            repo = session.repo
+            staged = staged_blob_shas(repo)
+            changed = set(changed_paths(repo))
+            cache_directory = symbol_cache_directory(session)
+        except (git.InvalidGitRepositoryError, git.GitCommandError, ValueError) as e:
+            logger.info(f"Indexing symbols without a cache on disk: {e}")
+    blobs = {path: None if path in changed else staged.get(path) for path in paths}
+    return SymbolIndex.build(file_system.root_directory, blobs, cache_directory)
@@ -0,0 +1,322 @@
+import ast
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Definition:
+    name: str
+    kind: str  # class, function, method, variable, ...
+    qualified_name: str  # e.g. `Project.checkout_branch`
+    line: int
+    end_line: int
+
+
+@dataclass
+class FileSymbols:
+    """The symbols one file defines and the names it refers to."""
+
+    definitions: List[Definition] = field(default_factory=list)
+    references: List[Tuple[str, int]] = field(default_factory=list)  # Name, line
+
+    def to_json(self) -> dict:
+        return {
+            "definitions": [
+                [d.name, d.kind, d.qualified_name, d.line, d.end_line]
+                for d in self.definitions
+            ],
+            "references": self.references,
+        }
+
+    def outline(self) -> List[str]:
+        """Definitions with their line spans, indented by nesting."""
+        lines = []
+        enclosing: List[Definition] = []
+        for definition in sorted(self.definitions, key=lambda d: (d.line, -d.end_line)):
+            while enclosing and enclosing[-1].end_line < definition.line:
+                enclosing.pop()
+            indent = "  " * len(enclosing)
+            lines.append(
+                f"{indent}{definition.kind} {definition.name} "
+                f"(lines {definition.line}-{definition.end_line})"
+            )
+            if definition.end_line > definition.line:
+                enclosing.append(definition)
+        return lines
+
+    @classmethod
+    def from_json(cls, data: dict) -> "FileSymbols":
+        return cls(
+            definitions=[Definition(*definition) for definition in data["definitions"]],
+            references=[tuple(reference) for reference in data["references"]],
+        )
+
+
+@dataclass(frozen=True)
+class SymbolParser:
+    """Extract symbols from the text of a file.
+
+    `version` is part of the cache key of parse results, so increase it when
+    the output of `parse` changes.
+    """
+
+    name: str
+    version: int
+    parse: Callable[[str], FileSymbols]
+
+    @property
+    def cache_key(self) -> str:
+        return f"{self.name}-{self.version}"
+
+
+_parsers: Dict[str, SymbolParser] = {}
+
+
+def register_parser(extensions: List[str], parser: SymbolParser):
+    """Parse files with the given extensions, e.g. `[".py"]`, with `parser`."""
+    for extension in extensions:
+        _parsers[extension] = parser
+
+
+def parser_for(path: str) -> Optional[SymbolParser]:
+    name = path.rpartition("/")[2]
+    if "." not in name:
+        return None
+    return _parsers.get("." + name.rpartition(".")[2].lower())
+
+
+class _PythonVisitor(ast.NodeVisitor):
+    def __init__(self):
+        self.symbols = FileSymbols()
+        self._scopes: List[Tuple[str, str]] = []  # Name, kind
+
+    def _define(self, name: str, kind: str, node: ast.AST):
+        qualified_name = ".".join([scope for scope, _ in self._scopes] + [name])
+        self.symbols.definitions.append(
+            Definition(
+                name,
+                kind,
+                qualified_name,
+                node.lineno,
+                getattr(node, "end_lineno", None) or node.lineno,
+            )
+        )
+
+    def _scoped(self, name: str, kind: str, node: ast.AST):
+        self._define(name, kind, node)
+        self._scopes.append((name, kind))
+        self.generic_visit(node)
+        self._scopes.pop()
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self._scoped(node.name, "class", node)
+
+    def visit_FunctionDef(self, node):
+        in_class = bool(self._scopes) and self._scopes[-1][1] == "class"
+        self._scoped(node.name, "method" if in_class else "function", node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def _assignment(self, targets, node):
+        # Only module and class attributes, local variables are too noisy
+        if not self._scopes or self._scopes[-1][1] == "class":
+            for target in targets:
+                if isinstance(target, ast.Name):
+                    self._define(target.id, "variable", target)
+        self.generic_visit(node)
+
+    def visit_Assign(self, node: ast.Assign):
+        self._assignment(node.targets, node)
+
+    def visit_AnnAssign(self, node: ast.AnnAssign):
+        self._assignment([node.target], node)
+
+    def visit_Name(self, node: ast.Name):
+        if isinstance(node.ctx, ast.Load):
+            self.symbols.references.append((node.id, node.lineno))
+
+    def visit_Attribute(self, node: ast.Attribute):
+        if isinstance(node.ctx, ast.Load):
+            self.symbols.references.append((node.attr, node.end_lineno or node.lineno))
+        self.generic_visit(node)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        for alias in node.names:
+            self.symbols.references.append((alias.name, node.lineno))
+
+
+def parse_python(text: str) -> FileSymbols:
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError) as e:
+        logger.debug(f"Cannot parse Python code: {e}")
+        return FileSymbols()
+    visitor = _PythonVisitor()
+    visitor.visit(tree)
+    return visitor.symbols
+
+
+IDENTIFIER = re.compile(r"\b[A-Za-z_$][\w$]*\b")
+# String literals and line comments, where braces do not count
+NOT_CODE = re.compile(r"\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'|`[^`]*`|//.*")
+MAX_BLOCK_LINES = 5000
+# Definitions whose names qualify the names defined inside of them
+CONTAINER_KINDS = ("class", "interface", "impl", "module", "type")
+
+
+def _block_end(lines: List[str], start: int) -> int:
+    """
+    Index of the line that closes the brace block opened at or after `start`.
+    A statement that ends before any brace opens, e.g. `type Id = string;`,
+    ends on its own line.
+    """
+    depth = 0
+    opened = False
+    for i in range(start, min(len(lines), start + MAX_BLOCK_LINES)):
+        code = NOT_CODE.sub("", lines[i])
+        for character in code:
+            if character == "{":
+                depth += 1
+                opened = True
+            elif character == "}":
+                depth -= 1
+                if opened and depth <= 0:
+                    return i
+            elif character == ";" and not opened:
+                return i
+    return start
+
+
+def regex_parser(
+    name: str,
+    version: int,
+    patterns: Dict[str, str],
+    keywords: str = "",
+    braces: bool = False,
+) -> SymbolParser:
+    """
+    A parser for languages without a parser at hand. Definitions are found
+    line by line with regular expressions, every other identifier counts as
+    a reference.
+    :param patterns: Regular expressions by kind, the first group is the name
+    :param keywords: Identifiers that are never references
+    :param braces: Whether blocks are delimited by braces, so a definition ends
+      where its block does. Otherwise it spans one line.
+    """
+    compiled = {kind: re.compile(pattern) for kind, pattern in patterns.items()}
+    ignored = set(keywords.split())
+
+    def parse(text: str) -> FileSymbols:
+        symbols = FileSymbols()
+        lines = text.splitlines()
+        enclosing: List[Definition] = []
+        for i, line in enumerate(lines):
+            number = i + 1
+            defined = set()
+            while enclosing and enclosing[-1].end_line < number:
+                enclosing.pop()
+            for kind, pattern in compiled.items():
+                match = pattern.match(line)
+                if not match:
+                    continue
+                symbol = match.group(1)
+                defined.add(symbol)
+                if kind == "variable" and any(
+                    outer.kind not in CONTAINER_KINDS for outer in enclosing
+                ):
+                    # Local variables are too noisy
+                    break
+                qualified_name = ".".join(
+                    [outer.name for outer in enclosing] + [symbol]
+                )
+                end = _block_end(lines, i) + 1 if braces else number
+                definition = Definition(symbol, kind, qualified_name, number, end)
+                symbols.definitions.append(definition)
+                if end > number:
+                    enclosing.append(definition)
+                break
+            for identifier in IDENTIFIER.findall(line):
+                if identifier not in defined and identifier not in ignored:
+                    symbols.references.append((identifier, number))
+        return symbols
+
+    return SymbolParser(name, version, parse)
+
+
+register_parser([".py", ".pyi"], SymbolParser("python", 1, parse_python))
+register_parser(
+    [".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx"],
+    regex_parser(
+        "javascript",
+        2,
+        {
+            "function": r"\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*([\w$]+)",
+            "class": r"\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+([\w$]+)",
+            "interface": r"\s*(?:export\s+)?interface\s+([\w$]+)",
+            "type": r"\s*(?:export\s+)?type\s+([\w$]+)\s*=",
+            "variable": r"\s*(?:export\s+)?(?:const|let|var)\s+([\w$]+)\s*=",
+            "method": r"\s+(?:(?:static|async|get|set|public|private|protected)\s+)*\*?"
+            r"(?!(?:if|for|while|switch|catch|function|return)\b)([\w$]+)\s*\([^)]*\)[^;]*\{\s*$",
+        },
+        keywords="async await break case catch class const continue default delete do else "
+        "export extends false finally for from function if import in instanceof interface "
+        "let new null return static super switch this throw true try type typeof undefined "
+        "var void while yield",
+        braces=True,
+    ),
+)
+register_parser(
+    [".go"],
+    regex_parser(
+        "go",
+        2,
+        {
+            "function": r"func\s+(?:\([^)]*\)\s*)?(\w+)",
+            "type": r"type\s+(\w+)",
+        },
+        keywords="break case chan const continue default defer else fallthrough false for "
+        "func go goto if import interface map nil package range return select struct "
+        "switch true type var",
+        braces=True,
+    ),
+)
+register_parser(
+    [".java", ".kt", ".cs"],
+    regex_parser(
+        "java",
+        1,
+        {
+            "class": r"\s*(?:(?:public|private|protected|internal|static|final|abstract|sealed|"
+            r"partial|data|open)\s+)*(?:class|interface|enum|record|object)\s+(\w+)",
+            "method": r"\s*(?:(?:public|private|protected|internal|static|final|abstract|"
+            r"synchronized|override|async|virtual)\s+)+[\w<>\[\],.?\s]*?(\w+)\s*\([^;]*$",
+            "function": r"\s*(?:(?:private|public|internal|override|suspend)\s+)*fun\s+(?:<[^>]*>\s*)?(?:\w+\.)?(\w+)",
+        },
+        keywords="abstract boolean break case catch class continue default do double else enum "
+        "extends false final finally float for fun if implements import int interface long "
+        "new null object override package private protected public return static string "
+        "super switch this throw throws true try val var void while",
+        braces=True,
+    ),
+)
+register_parser(
+    [".rs"],
+    regex_parser(
+        "rust",
+        1,
+        {
+            "function": r"\s*(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?(?:unsafe\s+)?fn\s+(\w+)",
+            "type": r"\s*(?:pub(?:\([^)]*\))?\s+)?(?:struct|enum|trait|type|union)\s+(\w+)",
+            "impl": r"\s*impl(?:<[^>]*>)?\s+(?:[\w:<>]+\s+for\s+)?(\w+)",
+            "module": r"\s*(?:pub(?:\([^)]*\))?\s+)?mod\s+(\w+)",
+        },
+        keywords="as async await break const continue crate else enum false fn for if impl in "
+        "let loop match mod move mut pub ref return self static struct super trait true type "
+        "unsafe use where while",
+        braces=True,
+    ),
+)
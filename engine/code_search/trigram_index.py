@@ -0,0 +1,415 @@
+import fnmatch
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import partial, reduce
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import git
+import numpy as np
+from django.conf import settings
+
+from engine.file_system import FileSystem
+from engine.file_system.content_cache import SNIFF_BYTES, content_cache, is_binary
+from engine.repository import GitSession
+from engine.repository.mirror_cache import sparse_checkout_enabled
+from .regex_query import AllOf, AnyOf, Literal, Query, required_literals, trigrams
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+INDEX_DIR = "pr-pilot-search"
+
+
+def _trigram_ids(data: bytes) -> np.ndarray:
+    """The distinct case-folded trigrams of a text, as sorted 24-bit integers."""
+    values = np.frombuffer(data.lower(), dtype=np.uint8).astype(np.uint32)
+    if len(values) < 3:
+        return np.empty(0, dtype=np.uint32)
+    return np.unique((values[:-2] << 16) | (values[1:-1] << 8) | values[2:])
+
+
+def _trigram_id(trigram: bytes) -> int:
+    return (trigram[0] << 16) | (trigram[1] << 8) | trigram[2]
+
+
+def _read_text(path: Path) -> Optional[bytes]:
+    """The bytes of a text file, None for binary, oversized or missing files."""
+    try:
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size > settings.MAX_FILE_BYTES:
+                return None
+            data = file.read()
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+        return None
+    return None if is_binary(data[:SNIFF_BYTES]) else data
+
+
+def _expand_braces(pattern: str) -> List[str]:
+    """Expand `*.{c,h}` into `*.c` and `*.h`, as shells do."""
+    match = re.search(r"\{([^{}]*)\}", pattern)
+    if not match:
+        return [pattern]
+    start, end = match.span()
+    head, tail = pattern[:start], pattern[end:]
+    return [
+        expanded
+        for option in match.group(1).split(",")
+        for expanded in _expand_braces(head + option + tail)
+    ]
+
+
+def path_filter(glob: str):
+    """
+    A predicate for relative paths from a `glob` argument of the search tools.
+    :param glob: A directory or file, e.g. `src`, or a glob, e.g. `*.{c,h}`
+    """
+    glob = glob.strip().strip("/")
+    if not glob or glob == ".":
+        return lambda path: True
+    patterns = _expand_braces(glob)
+
+    def matches(path: str) -> bool:
+        if path == glob or path.startswith(glob + "/"):
+            return True
+        name = path.rpartition("/")[2]
+        return any(
+            fnmatch.fnmatchcase(path, pattern) or fnmatch.fnmatchcase(name, pattern)
+            for pattern in patterns
+        )
+
+    return matches
+
+
+@dataclass
+class SearchWindow:
+    """Consecutive lines of a file around one or more matches."""
+
+    path: str
+    start: int  # Number of the first line, counting from 1
+    lines: List[str]
+    matches: List[int]  # Numbers of the matching lines
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.lines) - 1
+
+
+class TrigramIndex:
+    """Find the files that may match a regular expression without reading all of them.
+
+    For every trigram, the index lists the files that contain it, ignoring
+    the case of ASCII letters. A regex query is narrowed down to the files
+    that contain all trigrams of its required literals, and only those files
+    are matched.
+
+    The postings are three flat arrays: the sorted trigrams, where the
+    postings of each trigram start, and the file ids. Files changed after the
+    index was built are masked and indexed again in a small in-memory delta.
+    """
+
+    def __init__(
+        self,
+        root_directory,
+        paths: List[str],
+        keys: np.ndarray,
+        starts: np.ndarray,
+        ids: np.ndarray,
+    ):
+        self.root_directory = Path(root_directory)
+        self.paths = list(paths)
+        self._ids_by_path = {path: i for i, path in enumerate(self.paths)}
+        self._keys = keys
+        self._starts = starts
+        self._ids = ids
+        self._removed: Set[int] = set()
+        self._delta: Dict[int, Set[int]] = defaultdict(set)
+
+    @classmethod
+    def build(cls, root_directory, paths: Iterable[str]) -> "TrigramIndex":
+        """
+        Index files.
+        :param root_directory: Directory the paths are relative to
+        :param paths: Relative paths of the files
+        """
+        root_directory = Path(root_directory)
+        indexed_paths = []
+        trigram_chunks = []
+        id_chunks = []
+        for path in paths:
+            data = _read_text(root_directory / path)
+            if data is None:
+                continue
+            file_trigrams = _trigram_ids(data)
+            trigram_chunks.append(file_trigrams)
+            id_chunks.append(
+                np.full(len(file_trigrams), len(indexed_paths), dtype=np.uint32)
+            )
+            indexed_paths.append(path)
+        if trigram_chunks:
+            all_trigrams = np.concatenate(trigram_chunks)
+            all_ids = np.concatenate(id_chunks)
+        else:
+            all_trigrams = np.empty(0, dtype=np.uint32)
+            all_ids = np.empty(0, dtype=np.uint32)
+        # A stable sort keeps the ids of each trigram in ascending order
+        order = np.argsort(all_trigrams, kind="stable")
+        sorted_trigrams = all_trigrams[order]
+        keys, starts = np.unique(sorted_trigrams, return_index=True)
+        starts = np.append(starts, len(sorted_trigrams)).astype(np.uint64)
+        return cls(root_directory, indexed_paths, keys, starts, all_ids[order])
+
+    def save(self, directory: Path):
+        """Write the index to a directory, replacing it atomically."""
+        directory = Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        temporary = Path(tempfile.mkdtemp(dir=directory.parent))
+        np.save(temporary / "keys.npy", self._keys)
+        np.save(temporary / "starts.npy", self._starts)
+        np.save(temporary / "ids.npy", self._ids)
+        (temporary / "paths.txt").write_text("\0".join(self.paths))
+        try:
+            temporary.rename(directory)
+        except OSError:
+            # Another task saved the same index first
+            shutil.rmtree(temporary, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: Path, root_directory) -> "TrigramIndex":
+        """Map a saved index into memory."""
+        directory = Path(directory)
+        paths_text = (directory / "paths.txt").read_text()
+        return cls(
+            root_directory,
+            paths_text.split("\0") if paths_text else [],
+            np.load(directory / "keys.npy", mmap_mode="r"),
+            np.load(directory / "starts.npy", mmap_mode="r"),
+            np.load(directory / "ids.npy", mmap_mode="r"),
+        )
+
+    def update(self, paths: Iterable[str]):
+        """Index changed, added or deleted files again."""
+        for path in paths:
+            path = path.lstrip("/")
+            old_id = self._ids_by_path.pop(path, None)
+            if old_id is not None:
+                self._removed.add(old_id)
+            data = _read_text(self.root_directory / path)
+            if data is None:
+                continue
+            new_id = len(self.paths)
+            self.paths.append(path)
+            self._ids_by_path[path] = new_id
+            for trigram in _trigram_ids(data).tolist():
+                self._delta[trigram].add(new_id)
+
+    def _postings(self, trigram: int) -> np.ndarray:
+        """Sorted ids of the files that contain a trigram."""
+        position = int(np.searchsorted(self._keys, trigram))
+        if position < len(self._keys) and self._keys[position] == trigram:
+            start = int(self._starts[position])
+            end = int(self._starts[position + 1])
+            ids = self._ids[start:end]
+        else:
+            ids = np.empty(0, dtype=np.uint32)
+        delta = self._delta.get(trigram)
+        if delta:
+            ids = np.union1d(ids, np.fromiter(delta, dtype=np.uint32))
+        return ids
+
+    def _candidates(self, query: Query) -> Optional[np.ndarray]:
+        """Sorted ids of the files that may match, None for all files."""
+        if query is None:
+            return None
+        if isinstance(query, Literal):
+            literal_trigrams = trigrams(query.text)
+            if literal_trigrams is None:
+                return None
+            postings = sorted(
+                (self._postings(_trigram_id(trigram)) for trigram in literal_trigrams),
+                key=len,
+            )
+            return reduce(partial(np.intersect1d, assume_unique=True), postings)
+        if isinstance(query, AllOf):
+            parts = [self._candidates(part) for part in query.parts]
+            parts = sorted((part for part in parts if part is not None), key=len)
+            if not parts:
+                return None
+            return reduce(partial(np.intersect1d, assume_unique=True), parts)
+        if isinstance(query, AnyOf):
+            parts = [self._candidates(part) for part in query.parts]
+            if any(part is None for part in parts):
+                return None
+            return reduce(np.union1d, parts)
+        raise TypeError(f"Unknown query {query!r}")
+
+    def _candidate_ids(self, pattern: str) -> List[int]:
+        ids = self._candidates(required_literals(pattern))
+        if ids is None:
+            return sorted(self._ids_by_path.values())
+        if self._removed:
+            ids = ids[~np.isin(ids, np.fromiter(self._removed, dtype=np.uint32))]
+        return ids.tolist()
+
+    def candidates(self, pattern: str) -> List[str]:
+        """Paths of the files that may match a regular expression, in index order."""
+        return [self.paths[i] for i in self._candidate_ids(pattern)]
+
+    def _matching_files(
+        self, regex: re.Pattern, glob: str
+    ) -> Iterator[Tuple[str, str]]:
+        """Path and text of the readable candidate files, read one at a time."""
+        matches_path = path_filter(glob)
+        for i in self._candidate_ids(regex.pattern):
+            path = self.paths[i]
+            if not matches_path(path):
+                continue
+            try:
+                content = content_cache.read(self.root_directory / path)
+            except FileNotFoundError:
+                continue
+            if content.readable:
+                yield path, content.text
+
+    @staticmethod
+    def _matching_lines(regex: re.Pattern, text: str) -> Iterator[Tuple[int, str]]:
+        """Number and text of each line with a match."""
+        line_number, counted_to, last_line_start = 1, 0, -1
+        for match in regex.finditer(text):
+            line_start = text.rfind("\n", 0, match.start()) + 1
+            if line_start == last_line_start:
+                continue
+            line_number += text.count("\n", counted_to, line_start)
+            counted_to = last_line_start = line_start
+            line_end = text.find("\n", line_start)
+            yield line_number, (
+                text[line_start:] if line_end == -1 else text[line_start:line_end]
+            )
+
+    def search(self, pattern: str, glob: str = "") -> Iterator[str]:
+        """
+        Yield matching lines as `path:line:text`, like `rg -n`. Files are read
+        lazily, so stopping early skips the remaining candidates.
+        :param pattern: Regular expression
+        :param glob: Directory, file or glob pattern to limit the search to
+        """
+        regex = re.compile(pattern, re.MULTILINE)
+        for path, text in self._matching_files(regex, glob):
+            for line_number, line in self._matching_lines(regex, text):
+                yield f"{path}:{line_number}:{line}"
+
+    def search_windows(
+        self, pattern: str, glob: str = "", context: int = 3
+    ) -> Iterator[SearchWindow]:
+        """
+        Yield the lines around matches, file by file. Windows that overlap or
+        touch are merged, so every line is yielded once. Lazy like `search`.
+        :param pattern: Regular expression
+        :param glob: Directory, file or glob pattern to limit the search to
+        :param context: Number of lines before and after each match
+        """
+        regex = re.compile(pattern, re.MULTILINE)
+        for path, text in self._matching_files(regex, glob):
+            lines = None
+            window = None
+            for line_number, _ in self._matching_lines(regex, text):
+                if lines is None:
+                    lines = text.split("\n")
+                    if text.endswith("\n"):
+                        lines.pop()
+                if line_number > len(lines):
+                    # An empty match after the last newline
+                    continue
+                start = max(line_number - context, 1)
+                end = min(line_number + context, len(lines))
+                if window and start <= window.end + 1:
+                    last = window.end
+                    window.lines.extend(lines[last:end])
+                    window.matches.append(line_number)
+                    continue
+                if window:
+                    yield window
+                first = start - 1
+                window = SearchWindow(path, start, lines[first:end], [line_number])
+            if window:
+                yield window
+
+
+def index_key(commit: str, sparse_patterns: str, version: int = INDEX_VERSION) -> str:
+    """Name of the saved index of a commit checked out with given sparse patterns."""
+    digest = hashlib.sha1(
+        f"{version}\0{sparse_patterns}".encode(), usedforsecurity=False
+    ).hexdigest()
+    return f"{commit}-{digest[:12]}"
+
+
+def _prune(directory: Path, keep: int):
+    """Remove all but the `keep` most recently saved indexes, or files."""
+    indexes = sorted(
+        directory.iterdir(),
+        key=lambda path: path.stat().st_mtime,
+        reverse=True,
+    )
+    for path in indexes[keep:]:
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+
+
+def changed_paths(repo: git.Repo) -> List[str]:
+    """Paths that differ between the working tree and HEAD, untracked ones included."""
+    output = repo.git.status(
+        "--porcelain", "-z", "--untracked-files=all", "--no-renames"
+    )
+    return [entry[3:] for entry in output.split("\0") if entry]
+
+
+def open_index(file_system: FileSystem, session: Optional[GitSession]) -> TrigramIndex:
+    """
+    The index of a working tree. Indexes of clean checkouts are saved in the
+    git directory of the mirror and shared by all tasks on the same commit.
+    :param file_system: Tree of the files to index
+    :param session: Git session of the working tree, None if it is not a repository
+    """
+    root = file_system.root_directory
+    if session is None:
+        return TrigramIndex.build(root, _relative_files(file_system))
+    try:
+        repo = session.repo
+        commit = session.resolve("HEAD")
+        sparse_patterns = (
+            repo.git.sparse_checkout("list")
+            if sparse_checkout_enabled(repo.git)
+            else ""
+        )
+        changed = changed_paths(repo)
+    except (git.InvalidGitRepositoryError, git.GitCommandError, ValueError) as e:
+        logger.info(f"Indexing {root} without saving the index: {e}")
+        return TrigramIndex.build(root, _relative_files(file_system))
+    directory = Path(repo.common_dir) / INDEX_DIR / index_key(commit, sparse_patterns)
+    if directory.exists():
+        index = TrigramIndex.load(directory, root)
+        # Deleted files, and files that are not ignored
+        index.update(
+            path
+            for path in changed
+            if file_system.exists(path) or not (root / path).exists()
+        )
+        return index
+    index = TrigramIndex.build(root, _relative_files(file_system))
+    if not changed:
+        index.save(directory)
+        _prune(directory.parent, settings.CODE_SEARCH_INDEXES_PER_REPOSITORY)
+    return index
+
+
+def _relative_files(file_system: FileSystem) -> List[str]:
+    store = file_system.store
+    return [path for path, index in store.walk() if not store.is_dir(index)]
@@ -1,10 +1,11 @@
 from .file_system import FileSystem
 from .file import File
 from .directory import Directory
-
+from .watcher import FileSystemWatcher
 
 __all__ = [
     "FileSystem",
     "File",
     "Directory",
+    "FileSystemWatcher",
 ]
@@ -0,0 +1,168 @@
+import logging
+import mmap
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SNIFF_BYTES = 8 * 1024
+MMAP_THRESHOLD_BYTES = 256 * 1024
+NON_EMPTY_LINE = re.compile(r"^[^\S\n]*\S", re.MULTILINE)
+# Memory of an entry besides its value, e.g. its key, so that entries of empty
+# or binary files count against the budget too
+MIN_ENTRY_WEIGHT = 256
+
+
+@dataclass(frozen=True)
+class FileContent:
+    """The decoded content of a file.
+
+    Binary and oversized files are not decoded, their `text` is empty.
+    """
+
+    text: str
+    size: int
+    non_empty_lines: int = 0
+    binary: bool = False
+    oversized: bool = False
+
+    @property
+    def readable(self) -> bool:
+        return not (self.binary or self.oversized)
+
+
+def is_binary(header: bytes) -> bool:
+    """Guess from the first bytes of a file, like git does: text has no NUL bytes."""
+    return b"\0" in header
+
+
+def _decode(data) -> str:
+    try:
+        return str(data, "utf-8")
+    except UnicodeDecodeError:
+        return str(data, "utf-8", errors="replace")
+
+
+def read_content(path, max_bytes: int = None) -> FileContent:
+    """
+    Read and decode a file, without caching.
+    :param path: Path of the file
+    :param max_bytes: Files larger than this are not read
+    """
+    max_bytes = max_bytes if max_bytes is not None else settings.MAX_FILE_BYTES
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size > max_bytes:
+            return FileContent(text="", size=size, oversized=True)
+        if size < MMAP_THRESHOLD_BYTES:
+            data = file.read()
+            if is_binary(data[:SNIFF_BYTES]):
+                return FileContent(text="", size=size, binary=True)
+            text = _decode(data)
+        else:
+            # Decode straight from the page cache, without a copy in between
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if is_binary(mapped[:SNIFF_BYTES]):
+                    return FileContent(text="", size=size, binary=True)
+                with memoryview(mapped) as view:
+                    text = _decode(view)
+    non_empty_lines = sum(1 for _ in NON_EMPTY_LINE.finditer(text))
+    return FileContent(text=text, size=size, non_empty_lines=non_empty_lines)
+
+
+class VersionedCache(ABC):
+    """Values computed from files, least recently used first out.
+
+    Entries are keyed by path and validated against the inode, modification
+    time and size of the file, so files changed behind the cache's back are
+    loaded again. The weights of the cached values add up to at most
+    `max_bytes`. Each entry weighs at least `MIN_ENTRY_WEIGHT`.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[tuple, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    def _load(self, path: str):
+        """Compute the value of a file."""
+
+    @abstractmethod
+    def _weight(self, value) -> int:
+        """Bytes a value counts against `max_bytes`."""
+
+    def _entry_weight(self, value) -> int:
+        return max(self._weight(value), MIN_ENTRY_WEIGHT)
+
+    def read(self, path):
+        """Return the value for a file, from the cache if the file is unchanged."""
+        key = os.fspath(path)
+        stat = os.stat(key)
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = self._load(key)
+        self._put(key, version, value)
+        return value
+
+    def _put(self, key: str, version: tuple, value):
+        weight = self._entry_weight(value)
+        with self._lock:
+            self._pop(key)
+            if weight > self.max_bytes:
+                return
+            self._entries[key] = (version, value)
+            self._bytes += weight
+            while self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._bytes -= self._entry_weight(entry[1])
+        return entry[1]
+
+    def discard(self, path):
+        """Forget a file, e.g. after it was written."""
+        with self._lock:
+            self._pop(os.fspath(path))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+class ContentCache(VersionedCache):
+    """Decoded file contents. The budget counts the size of the files on disk."""
+
+    def __init__(self, max_bytes: int = None):
+        super().__init__(
+            max_bytes if max_bytes is not None else settings.CONTENT_CACHE_MAX_BYTES
+        )
+
+    def _load(self, path: str) -> FileContent:
+        return read_content(path)
+
+    def _weight(self, content: FileContent) -> int:
+        return content.size if content.readable else 0
+
+
+content_cache = ContentCache()
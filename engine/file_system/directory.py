@@ -1,22 +1,28 @@
 import logging
 
 from .file_system_node import FileSystemNode
+from .node_store import DIRECTORY
 
 logger = logging.getLogger(__name__)
 
 
 class Directory(FileSystemNode):
+    __slots__ = ()
+
+    kind = DIRECTORY
 
     def simple_dict(self, filter="") -> dict:
         """Return a simple dictionary representation of the node."""
-        files = [
-            str(child.path).replace(str(child.parent.path), "").lstrip("/")
-            for child in self.nodes
-            if child.is_file
-        ]
+        store = self.store
+        children = store.children[self.index]
+        files = [name for name, child in children.items() if not store.is_dir(child)]
         if filter:
             files = [file for file in files if filter in file]
-        dirs = [child.simple_dict(filter) for child in self.nodes if child.is_directory]
+        dirs = [
+            self._node(child).simple_dict(filter)
+            for child in children.values()
+            if store.is_dir(child)
+        ]
         dirs = [dir for dir in dirs if dir]
         all_items = files + dirs
         if not all_items:
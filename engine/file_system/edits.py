@@ -0,0 +1,221 @@
+import difflib
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+SEARCH_MARKER = re.compile(r"^<{5,}\s*SEARCH\s*$")
+DIVIDER_MARKER = re.compile(r"^={5,}\s*$")
+REPLACE_MARKER = re.compile(r"^>{5,}\s*REPLACE\s*$")
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@")
+# Windows at least this similar to the search lines match, if nothing else does
+FUZZY_THRESHOLD = 0.9
+
+
+class EditError(ValueError):
+    """An edit that cannot be applied, e.g. because its lines are not in the file."""
+
+
+@dataclass
+class Edit:
+    search: List[str]  # Lines to replace, without line endings
+    replace: List[str]
+    line_hint: Optional[int] = None  # Where the lines were, e.g. from a diff hunk
+
+
+def _parse_blocks(lines: List[str]) -> List[Edit]:
+    edits = []
+    section, search, replace = None, [], []
+    for line in lines:
+        if SEARCH_MARKER.match(line):
+            section, search, replace = "search", [], []
+        elif DIVIDER_MARKER.match(line) and section == "search":
+            section = "replace"
+        elif REPLACE_MARKER.match(line) and section == "replace":
+            edits.append(Edit(search, replace))
+            section = None
+        elif section == "search":
+            search.append(line)
+        elif section == "replace":
+            replace.append(line)
+    if section is not None:
+        raise EditError("A search/replace block is not closed with `>>>>>>> REPLACE`")
+    return edits
+
+
+def _parse_hunks(lines: List[str]) -> List[Edit]:
+    edits = []
+    edit = None
+    for line in lines:
+        header = HUNK_HEADER.match(line)
+        if header:
+            edit = Edit([], [], int(header.group(1)))
+            edits.append(edit)
+        elif edit is None or line.startswith("\\"):
+            # File headers, or `\ No newline at end of file`
+            continue
+        elif line.startswith("-"):
+            edit.search.append(line[1:])
+        elif line.startswith("+"):
+            edit.replace.append(line[1:])
+        else:
+            # Context, often without its leading space
+            edit.search.append(line[1:] if line.startswith(" ") else line)
+            edit.replace.append(line[1:] if line.startswith(" ") else line)
+    return edits
+
+
+def _split_lines(text: str) -> List[str]:
+    """Lines without their endings. Unlike `str.splitlines`, only newlines end lines."""
+    lines = text.replace("\r\n", "\n").split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return lines
+
+
+def parse_edits(edits: str) -> List[Edit]:
+    """
+    Parse search/replace blocks or unified diff hunks.
+    :param edits: Text of the blocks or hunks
+    """
+    lines = _split_lines(edits)
+    if any(SEARCH_MARKER.match(line) for line in lines):
+        parsed = _parse_blocks(lines)
+    else:
+        parsed = _parse_hunks(lines)
+    if not parsed:
+        raise EditError("No search/replace blocks or diff hunks found")
+    return parsed
+
+
+def _loose(line: str) -> str:
+    return " ".join(line.split())
+
+
+def _indentation(line: str) -> str:
+    return line.removesuffix(line.lstrip())
+
+
+def _window(lines: List[str], start: int, size: int) -> List[str]:
+    end = start + size
+    return lines[start:end]
+
+
+def _choose(positions: List[int], line_hint: Optional[int]) -> Optional[int]:
+    if len(positions) == 1:
+        return positions[0]
+    if positions and line_hint is not None:
+        return min(positions, key=lambda position: abs(position + 1 - line_hint))
+    return None
+
+
+def _locate(lines: List[str], edit: Edit) -> Tuple[int, bool]:
+    """
+    Find the lines an edit replaces, first exactly, then ignoring whitespace,
+    then by similarity.
+    :return: Index of the first line, and whether the match was inexact
+    """
+    size = len(edit.search)
+    starts = range(len(lines) - size + 1)
+    exact = [i for i in starts if _window(lines, i, size) == edit.search]
+    if exact:
+        position = _choose(exact, edit.line_hint)
+        if position is None:
+            raise EditError(
+                f"The lines to replace occur {len(exact)} times, include more lines to tell them apart:\n"
+                + "\n".join(edit.search)
+            )
+        return position, False
+    loose_lines = [_loose(line) for line in lines]
+    loose_search = [_loose(line) for line in edit.search]
+    loose = [i for i in starts if _window(loose_lines, i, size) == loose_search]
+    position = _choose(loose, edit.line_hint)
+    if position is not None:
+        return position, True
+    target = "\n".join(loose_search)
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    matcher.set_seq2(target)
+    scored = []
+    for i in starts:
+        matcher.set_seq1("\n".join(_window(loose_lines, i, size)))
+        # The quick ratios are cheap upper bounds of the ratio
+        if (
+            matcher.real_quick_ratio() < FUZZY_THRESHOLD
+            or matcher.quick_ratio() < FUZZY_THRESHOLD
+        ):
+            continue
+        ratio = matcher.ratio()
+        if ratio >= FUZZY_THRESHOLD:
+            scored.append((ratio, i))
+    if scored:
+        best = max(ratio for ratio, _ in scored)
+        position = _choose([i for ratio, i in scored if ratio == best], edit.line_hint)
+        if position is not None:
+            return position, True
+    raise EditError(
+        "The lines to replace are not in the file, copy them exactly:\n"
+        + "\n".join(edit.search)
+    )
+
+
+def _reindent(replace: List[str], search: List[str], found: List[str]) -> List[str]:
+    """Move the replacement to the indentation of the lines that were found."""
+    pairs = [(s, f) for s, f in zip(search, found) if s.strip() and f.strip()]
+    if not pairs:
+        return replace
+    search_indent, found_indent = _indentation(pairs[0][0]), _indentation(pairs[0][1])
+    if search_indent == found_indent:
+        return replace
+    return [
+        (
+            found_indent + line.removeprefix(search_indent)
+            if line.startswith(search_indent)
+            else line
+        )
+        for line in replace
+    ]
+
+
+def apply_edits(text: str, edits: List[Edit]) -> Tuple[str, int]:
+    """
+    Apply edits one after the other. Nothing is applied unless all of them are.
+    :param text: Content of the file
+    :param edits: Edits to apply
+    :return: The new content, and the number of edits that matched inexactly
+    """
+    newline = "\r\n" if "\r\n" in text else "\n"
+    ends_with_newline = text.endswith("\n")
+    lines = _split_lines(text)
+    inexact = 0
+    for number, edit in enumerate(edits, start=1):
+        if not any(line.strip() for line in edit.search):
+            # Only an empty file can be filled without anchor lines
+            if any(line.strip() for line in lines):
+                raise EditError(f"Edit {number} has no lines to replace")
+            lines = list(edit.replace)
+            continue
+        try:
+            position, fuzzy = _locate(lines, edit)
+        except EditError as e:
+            raise EditError(f"Edit {number}: {e}") from e
+        end = position + len(edit.search)
+        replace = edit.replace
+        if fuzzy:
+            inexact += 1
+            replace = _reindent(replace, edit.search, lines[position:end])
+        lines[position:end] = replace
+    new_text = newline.join(lines)
+    if lines and (ends_with_newline or not text):
+        new_text += newline
+    return new_text, inexact
+
+
+def unified_diff(path: str, old: str, new: str) -> str:
+    """The change of a file as a unified diff."""
+    return "".join(
+        difflib.unified_diff(
+            old.splitlines(keepends=True),
+            new.splitlines(keepends=True),
+            fromfile=f"a/{path}",
+            tofile=f"b/{path}",
+        )
+    )
@@ -1,15 +1,39 @@
 import logging
+from typing import Optional
 
+from .content_cache import FileContent, content_cache
 from .file_system_node import FileSystemNode
+from .line_index import LineIndex, find_line, line_index_cache, read_lines
+from .node_store import FILE
 
 logger = logging.getLogger(__name__)
 
 
 class File(FileSystemNode):
+    __slots__ = ()
+
+    kind = FILE
+
+    def read(self) -> FileContent:
+        """The content of the file, with its line count and whether it is binary."""
+        return content_cache.read(self.path)
 
     @property
     def content(self) -> str:
-        return self.path.read_text()
+        """The text of the file, empty for binary and oversized files."""
+        return self.read().text
+
+    def line_index(self) -> LineIndex:
+        """Where the lines of the file start, cached until the file changes."""
+        return line_index_cache.read(self.path)
+
+    def read_lines(self, start: int, end: int) -> str:
+        """Read lines `start` to `end`, counting from 1, without reading the rest."""
+        return read_lines(self.path, start, end)
+
+    def find_line(self, text: str) -> Optional[int]:
+        """Number of the first line containing `text`, or None."""
+        return find_line(self.path, text)
 
     def simple_dict(self, filter="") -> dict:
         """Return a simple dictionary representation of the node."""
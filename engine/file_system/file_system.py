@@ -1,103 +1,111 @@
 import logging
 import os
-from fnmatch import fnmatch
 from pathlib import Path
-from typing import List, Set, Optional
+from typing import List, Optional
 
 import yaml
-from django.conf import settings
 
-from .directory import Directory
-from .file import File
+from engine.repository.workspace import Workspace
+from .content_cache import content_cache
+from .directory import Directory  # noqa: F401, registers the node class
+from .file import File  # noqa: F401, registers the node class
 from .file_system_node import FileSystemNode
+from .ignore import GITIGNORE, PILOTIGNORE, IgnoreMatcher
+from .line_index import line_index_cache
+from .node_store import NodeStore
 
 logger = logging.getLogger(__name__)
 
 
+def _forget_content(path: Path):
+    """Drop everything cached about the content of a file."""
+    content_cache.discard(path)
+    line_index_cache.discard(path)
+
+
 class FileSystem:
-    """Utility class for file system operations."""
+    """Utility class for file system operations.
+
+    The tree is held in a `NodeStore`: names are interned, links between
+    nodes are integers and the kind of each node is recorded when it is
+    scanned. Lookups walk the children of each directory on the path.
+    """
 
     def __init__(self, root_directory=None):
         if not root_directory:
-            root_directory = Path(settings.REPO_DIR)
-        self.root_directory = root_directory
+            root_directory = Workspace.current().root
+        self.root_directory = Path(root_directory)
         if not self.root_directory.exists():
             raise FileNotFoundError(
                 f"Root directory '{self.root_directory}' does not exist."
             )
         self.root_directory = self.root_directory
-        self.tree = self._build_tree(self.root_directory)
+        self.rescan()
+
+    def rescan(self):
+        """Rebuild the tree from disk."""
+        self.store = NodeStore()
+        self.ignore = IgnoreMatcher(self.root_directory)
+        self._scan(self.root_directory, "", 0)
+        self.tree = self._node(0)
+
+    def _node(self, index: int) -> FileSystemNode:
+        return FileSystemNode.of(self.store, self.root_directory, index)
+
+    def _key(self, path) -> Optional[str]:
+        """Store key of a path: relative to the root, `""` for the root itself."""
+        path = Path(path)
+        if path.is_absolute():
+            try:
+                path = path.relative_to(self.root_directory)
+            except ValueError:
+                return None
+        key = path.as_posix().strip("/")
+        return "" if key == "." else key
+
+    def _find(self, path) -> Optional[int]:
+        key = self._key(path)
+        return None if key is None else self.store.find(key)
 
     def yaml(self, filter="") -> str:
         """Walk through tree in-order and collect paths of all files and directories."""
         return yaml.safe_dump(self.tree.simple_dict(filter))
 
-    @property
-    def ignore_list(self) -> Set[str]:
-        if not hasattr(self, "_ignore_list"):
-            # Create file if it doesn't exist
-            if not os.path.exists(settings.IGNORE_FILE_PATH):
-                default_ignore_content = Path(
-                    os.path.join(os.path.dirname(__file__), "default_ignore.txt")
-                ).read_text()
-                with open(settings.IGNORE_FILE_PATH, "w") as f:
-                    f.write(default_ignore_content)
-            with open(settings.IGNORE_FILE_PATH, "r") as f:
-                self._ignore_list = set(f.read().splitlines())
-        return self._ignore_list
-
-    def _build_tree(self, path: Path, parent: FileSystemNode = None) -> FileSystemNode:
-        """Recursively build a directory tree starting from the given path."""
-        if path.is_dir():
-            node = Directory(path=path, parent=parent)
-        else:
-            node = File(path=path, parent=parent)
-        for item in path.iterdir():
-            if self.should_be_ignored(item):
-                continue
-            if item.is_dir():
-                node.nodes.append(self._build_tree(item, node))
-            else:
-                node.nodes.append(File(path=item, parent=node))
-        return node
+    def _scan(self, path: Path, key: str, index: int):
+        """Recursively add the content of a directory to the store."""
+        with os.scandir(path) as entries:
+            for entry in entries:
+                is_dir = entry.is_dir()
+                child_key = f"{key}/{entry.name}" if key else entry.name
+                # Ignored directories are pruned without descending into them
+                if self.ignore.is_ignored(child_key, is_dir):
+                    continue
+                child = self.store.add(index, entry.name, is_dir, child_key)
+                if is_dir:
+                    self._scan(path / entry.name, child_key, child)
 
-    def should_be_ignored(self, path) -> bool:
-        """Check if the given path should be ignored, respecting .gitignore-style patterns."""
+    def should_be_ignored(self, path, is_dir: bool = None) -> bool:
+        """Check if the given path should be ignored, following .gitignore semantics."""
         if isinstance(path, str):
             path = Path(path)
-        if path.is_absolute():
-            relative_path = str(path.relative_to(settings.REPO_DIR)).rstrip("/")
-        else:
-            relative_path = str(path).rstrip("/")
-
-        # Iterate over each pattern in the ignore list
-        for pattern in self.ignore_list:
-            # Check if the pattern matches the entire directory (including subdirectories and files)
-            if (
-                relative_path.startswith(pattern.rstrip("/") + "/")
-                or relative_path == pattern
-            ):
-                return True
-
-            # Check both the file/directory name and the relative path against the ignore patterns
-            if fnmatch(path.name, pattern) or fnmatch(relative_path, pattern):
-                return True
-
-        return False
+        key = self._key(path)
+        if is_dir is None:
+            is_dir = (self.root_directory / key).is_dir()
+        return self.ignore.is_ignored(key, is_dir)
 
     def get_directory_tree(self) -> List[dict]:
         """Build a directory tree from the root using the pre-built tree."""
-        return self._build_tree_dict(self.tree)
+        return self._build_tree_dict(0)
 
-    def _build_tree_dict(self, node: FileSystemNode, parent_path="") -> List[dict]:
+    def _build_tree_dict(self, index: int, parent_path="") -> List[dict]:
         tree = []
-        for child in node.nodes:
-            relative_path = os.path.join(parent_path, child.path.name)
-            if child.is_directory:
+        for name, child in self.store.children[index].items():
+            relative_path = os.path.join(parent_path, name)
+            if self.store.is_dir(child):
                 tree.append(
                     {
                         "id": relative_path,
-                        "text": child.path.name,
+                        "text": name,
                         "type": "default",
                         "children": self._build_tree_dict(child, relative_path),
                     }
@@ -106,7 +114,7 @@ class FileSystem:
                 tree.append(
                     {
                         "id": relative_path,
-                        "text": child.path.name,
+                        "text": name,
                         "type": "file",
                     }
                 )
@@ -114,37 +122,144 @@ class FileSystem:
 
     def list_files(self) -> List[Path]:
         """List all files in the tree, excluding ignored files."""
-        return self._list_files_recursive(self.tree)
-
-    def _list_files_recursive(self, node: FileSystemNode) -> List[Path]:
-        files_list = []
-        for child in node.nodes:
-            if child.is_directory:
-                files_list.extend(self._list_files_recursive(child))
-            else:
-                files_list.append(child.path)
-        return files_list
+        return [
+            self.root_directory / relative_path
+            for relative_path, index in self.store.walk()
+            if not self.store.is_dir(index)
+        ]
 
     def get_node(self, path: Path) -> Optional[FileSystemNode]:
         """Get the node at the given path."""
-        if not path.is_absolute():
-            path = self.root_directory / path
-        return self._get_node_recursive(self.tree, path)
-
-    def _get_node_recursive(
-        self, tree: FileSystemNode, path: Path
-    ) -> Optional[FileSystemNode]:
-        """Recursively get the node at the given path."""
-        if tree.path == path:
-            return tree
-        for node in tree.nodes:
-            if node.path == path:
-                return node
-            if node.is_directory:
-                result = self._get_node_recursive(node, path)
-                if result:
-                    return result
-        return None
+        index = self._find(path)
+        return None if index is None else self._node(index)
+
+    def exists(self, path) -> bool:
+        """Check if a path is in the tree."""
+        return self._find(path) is not None
+
+    def list_directory(self, path) -> Optional[List[FileSystemNode]]:
+        """
+        List the children of a directory, sorted by name.
+        :param path: Path of the directory
+        :return: Child nodes, or None if there is no such directory
+        """
+        index = self._find(path)
+        if index is None or not self.store.is_dir(index):
+            return None
+        children = self.store.children[index]
+        return [self._node(children[name]) for name in sorted(children)]
+
+    def _insert(self, path: Path) -> Optional[int]:
+        """
+        Add a path that was created on disk to the tree, along with any missing
+        parent directories.
+        :param path: Absolute path
+        :return: Index of the node, or None if the path is ignored
+        """
+        relative_path = path.relative_to(self.root_directory)
+        if any(
+            self.should_be_ignored(ancestor)
+            for ancestor in [relative_path, *relative_path.parents[:-1]]
+        ):
+            return None
+        key = self._key(path)
+        index = self.store.find(key)
+        if index is not None:
+            return index
+        parent = self._insert(path.parent) if path.parent != self.root_directory else 0
+        index = self.store.find(key)
+        if index is not None:
+            # Scanning a new parent directory picked up the path
+            return index
+        is_dir = path.is_dir()
+        index = self.store.add(parent, path.name, is_dir, key)
+        if is_dir:
+            # A directory may have been moved or copied here with its content
+            self._scan(path, key, index)
+        return index
+
+    def refresh(self, path):
+        """
+        Bring a path up to date with the disk after it was changed without
+        going through this class, e.g. by git.
+        :param path: Path relative to the root, or absolute
+        """
+        absolute_path = self.root_directory / path
+        key = self._key(absolute_path)
+        if key == "":
+            self.rescan()
+            return
+        if absolute_path.is_dir():
+            # New directories may bring their own ignore files
+            self.ignore.invalidate(key, subtree=True)
+        _forget_content(absolute_path)
+        self._remove(absolute_path)
+        if absolute_path.exists():
+            self._insert(absolute_path)
+
+    def sync_directory(self, path):
+        """
+        Reconcile the children of a directory with the disk. Unlike `refresh`,
+        directories that are still there are not scanned again.
+        :param path: Path relative to the root, or absolute
+        """
+        absolute_path = self.root_directory / path
+        key = self._key(absolute_path)
+        index = self.store.find(key)
+        if index is None or not self.store.is_dir(index):
+            return
+        try:
+            with os.scandir(absolute_path) as entries:
+                on_disk = {entry.name: entry.is_dir() for entry in entries}
+        except (FileNotFoundError, NotADirectoryError):
+            self._remove(absolute_path)
+            return
+        children = self.store.children[index]
+        removed = [
+            name
+            for name, child in children.items()
+            if on_disk.get(name) != self.store.is_dir(child)
+        ]
+        added = [name for name in on_disk if name not in children or name in removed]
+        if {GITIGNORE, PILOTIGNORE} & {*removed, *added}:
+            # The ignore rules of the whole directory changed
+            self.refresh(absolute_path)
+            return
+        for name in removed:
+            self.store.remove(children[name])
+        for name in added:
+            child_key = f"{key}/{name}" if key else name
+            if self.ignore.is_ignored(child_key, on_disk[name]):
+                continue
+            child = self.store.add(index, name, on_disk[name], child_key)
+            if on_disk[name]:
+                self._scan(absolute_path / name, child_key, child)
+
+    def _remove(self, path: Path):
+        """Remove a path and everything below it from the tree."""
+        index = self._find(path)
+        if index:
+            self.store.remove(index)
+
+    def _reparent(self, source: Path, destination: Path):
+        """Move the node of a path that was moved on disk to its new location."""
+        index = self._find(source)
+        self._remove(destination)
+        if index is None or self.store.children[index]:
+            # Directories are rescanned, ignore rules may differ at the destination
+            self._remove(source)
+            self._insert(destination)
+            return
+        parent = (
+            self._insert(destination.parent)
+            if destination.parent != self.root_directory
+            else 0
+        )
+        if parent is None or self._find(destination) is not None:
+            # Ignored, or picked up by scanning a new parent directory
+            self._remove(source)
+            return
+        self.store.move(index, parent, destination.name)
 
     def save(self, content: str, path: Path) -> FileSystemNode:
         """
@@ -160,12 +275,17 @@ class FileSystem:
             raise ValueError(f"Cannot save content to directory `{absolute_path}`.")
         absolute_path.parent.mkdir(parents=True, exist_ok=True)
         absolute_path.write_text(content)
-        self.tree = self._build_tree(self.root_directory)
+        _forget_content(absolute_path)
+        if absolute_path.name in (GITIGNORE, PILOTIGNORE):
+            # Takes effect for paths added from now on, or after a rescan
+            self.ignore.invalidate(self._key(absolute_path.parent))
+        self._insert(absolute_path)
         return self.get_node(path)
 
     def create_directory(self, path):
         absolute_path = self.root_directory / path
         absolute_path.mkdir(parents=True, exist_ok=True)
+        self._insert(absolute_path)
         logger.info(f"Directory created: {absolute_path}")
 
     def move_file(self, source, destination):
@@ -173,6 +293,8 @@ class FileSystem:
         destination = self.root_directory / destination
         destination.parent.mkdir(parents=True, exist_ok=True)
         source.replace(destination)
+        _forget_content(source)
+        self._reparent(source, destination)
         logger.info(f"File moved from {source} to {destination}")
 
     def copy_file(self, source, destination):
@@ -180,11 +302,14 @@ class FileSystem:
         destination = self.root_directory / destination
         destination.parent.mkdir(parents=True, exist_ok=True)
         destination.write_text(source.read_text())
+        self._insert(destination)
         logger.info(f"File copied from {source} to {destination}")
 
     def delete_file(self, path):
         path = self.root_directory / path
         path.unlink()
+        _forget_content(path)
+        self._remove(path)
         logger.info(f"File deleted: {path}")
 
 
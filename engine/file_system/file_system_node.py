@@ -1,35 +1,86 @@
 import logging
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-from django.conf import settings
-from pydantic import Field, BaseModel
+from .node_store import NO_PARENT, NodeStore
 
 logger = logging.getLogger(__name__)
 
 
-class FileSystemNode(BaseModel):
-    """Represents a file in the file system."""
+class FileSystemNode:
+    """Represents a file in the file system.
 
-    path: Path = Field(description="Path of the node in the file system")
-    nodes: List["FileSystemNode"] = Field(
-        description="List of files and directories in the directory", default=[]
-    )
-    parent: Optional["FileSystemNode"] = Field(
-        description="Parent directory", default=None
-    )
+    Nodes are lightweight views of one entry of a `NodeStore`. They are
+    created on access, so compare them with `==` rather than `is`. A node
+    must not be used after its path was removed from the tree.
+    """
+
+    __slots__ = ("store", "root_directory", "index")
+
+    kind: int = None
+    _classes: Dict[int, type] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        FileSystemNode._classes[cls.kind] = cls
+
+    def __init__(self, store: NodeStore, root_directory: Path, index: int):
+        self.store = store
+        self.root_directory = root_directory
+        self.index = index
+
+    @classmethod
+    def of(cls, store: NodeStore, root_directory: Path, index: int) -> "FileSystemNode":
+        """The node for an entry of the store, of the class matching its kind."""
+        return cls._classes[store.kinds[index]](store, root_directory, index)
+
+    def _node(self, index: int) -> "FileSystemNode":
+        return FileSystemNode.of(self.store, self.root_directory, index)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, FileSystemNode)
+            and self.store is other.store
+            and self.index == other.index
+        )
+
+    def __hash__(self):
+        return hash((id(self.store), self.index))
+
+    def __repr__(self):
+        return f"{type(self).__name__}(path={str(self.path)!r})"
+
+    @property
+    def path(self) -> Path:
+        return self.root_directory / self.store.relative_path(self.index)
+
+    @property
+    def nodes(self) -> List["FileSystemNode"]:
+        children = self.store.children[self.index]
+        if not children:
+            return []
+        return [self._node(child) for child in children.values()]
+
+    @property
+    def parent(self) -> Optional["FileSystemNode"]:
+        parent = self.store.parents[self.index]
+        return None if parent == NO_PARENT else self._node(parent)
+
+    @property
+    def root(self) -> "FileSystemNode":
+        return self._node(0)
 
     @property
     def path_relative_to_cwd(self):
-        return self.path.relative_to(settings.REPO_DIR)
+        return Path(self.store.relative_path(self.index))
 
     @property
     def is_directory(self):
-        return self.path.is_dir()
+        return self.store.is_dir(self.index)
 
     @property
     def is_file(self):
-        return self.path.is_file()
+        return not self.store.is_dir(self.index)
 
     def simple_dict(self, filter="") -> dict:
         """Return a simple dictionary representation of the node."""
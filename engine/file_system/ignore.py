@@ -0,0 +1,182 @@
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IGNORE_FILE = Path(__file__).parent / "default_ignore.txt"
+GITIGNORE = ".gitignore"
+PILOTIGNORE = ".pilotignore"
+
+
+def _translate(pattern: str) -> str:
+    """Translate the glob part of a gitignore pattern into a regular expression."""
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+            continue
+        if pattern.startswith("/**", i) and i + 3 == len(pattern):
+            regex += "/.*"
+            break
+        if pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+            continue
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                regex += re.escape(char)
+            else:
+                start = i + 1
+                group = pattern[start:end].replace("\\", "\\\\")
+                if group.startswith("!"):
+                    group = "^" + group[1:]
+                regex += f"[{group}]"
+                i = end
+        elif char == "\\" and i + 1 < len(pattern):
+            i += 1
+            regex += re.escape(pattern[i])
+        else:
+            regex += re.escape(char)
+        i += 1
+    return regex
+
+
+class IgnoreRules:
+    """The patterns of one ignore file, compiled into a single regular expression.
+
+    Paths are matched relative to the directory of the ignore file, with a
+    trailing `/` for directories. The alternatives are ordered from the last
+    pattern to the first, so the first alternative that matches is the one
+    that decides, as in git.
+    """
+
+    def __init__(self, lines: Iterable[str]):
+        alternatives = []
+        self.negated: List[bool] = []
+        for line in lines:
+            line = line.rstrip("\n")
+            if not line.endswith("\\ "):
+                line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negated = line.startswith("!")
+            if negated or line.startswith("\\!") or line.startswith("\\#"):
+                line = line[1:]
+            directory_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            # Patterns with a slash anywhere but at the end are relative to
+            # the ignore file, others match at any depth
+            anchored = "/" in line
+            regex = _translate(line.lstrip("/"))
+            if not anchored:
+                regex = "(?:.*/)?" + regex
+            # Directories match with their whole content
+            regex += "/.*" if directory_only else "(?:/.*)?"
+            alternatives.append(f"(?P<r{len(self.negated)}>{regex})")
+            self.negated.append(negated)
+        self._regex = (
+            re.compile("|".join(reversed(alternatives))) if alternatives else None
+        )
+
+    def match(self, relative_path: str, is_dir: bool) -> Optional[bool]:
+        """
+        :return: True if ignored, False if re-included by a negated pattern,
+            None if no pattern matches
+        """
+        if self._regex is None:
+            return None
+        match = self._regex.fullmatch(relative_path + "/" if is_dir else relative_path)
+        if match is None:
+            return None
+        return not self.negated[int(match.lastgroup[1:])]
+
+
+class IgnoreMatcher:
+    """Decide whether paths of a repository are ignored, with gitignore semantics.
+
+    Rules come from `default_ignore.txt`, the global ignore file, the
+    `.gitignore` files of the repository and its `.pilotignore`. A
+    `.gitignore` in a subdirectory takes precedence over the ones above it.
+    """
+
+    def __init__(self, root_directory, extra_lines: Iterable[str] = ()):
+        self.root_directory = Path(root_directory)
+        self._extra_lines = list(extra_lines)
+        self._rules: Dict[str, Optional[IgnoreRules]] = {}
+
+    def _root_lines(self) -> List[str]:
+        lines = DEFAULT_IGNORE_FILE.read_text().splitlines()
+        global_ignore_file = Path(settings.IGNORE_FILE_PATH)
+        if global_ignore_file.is_file():
+            lines += global_ignore_file.read_text().splitlines()
+        for name in (GITIGNORE, PILOTIGNORE):
+            path = self.root_directory / name
+            if path.is_file():
+                lines += path.read_text().splitlines()
+        return lines + self._extra_lines
+
+    def rules(self, directory: str) -> Optional[IgnoreRules]:
+        """The compiled rules of a directory, relative to the root, or None."""
+        if directory not in self._rules:
+            if directory == "":
+                rules = IgnoreRules(self._root_lines())
+            else:
+                path = self.root_directory / directory / GITIGNORE
+                try:
+                    rules = IgnoreRules(path.read_text().splitlines())
+                except (FileNotFoundError, NotADirectoryError):
+                    rules = None
+                except UnicodeDecodeError:
+                    logger.warning(f"Cannot read {path}")
+                    rules = None
+            self._rules[directory] = rules
+        return self._rules[directory]
+
+    def invalidate(self, directory: str = None, subtree: bool = False):
+        """
+        Forget compiled rules, e.g. after an ignore file changed.
+        :param directory: Directory relative to the root, all directories if None
+        :param subtree: Also forget the rules of the directories below it
+        """
+        if directory is None or (subtree and directory == ""):
+            self._rules.clear()
+        elif subtree:
+            prefix = directory + "/"
+            for key in [key for key in self._rules if key.startswith(prefix)]:
+                del self._rules[key]
+            self._rules.pop(directory, None)
+        else:
+            self._rules.pop(directory, None)
+
+    def is_ignored(self, relative_path: str, is_dir: bool) -> bool:
+        """
+        Check a single path. Paths inside an ignored directory are ignored too.
+        :param relative_path: Path relative to the root, with `/` separators
+        :param is_dir: Whether the path is a directory
+        """
+        directory = os.path.dirname(relative_path)
+        while True:
+            rules = self.rules(directory)
+            if rules is not None:
+                start = len(directory) + 1 if directory else 0
+                decision = rules.match(relative_path[start:], is_dir)
+                if decision is not None:
+                    return decision
+            if not directory:
+                return False
+            directory = os.path.dirname(directory)
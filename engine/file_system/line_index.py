@@ -0,0 +1,112 @@
+import logging
+import mmap
+import re
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from django.conf import settings
+
+from .content_cache import SNIFF_BYTES, VersionedCache, is_binary
+
+logger = logging.getLogger(__name__)
+
+NEWLINE = re.compile(b"\n")
+
+
+@dataclass(frozen=True)
+class LineIndex:
+    """Byte offsets of the lines of a file.
+
+    `offsets[i]` is where line `i + 1` starts, the last entry is the size of
+    the file, so line `n` spans `offsets[n - 1]:offsets[n]`.
+    """
+
+    offsets: array
+    binary: bool = False
+
+    @property
+    def line_count(self) -> int:
+        return len(self.offsets) - 1
+
+    def span(self, start: int, end: int) -> Tuple[int, int]:
+        """
+        Byte range of lines `start` to `end`, counting from 1, both included.
+        Lines outside of the file are left out, e.g. of a file that shrank since
+        the line numbers were taken.
+        """
+        start, end = max(start, 1), min(end, self.line_count)
+        if start > end:
+            return 0, 0
+        return self.offsets[start - 1], self.offsets[end]
+
+    def line_at(self, offset: int) -> int:
+        """Number of the line that contains a byte offset."""
+        return bisect_right(self.offsets, offset)
+
+
+def build_line_index(path) -> LineIndex:
+    """Find the line starts of a file in one pass, without decoding it."""
+    with open(path, "rb") as file:
+        header = file.read(SNIFF_BYTES)
+        if not header:
+            return LineIndex(offsets=array("q", [0]))
+        if is_binary(header):
+            return LineIndex(offsets=array("q", [0]), binary=True)
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            size = len(mapped)
+            offsets = array("q", [0])
+            offsets.extend(match.end() for match in NEWLINE.finditer(mapped))
+    if offsets[-1] != size:
+        # The last line has no newline
+        offsets.append(size)
+    return LineIndex(offsets=offsets)
+
+
+class LineIndexCache(VersionedCache):
+    """Line indexes of files, so ranged reads seek instead of scanning."""
+
+    def __init__(self, max_bytes: int = None):
+        super().__init__(
+            max_bytes if max_bytes is not None else settings.LINE_INDEX_CACHE_MAX_BYTES
+        )
+
+    def _load(self, path: str) -> LineIndex:
+        return build_line_index(path)
+
+    def _weight(self, index: LineIndex) -> int:
+        return index.offsets.itemsize * len(index.offsets)
+
+
+line_index_cache = LineIndexCache()
+
+
+def read_lines(path, start: int, end: int) -> str:
+    """
+    Read a range of lines of a text file, decoding only those lines.
+    :param path: Path of the file
+    :param start: First line, counting from 1
+    :param end: Last line, included
+    :return: The lines, empty if none of them are in the file
+    """
+    index = line_index_cache.read(path)
+    begin, stop = index.span(start, end)
+    if begin == stop:
+        return ""
+    with open(path, "rb") as file:
+        file.seek(begin)
+        return file.read(stop - begin).decode("utf-8", errors="replace")
+
+
+def find_line(path, text: str) -> Optional[int]:
+    """Number of the first line that contains `text`, or None."""
+    needle = text.encode("utf-8")
+    with open(path, "rb") as file:
+        if not needle or not file.read(1):
+            return None
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            offset = mapped.find(needle)
+    if offset == -1:
+        return None
+    return line_index_cache.read(path).line_at(offset)
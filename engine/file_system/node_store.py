@@ -0,0 +1,124 @@
+import sys
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+FILE = 0
+DIRECTORY = 1
+FREE = 2
+
+NO_PARENT = -1
+
+
+class NodeStore:
+    """The file tree as parallel arrays, indexed by node number.
+
+    Node 0 is the root directory. Names are interned, parents are node numbers
+    and the kind of each node is recorded once when it is scanned. Only
+    directories have a children dict, which maps names to node numbers.
+    Removed nodes are recycled. Nodes are looked up by relative path in one
+    step, through a dict that `add`, `remove` and `move` keep up to date.
+    """
+
+    __slots__ = ("names", "parents", "kinds", "children", "_free", "_paths")
+
+    def __init__(self):
+        self.names: List[Optional[str]] = [""]
+        self.parents = array("i", [NO_PARENT])
+        self.kinds = bytearray([DIRECTORY])
+        self.children: List[Optional[Dict[str, int]]] = [{}]
+        self._free: List[int] = []
+        self._paths: Dict[str, int] = {"": 0}
+
+    def __len__(self):
+        return len(self.names) - len(self._free)
+
+    def _child_path(self, parent: int, name: str) -> str:
+        prefix = self.relative_path(parent)
+        return f"{prefix}/{name}" if prefix else name
+
+    def add(
+        self, parent: int, name: str, is_dir: bool, path: Optional[str] = None
+    ) -> int:
+        """
+        Add a node below `parent` and return its number.
+        :param path: Relative path of the node, if the caller knows it already
+        """
+        name = sys.intern(name)
+        kind = DIRECTORY if is_dir else FILE
+        children = {} if is_dir else None
+        if self._free:
+            node = self._free.pop()
+            self.names[node] = name
+            self.parents[node] = parent
+            self.kinds[node] = kind
+            self.children[node] = children
+        else:
+            node = len(self.names)
+            self.names.append(name)
+            self.parents.append(parent)
+            self.kinds.append(kind)
+            self.children.append(children)
+        self.children[parent][name] = node
+        self._paths[path if path is not None else self._child_path(parent, name)] = node
+        return node
+
+    def _forget_paths(self, node: int) -> str:
+        """Drop the paths of a node and the nodes below it, return the path of the node."""
+        path = self.relative_path(node)
+        if self.children[node] is not None:
+            for child_path, _ in self.walk(node, path):
+                del self._paths[child_path]
+        del self._paths[path]
+        return path
+
+    def remove(self, node: int):
+        """Remove a node and everything below it."""
+        self._forget_paths(node)
+        parent = self.parents[node]
+        if parent != NO_PARENT:
+            del self.children[parent][self.names[node]]
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if self.children[current]:
+                stack.extend(self.children[current].values())
+            self.names[current] = None
+            self.parents[current] = NO_PARENT
+            self.kinds[current] = FREE
+            self.children[current] = None
+            self._free.append(current)
+
+    def move(self, node: int, parent: int, name: str):
+        """Attach a node to a new parent under a new name."""
+        self._forget_paths(node)
+        del self.children[self.parents[node]][self.names[node]]
+        name = sys.intern(name)
+        self.names[node] = name
+        self.parents[node] = parent
+        self.children[parent][name] = node
+        path = self._child_path(parent, name)
+        self._paths[path] = node
+        if self.children[node] is not None:
+            self._paths.update(self.walk(node, path))
+
+    def is_dir(self, node: int) -> bool:
+        return self.kinds[node] == DIRECTORY
+
+    def find(self, relative_path: str) -> Optional[int]:
+        """Look up a node by its path relative to the root, with `/` separators."""
+        return self._paths.get(relative_path)
+
+    def relative_path(self, node: int) -> str:
+        names = []
+        while node > 0:
+            names.append(self.names[node])
+            node = self.parents[node]
+        return "/".join(reversed(names))
+
+    def walk(self, node: int = 0, prefix: str = "") -> Iterator[Tuple[str, int]]:
+        """Yield the relative path and number of every node below `node`."""
+        for name, child in self.children[node].items():
+            path = f"{prefix}/{name}" if prefix else name
+            yield path, child
+            if self.children[child] is not None:
+                yield from self.walk(child, path)
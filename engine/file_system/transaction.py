@@ -0,0 +1,197 @@
+import logging
+import os
+import stat
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .edits import EditError, apply_edits, parse_edits, unified_diff
+from .file_system import FileSystem
+from .ignore import GITIGNORE, PILOTIGNORE
+
+logger = logging.getLogger(__name__)
+
+
+class TransactionError(ValueError):
+    """A file operation of a transaction that cannot be carried out."""
+
+
+class FileTransaction:
+    """Stage changes to several files and write them all or none of them.
+
+    Every operation is checked against the files as the previous operations
+    left them, before anything is written. `commit` writes the changes,
+    restores the original files if any write fails, and brings the tree of
+    the file system up to date once.
+    """
+
+    def __init__(self, file_system: FileSystem):
+        self.file_system = file_system
+        # New content by relative path, None for deleted files
+        self._staged: Dict[str, Optional[bytes]] = {}
+        self._originals: Dict[str, Optional[bytes]] = {}
+        # Permission bits by relative path, None for new files
+        self._modes: Dict[str, Optional[int]] = {}
+        self._original_modes: Dict[str, Optional[int]] = {}
+
+    def _path(self, path: str) -> str:
+        path = str(path).strip().strip("/")
+        absolute_path = (self.file_system.root_directory / path).resolve()
+        if not path or not absolute_path.is_relative_to(
+            self.file_system.root_directory.resolve()
+        ):
+            raise TransactionError(f"`{path}` is not a path in the repository")
+        return path
+
+    def _read(self, path: str) -> Optional[bytes]:
+        """Content of a file as staged so far, None if it does not exist."""
+        if path in self._staged:
+            return self._staged[path]
+        absolute_path = self.file_system.root_directory / path
+        if absolute_path.is_dir():
+            raise TransactionError(f"`{path}` is a directory")
+        try:
+            return absolute_path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _mode(self, path: str) -> Optional[int]:
+        """Permission bits of a file as staged so far, of the link target for symlinks."""
+        if path in self._modes:
+            return self._modes[path]
+        try:
+            return stat.S_IMODE(os.stat(self.file_system.root_directory / path).st_mode)
+        except FileNotFoundError:
+            return None
+
+    def _stage(self, path: str, content: Optional[bytes], mode: Optional[int] = None):
+        if path not in self._originals:
+            self._originals[path] = self._read(path)
+            self._original_modes[path] = self._mode(path)
+        self._staged[path] = content
+        if mode is not None or path not in self._modes:
+            self._modes[path] = mode if mode is not None else self._mode(path)
+
+    def write(self, path: str, content: str):
+        path = self._path(path)
+        self._read(path)  # Fails for directories
+        self._stage(path, content.encode("utf-8"))
+
+    def edit(self, path: str, edits: str) -> int:
+        """
+        Stage search/replace blocks or diff hunks, see `edits.parse_edits`.
+        :return: Number of edits that matched inexactly
+        """
+        path = self._path(path)
+        content = self._read(path)
+        if content is None:
+            raise TransactionError(f"File not found: `{path}`")
+        try:
+            text = content.decode("utf-8")
+        except UnicodeDecodeError:
+            raise TransactionError(f"`{path}` is not a text file")
+        try:
+            new_text, inexact = apply_edits(text, parse_edits(edits))
+        except EditError as e:
+            raise TransactionError(f"Cannot edit `{path}`: {e}") from e
+        self._stage(path, new_text.encode("utf-8"))
+        return inexact
+
+    def move(self, source: str, destination: str):
+        source, destination = self._path(source), self._path(destination)
+        content = self._read(source)
+        if content is None:
+            raise TransactionError(f"File not found: `{source}`")
+        self._read(destination)  # Fails for directories
+        mode = self._mode(source)
+        self._stage(source, None)
+        self._stage(destination, content, mode)
+
+    def delete(self, path: str):
+        path = self._path(path)
+        if self._read(path) is None:
+            raise TransactionError(f"File not found: `{path}`")
+        self._stage(path, None)
+
+    @property
+    def paths(self) -> List[str]:
+        """Paths the transaction changes."""
+        return [
+            path
+            for path, content in self._staged.items()
+            if content != self._originals[path]
+        ]
+
+    def diff(self) -> str:
+        """Unified diffs of the changed text files."""
+        diffs = []
+        for path in self.paths:
+            old, new = self._originals[path] or b"", self._staged[path] or b""
+            try:
+                diffs.append(unified_diff(path, old.decode(), new.decode()))
+            except UnicodeDecodeError:
+                diffs.append(f"Binary file {path} changed\n")
+        return "".join(diffs)
+
+    def _write(self, path: str, content: Optional[bytes], mode: Optional[int]):
+        absolute_path = self.file_system.root_directory / path
+        if content is None:
+            absolute_path.unlink(missing_ok=True)
+            return
+        # Symlinks stay links, their targets are written. `_path` made sure
+        # the targets are in the repository.
+        absolute_path = Path(os.path.realpath(absolute_path))
+        absolute_path.parent.mkdir(parents=True, exist_ok=True)
+        # Replace the file in one step, so it is never half written
+        temporary = absolute_path.with_name(f".{absolute_path.name}.pr-pilot-tmp")
+        try:
+            temporary.write_bytes(content)
+            if mode is not None:
+                os.chmod(temporary, mode)
+            os.replace(temporary, absolute_path)
+        except OSError:
+            temporary.unlink(missing_ok=True)
+            raise
+
+    def commit(self) -> List[str]:
+        """
+        Write all staged changes. If a write fails, the files written so far
+        are restored and the error is raised.
+        :return: Paths that changed, including the targets of written symlinks
+        """
+        paths = self.paths
+        link_targets = [self._link_target(path) for path in paths]
+        written = []
+        try:
+            for path in paths:
+                written.append(path)
+                self._write(path, self._staged[path], self._modes[path])
+        except OSError:
+            logger.exception("Rolling back a file transaction")
+            for path in reversed(written):
+                try:
+                    self._write(path, self._originals[path], self._original_modes[path])
+                except OSError:
+                    logger.exception(f"Cannot restore `{path}`")
+            self._refresh(written + link_targets)
+            raise
+        changed = paths + [
+            path for path in dict.fromkeys(link_targets) if path and path not in paths
+        ]
+        self._refresh(changed)
+        return changed
+
+    def _link_target(self, path: str) -> Optional[str]:
+        """Relative path of the file a symlink points to, None for other files."""
+        root_directory = self.file_system.root_directory.resolve()
+        absolute_path = self.file_system.root_directory / path
+        if self._staged[path] is None or not absolute_path.is_symlink():
+            return None
+        return str(absolute_path.resolve().relative_to(root_directory))
+
+    def _refresh(self, paths: List[Optional[str]]):
+        for path in filter(None, paths):
+            if Path(path).name in (GITIGNORE, PILOTIGNORE):
+                # Ignore rules of the whole directory may have changed
+                self.file_system.refresh(Path(path).parent)
+            else:
+                self.file_system.refresh(path)
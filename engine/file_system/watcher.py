@@ -0,0 +1,385 @@
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import struct
+import sys
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Set
+
+from django.conf import settings
+
+from .file_system import FileSystem
+from .ignore import GITIGNORE, PILOTIGNORE
+
+logger = logging.getLogger(__name__)
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InconsistentTreeError(Exception):
+    """The watched tree differs from a full rescan."""
+
+
+@dataclass
+class Changes:
+    """What changed on disk since the last sync, as paths relative to the root."""
+
+    directories: Set[str] = field(default_factory=set)  # Children changed
+    files: Set[str] = field(default_factory=set)  # Content changed
+    rescan: bool = False
+
+    def __bool__(self):
+        return self.rescan or bool(self.directories or self.files)
+
+
+def _parent(key: str) -> str:
+    return key.rpartition("/")[0]
+
+
+def _is_below(key: str, directories: Set[str]) -> bool:
+    """Whether `key` is one of `directories` or inside one of them."""
+    while key:
+        if key in directories:
+            return True
+        key = _parent(key)
+    return "" in directories
+
+
+def _outermost(directories: Set[str]) -> List[str]:
+    """The directories that are not inside another one of them."""
+    return [
+        directory
+        for directory in sorted(directories, key=len)
+        if directory == "" or not _is_below(_parent(directory), directories)
+    ]
+
+
+def _unknown_directories(
+    file_system: FileSystem, directories, known, deep: bool = False
+) -> List[str]:
+    """
+    Directories of the tree that are not in `known`, at or below `directories`.
+    :param deep: Look at the whole subtrees. Otherwise only directories that
+        are new themselves, or whose parent is one of `directories`, are found.
+    """
+    store = file_system.store
+    unknown = []
+    for directory in directories:
+        index = store.find(directory)
+        if index is None or not store.is_dir(index):
+            continue
+        if deep or directory not in known:
+            subtrees = [(directory, index)]
+        else:
+            subtrees = [
+                (f"{directory}/{name}" if directory else name, child)
+                for name, child in store.children[index].items()
+                if store.is_dir(child)
+                and (f"{directory}/{name}" if directory else name) not in known
+            ]
+        for key, subtree in subtrees:
+            keys = [key] + [
+                path for path, child in store.walk(subtree, key) if store.is_dir(child)
+            ]
+            unknown.extend(key for key in keys if key not in known)
+    return unknown
+
+
+class PollingBackend:
+    """Detect changes by comparing modification times of directories.
+
+    Creating, deleting or renaming an entry updates the mtime of its
+    directory, so only directories and ignore files are checked. Files that
+    are rewritten in place are not reported.
+    """
+
+    name = "poll"
+
+    def __init__(self):
+        self._mtimes: Dict[str, int] = {}
+        self._root = None
+
+    @staticmethod
+    def _mtime(path: Path) -> int:
+        try:
+            return path.stat().st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+            return -1
+
+    def start(self, file_system: FileSystem):
+        self._mtimes = {}
+        self._root = file_system.root_directory
+        self.watch(file_system, [""], deep=True)
+
+    def watch(self, file_system: FileSystem, directories, deep: bool = False):
+        """Track directories that are new in the tree, and their ignore files."""
+        for key in _unknown_directories(file_system, directories, self._mtimes, deep):
+            # Scanned before its mtime was recorded, so check it again
+            self._mtimes[key] = 0
+            for name in (GITIGNORE, PILOTIGNORE):
+                ignore_file = f"{key}/{name}" if key else name
+                self._mtimes[ignore_file] = self._mtime(self._root / ignore_file)
+
+    def poll(self) -> Changes:
+        changes = Changes()
+        for key, mtime in list(self._mtimes.items()):
+            current = self._mtime(self._root / key)
+            if current == mtime:
+                continue
+            if current == -1 and Path(key).name not in (GITIGNORE, PILOTIGNORE):
+                # Removed directories are dropped by their parent
+                del self._mtimes[key]
+                changes.directories.add(_parent(key))
+                continue
+            self._mtimes[key] = current
+            if Path(key).name in (GITIGNORE, PILOTIGNORE):
+                changes.files.add(key)
+            else:
+                changes.directories.add(key)
+        return changes
+
+    def close(self):
+        self._mtimes = {}
+
+
+class InotifyBackend:
+    """Receive changes from the Linux kernel through inotify.
+
+    inotify watches single directories, so every directory of the tree gets
+    its own watch. Events queue up in the kernel until the next poll; if the
+    queue overflows, the tree is rescanned.
+    """
+
+    name = "inotify"
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._keys: Dict[int, str] = {}
+        self._watches: Dict[str, int] = {}
+
+    def start(self, file_system: FileSystem):
+        self.watch(file_system, [""], deep=True)
+
+    def watch(self, file_system: FileSystem, directories, deep: bool = False):
+        """Watch directories that are new in the tree."""
+        root = file_system.root_directory
+        for key in _unknown_directories(file_system, directories, self._watches, deep):
+            path = os.fsencode(root / key)
+            watch = self._libc.inotify_add_watch(self._fd, path, WATCH_MASK)
+            if watch < 0:
+                error = ctypes.get_errno()
+                if error in (errno.ENOENT, errno.ENOTDIR):
+                    continue
+                raise OSError(error, f"Cannot watch {root / key}")
+            self._keys[watch] = key
+            self._watches[key] = watch
+
+    def _unwatch(self, key: str):
+        """Stop watching a directory that moved away, and everything below it."""
+        prefix = key + "/"
+        for watched in [k for k in self._watches if k == key or k.startswith(prefix)]:
+            watch = self._watches.pop(watched)
+            self._keys.pop(watch, None)
+            self._libc.inotify_rm_watch(self._fd, watch)
+
+    def poll(self) -> Changes:
+        changes = Changes()
+        while True:
+            try:
+                buffer = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return changes
+            offset = 0
+            while offset < len(buffer):
+                watch, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+                offset += EVENT_HEADER.size
+                start, offset = offset, offset + length
+                name = os.fsdecode(buffer[start:offset].rstrip(b"\0"))
+                if mask & IN_Q_OVERFLOW:
+                    changes.rescan = True
+                    continue
+                if mask & IN_IGNORED:
+                    # The directory was removed, a new one may have its path
+                    key = self._keys.pop(watch, None)
+                    if key is not None and self._watches.get(key) == watch:
+                        del self._watches[key]
+                        changes.directories.add(key)
+                    continue
+                directory = self._keys.get(watch)
+                if directory is None:
+                    continue
+                key = f"{directory}/{name}" if directory else name
+                if mask & IN_CLOSE_WRITE:
+                    changes.files.add(key)
+                    continue
+                changes.directories.add(directory)
+                if mask & IN_MOVED_FROM and mask & IN_ISDIR:
+                    self._unwatch(key)
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def create_backend(name: str = "auto"):
+    """
+    :param name: `inotify`, `poll`, or `auto` for inotify where available
+    """
+    if name == "poll":
+        return PollingBackend()
+    try:
+        return InotifyBackend()
+    except (OSError, AttributeError) as e:
+        if name == "inotify":
+            raise
+        logger.info(f"inotify is not available, polling instead: {e}")
+        return PollingBackend()
+
+
+class FileSystemWatcher:
+    """A `FileSystem` that follows changes on disk, also those made by git.
+
+    Long-running workers keep worktrees across tasks. Instead of scanning
+    them for every task, the watcher applies the changes reported by its
+    backend on each `sync`: directories whose entries changed are reconciled
+    one level deep, directories with changed ignore files are rescanned.
+    """
+
+    _watchers: Dict[Path, "FileSystemWatcher"] = {}
+    _watchers_lock = threading.Lock()
+
+    def __init__(self, root_directory, backend: str = "auto", check: bool = False):
+        """
+        :param root_directory: Root of the tree
+        :param backend: `inotify`, `poll`, or `auto` for inotify where available
+        :param check: Compare the tree with a full rescan after every sync
+        """
+        self.file_system = FileSystem(root_directory)
+        self.check = check
+        self._lock = threading.Lock()
+        self._backend = create_backend(backend)
+        self._start()
+
+    def _start(self):
+        try:
+            self._backend.start(self.file_system)
+        except OSError as e:
+            # E.g. the limit of inotify watches was reached
+            logger.warning(f"Cannot watch {self.file_system.root_directory}: {e}")
+            self._backend.close()
+            self._backend = PollingBackend()
+            self._backend.start(self.file_system)
+
+    @property
+    def backend(self) -> str:
+        return self._backend.name
+
+    @classmethod
+    def for_root(cls, root_directory) -> "FileSystemWatcher":
+        """Return the watcher of a directory, starting one if necessary."""
+        root_directory = Path(root_directory)
+        with cls._watchers_lock:
+            watcher = cls._watchers.get(root_directory)
+            if watcher is None:
+                watcher = cls(
+                    root_directory,
+                    backend=settings.FILE_SYSTEM_WATCHER,
+                    check=settings.FILE_SYSTEM_WATCHER_CHECK,
+                )
+                cls._watchers[root_directory] = watcher
+            return watcher
+
+    @classmethod
+    def close_root(cls, root_directory):
+        with cls._watchers_lock:
+            watcher = cls._watchers.pop(Path(root_directory), None)
+        if watcher:
+            watcher.close()
+
+    def sync(self) -> FileSystem:
+        """Apply the changes on disk since the last sync and return the tree."""
+        with self._lock:
+            changes = self._backend.poll()
+            if changes:
+                self._apply(changes)
+            if self.check:
+                differences = self.verify()
+                if differences:
+                    raise InconsistentTreeError(
+                        f"{self.file_system.root_directory}: {differences[:10]}"
+                    )
+            return self.file_system
+
+    def _apply(self, changes: Changes):
+        file_system = self.file_system
+        if changes.rescan:
+            logger.info(f"Rescanning {file_system.root_directory}")
+            file_system.rescan()
+            self._backend.close()
+            self._backend = type(self._backend)()
+            self._start()
+            return
+        refreshed = {
+            _parent(path)
+            for path in changes.files
+            if Path(path).name in (GITIGNORE, PILOTIGNORE)
+        }
+        for directory in _outermost(refreshed):
+            file_system.refresh(directory)
+        # Parents first, so that new directories are scanned once
+        directories = sorted(changes.directories, key=lambda key: key.count("/"))
+        for directory in directories:
+            if not _is_below(directory, refreshed):
+                file_system.sync_directory(directory)
+        for path in changes.files:
+            if not _is_below(_parent(path), refreshed | changes.directories):
+                file_system.refresh(path)
+        self._backend.watch(file_system, refreshed, deep=True)
+        self._backend.watch(file_system, directories)
+
+    def verify(self) -> List[str]:
+        """Differences between the tree and a full rescan of the disk."""
+        expected = _paths(FileSystem(self.file_system.root_directory))
+        actual = _paths(self.file_system)
+        return (
+            [f"missing {path}" for path in sorted(expected.keys() - actual.keys())]
+            + [f"unexpected {path}" for path in sorted(actual.keys() - expected.keys())]
+            + [
+                f"kind of {path}"
+                for path in sorted(expected.keys() & actual.keys())
+                if expected[path] != actual[path]
+            ]
+        )
+
+    def close(self):
+        self._backend.close()
+
+
+def _paths(file_system: FileSystem) -> Dict[str, bool]:
+    store = file_system.store
+    return {path: store.is_dir(index) for path, index in store.walk()}
@@ -0,0 +1,14 @@
+import importlib
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Run a benchmark from the engine.benchmarks package."
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", type=str)
+
+    def handle(self, *args, **options):
+        benchmark = importlib.import_module(f"engine.benchmarks.{options['name']}")
+        benchmark.run()
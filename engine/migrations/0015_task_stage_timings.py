@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 18:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("engine", "0014_task_gpt_model"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="stage_timings",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
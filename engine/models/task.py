@@ -13,6 +13,7 @@ from engine.task_context.github_issue import GithubIssueContext
 from engine.task_context.pr_review_comment import PRReviewCommentContext
 from engine.task_context.task_context import TaskContext
 from engine.task_scheduler import TaskScheduler
+from engine.util import get_current_task_id
 from webhooks.jwt_tools import get_installation_access_token
 
 logger = logging.getLogger(__name__)
@@ -50,6 +51,7 @@ class Task(models.Model):
     result = models.TextField(blank=True)
     pilot_command = models.TextField(blank=True)
     gpt_model = models.CharField(max_length=200, blank=True, null=True, default="gpt-4-turbo")
+    stage_timings = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return self.title
@@ -77,14 +79,15 @@ class Task(models.Model):
 
     @staticmethod
     def current() -> "Task":
-        if not settings.TASK_ID:
+        task_id = get_current_task_id()
+        if not task_id:
             raise ValueError("TASK_ID is not set")
-        return Task.get(settings.TASK_ID)
+        return Task.get(task_id)
 
     @staticmethod
     @lru_cache()
     def get(task_id: str) -> "Task":
-        if not settings.TASK_ID:
+        if not task_id:
             raise ValueError("TASK_ID is not set")
         return Task.objects.get(id=task_id)
 
@@ -1,18 +1,34 @@
 import logging
 from pathlib import Path
+from typing import Iterator
 
 import git
 from django.conf import settings
 from github.Repository import Repository
 from pydantic import Field, BaseModel
 
-from engine.file_system import FileSystem
 from engine.models.task_event import TaskEvent
 from engine.models.task import Task
+from engine.repository import GitSession, Workspace
+from engine.repository.diff_stat import DiffStat, diff_stat, stream_patch
+from engine.repository.mirror_cache import (
+    partial_clone_filter,
+    sparse_checkout_enabled,
+)
 
 logger = logging.getLogger(__name__)
 
 
+def _session() -> GitSession:
+    """Git session of the workspace of the current task."""
+    return Workspace.current().git
+
+
+def _repo() -> git.Repo:
+    """Repository in the workspace of the current task."""
+    return _session().repo
+
+
 class Project(BaseModel):
     name: str = Field(description="Name of the project")
     main_branch: str = Field(description="Name of the main branch")
@@ -39,9 +55,33 @@ class Project(BaseModel):
         )
         return eligible
 
+    @staticmethod
+    def record_change(message: str, paths, event: TaskEvent = None):
+        """
+        Record a file operation, to be committed with the next `flush_changes`.
+        :param message: Commit message of the operation
+        :param paths: Paths created, changed or deleted by the operation
+        :param event: TaskEvent of the tool call that made the change
+        """
+        _session().journal.record(message, paths, event.id if event else None)
+
+    @staticmethod
+    def flush_changes():
+        """Commit all recorded file operations in a single commit."""
+        commit = _session().journal.flush()
+        if commit:
+            TaskEvent.add(
+                actor="assistant",
+                action="commit_changes",
+                message=commit.summary,
+                target=commit.hexsha,
+            )
+        return commit
+
     @staticmethod
     def commit_all_changes(message, push=False):
-        repo = git.Repo(settings.REPO_DIR)
+        Project.flush_changes()
+        repo = _repo()
         repo.git.add(A=True)
         commit = repo.index.commit(message)
         TaskEvent.add(
@@ -56,7 +96,7 @@ class Project(BaseModel):
 
     @staticmethod
     def commit_changes_of_file(file_path, message):
-        repo = git.Repo(settings.REPO_DIR)
+        repo = _repo()
         repo.git.add(file_path)
         repo.index.commit(message)
 
@@ -69,65 +109,137 @@ class Project(BaseModel):
 
     def load_pilot_hints(self):
         """Load pilot hints from the repository"""
-        file_system = FileSystem()
+        file_system = Workspace.current().file_system
         node = file_system.get_node(Path(".pilot-hints.md"))
         return node.content if node else ""
 
+    def load_repository_map(self):
+        """Outline of the repository for the prompt, empty if disabled"""
+        if not settings.REPOSITORY_MAP_MAX_CHARS:
+            return ""
+        repository_map = Workspace.current().repository_map
+        return f"# Repository map\nFiles and their top-level classes and functions:\n```\n{repository_map}\n```\n"
+
     def discard_all_changes(self):
         logger.info("Discarding all changes")
-        repo = git.Repo(settings.REPO_DIR)
+        repo = _repo()
         repo.git.reset(hard=True)
+        Workspace.current().invalidate_file_system()
 
     def fetch_remote(self):
-        repo = git.Repo(settings.REPO_DIR)
+        repo = _repo()
         origin = repo.remote(name="origin")
-        origin.fetch()
+        blob_filter = partial_clone_filter(repo.git)
+        if blob_filter:
+            origin.fetch(filter=blob_filter)
+        else:
+            origin.fetch()
+
+    @staticmethod
+    def materialize(path) -> bool:
+        """
+        Add a path outside of the sparse checkout to the working tree. In a
+        partial clone, its blobs are fetched from the remote on the way.
+        :param path: Path of a file or directory, relative to the repository root
+        :return: True if the working tree was extended
+        """
+        try:
+            session = _session()
+        except (git.InvalidGitRepositoryError, git.NoSuchPathError):
+            return False
+        repo = session.repo
+        if not sparse_checkout_enabled(repo.git):
+            return False
+        object_type = session.object_type("HEAD", str(path))
+        if not object_type:
+            return False
+        directory = path if object_type == "tree" else str(Path(path).parent)
+        if directory in ("", "."):
+            return False
+        logger.info(f"Adding {directory} to sparse checkout")
+        repo.git.sparse_checkout("add", directory)
+        Workspace.current().file_system.refresh(directory)
+        TaskEvent.add(
+            actor="assistant",
+            action="sparse_checkout",
+            target=directory,
+            message=f"Checked out `{directory}`",
+        )
+        return True
 
     def checkout_latest_default_branch(self):
         logger.info(f"Checking out latest {self.main_branch} branch")
-        repo = git.Repo(settings.REPO_DIR)
-        repo.git.checkout(self.main_branch)
-        repo.git.pull()
+        repo = _repo()
+        repo.remote(name="origin").fetch(self.main_branch)
+        # Worktrees share their branches, so only one of them could check out
+        # the default branch. Work on a detached HEAD instead.
+        repo.git.checkout("--detach", f"origin/{self.main_branch}")
+        Workspace.current().invalidate_file_system()
 
     def checkout_branch(self, branch):
         logger.info(f"Checking out branch {branch}")
-        repo = git.Repo(settings.REPO_DIR)
-        repo.git.checkout(branch)
+        repo = _repo()
+        # Worktrees share their branches, so tasks on the same PR could not
+        # check out its branch at the same time. `push_branch` pushes HEAD.
+        repo.git.checkout("--detach", f"origin/{branch}")
+        Workspace.current().invalidate_file_system()
 
     def has_uncommitted_changes(self):
-        repo = git.Repo(settings.REPO_DIR)
-        return repo.is_dirty(untracked_files=True)
+        return _session().is_dirty()
 
     def create_new_branch(self, branch_name):
         logger.info(f"Creating new branch {branch_name}")
-        repo = git.Repo(settings.REPO_DIR)
+        repo = _repo()
         repo.git.checkout("-b", branch_name)
 
     def push_branch(self, branch):
+        """Push HEAD to a branch on origin, also from a detached HEAD."""
         logger.info(f"Pushing branch {branch} to origin")
-        repo = git.Repo(settings.REPO_DIR)
+        repo = _repo()
         origin = repo.remote(name="origin")
-        origin.push(
-            refspec="{}:refs/heads/{}".format(branch, branch), set_upstream=True
-        )
+        origin.push(refspec=f"HEAD:refs/heads/{branch}", set_upstream=True)
 
     def delete_branch(self, branch):
         logger.info(f"Deleting branch {branch}")
-        repo = git.Repo(settings.REPO_DIR)
+        repo = _repo()
         repo.git.branch("-d", branch)
 
     def get_diff_to_main(self):
-        repo = git.Repo(settings.REPO_DIR)
-        diff = repo.git.diff(f"{self.main_branch}...{repo.active_branch.name}")
+        diff = _repo().git.diff(f"origin/{self.main_branch}...HEAD")
         return diff.strip()
 
+    def has_changes_to_main(self) -> bool:
+        """
+        Check whether HEAD differs from where it branched off the main branch,
+        by comparing tree IDs instead of building the diff.
+        """
+        session = _session()
+        head_tree = session.resolve("HEAD^{tree}")
+        main = f"origin/{self.main_branch}"
+        if head_tree == session.resolve(f"{main}^{{tree}}"):
+            return False
+        merge_base = session.repo.git.merge_base(main, "HEAD")
+        return head_tree != session.resolve(f"{merge_base}^{{tree}}")
+
+    def get_diff_stat_to_main(self) -> DiffStat:
+        """Changed files and line counts of HEAD against the main branch."""
+        return diff_stat(_repo(), f"origin/{self.main_branch}...HEAD")
+
+    def stream_diff_to_main(self) -> Iterator[str]:
+        """Yield the diff of HEAD against the main branch in chunks."""
+        return stream_patch(_repo(), f"origin/{self.main_branch}...HEAD")
+
     @property
     def active_branch(self):
-        return git.Repo(settings.REPO_DIR).active_branch.name
+        return _session().active_branch
 
     def create_pull_request(self, title, body, head, labels=[]):
         if not head:
             head = self.active_branch
+        if not head:
+            raise ValueError(
+                "Cannot create a pull request without a head branch, HEAD is detached"
+            )
         task = Task.current()
         g = task.github
         # Get the repository where you want to create the pull request
@@ -0,0 +1,15 @@
+from .commit_journal import CommitJournal
+from .git_session import GitSession
+from .mirror_cache import MirrorCache, BLOBLESS_FILTER
+from .workspace import Workspace
+from .worktree_pool import WorktreePool, Worktree
+
+__all__ = [
+    "CommitJournal",
+    "GitSession",
+    "MirrorCache",
+    "BLOBLESS_FILTER",
+    "Workspace",
+    "WorktreePool",
+    "Worktree",
+]
@@ -0,0 +1,28 @@
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from github.Repository import Repository
+
+from webhooks.models import CloneMode, GithubRepository
+
+from .mirror_cache import BLOBLESS_FILTER
+
+
+def get_clone_options(github_repo: Repository) -> Tuple[Optional[str], List[str]]:
+    """
+    Determine how to clone a repository and which directories to check out.
+    :param github_repo: The Github repository
+    :return: Object filter (None for a full clone) and sparse checkout paths
+    """
+    repository = GithubRepository.objects.filter(
+        full_name=github_repo.full_name
+    ).first()
+    clone_mode = CloneMode(repository.clone_mode) if repository else CloneMode.AUTO
+    sparse_paths = repository.sparse_checkout_paths.split() if repository else []
+    if clone_mode == CloneMode.AUTO:
+        if github_repo.size > settings.PARTIAL_CLONE_SIZE_THRESHOLD_KB:
+            clone_mode = CloneMode.BLOBLESS
+        else:
+            clone_mode = CloneMode.FULL
+    blob_filter = BLOBLESS_FILTER if clone_mode == CloneMode.BLOBLESS else None
+    return blob_filter, sparse_paths
@@ -0,0 +1,96 @@
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import git
+
+logger = logging.getLogger(__name__)
+
+# Commit trailer that maps a coalesced commit back to the tool calls in it
+EVENT_TRAILER = "Task-Event"
+
+
+@dataclass
+class JournalEntry:
+    message: str
+    paths: List[str] = field(default_factory=list)
+    event_id: Optional[str] = None
+
+
+class CommitJournal:
+    """File operations of a task that have not been committed yet.
+
+    Tools record the paths they touch instead of committing each change.
+    `flush` stages only those paths and writes one commit for all of them.
+    """
+
+    def __init__(self, repo: git.Repo):
+        self.repo = repo
+        self.entries: List[JournalEntry] = []
+        self._lock = threading.Lock()
+
+    def record(self, message: str, paths: List[str], event_id=None):
+        """
+        Record a file operation.
+        :param message: Commit message of the operation
+        :param paths: Paths created, changed or deleted by the operation
+        :param event_id: ID of the TaskEvent of the tool call
+        """
+        paths = [str(path).strip("/") for path in paths]
+        with self._lock:
+            self.entries.append(
+                JournalEntry(message, paths, str(event_id) if event_id else None)
+            )
+
+    def flush(self) -> Optional[git.Commit]:
+        """
+        Commit all recorded operations at once.
+        :return: The new commit, or None if there was nothing to commit
+        """
+        with self._lock:
+            entries, self.entries = self.entries, []
+        if not entries:
+            return None
+        paths = sorted({path for entry in entries for path in entry.paths})
+        root = self.repo.working_tree_dir
+        missing = [
+            path for path in paths if not os.path.lexists(os.path.join(root, path))
+        ]
+        if missing:
+            # Deleted files can only be staged if git knows about them
+            tracked = set(self.repo.git.ls_files("--", *missing).splitlines())
+            paths = [path for path in paths if path not in missing or path in tracked]
+        if not paths:
+            return None
+        # `--sparse` allows adding files outside of a sparse checkout
+        self.repo.git.add("--all", "--sparse", "--", *paths)
+        staged, _, _ = self.repo.git.diff(
+            "--cached",
+            "--quiet",
+            with_extended_output=True,
+            with_exceptions=False,
+        )
+        if staged == 0:
+            logger.info(f"No changes in {len(entries)} journal entries")
+            return None
+        commit = self.repo.index.commit(self.commit_message(entries))
+        logger.info(
+            f"Committed {len(entries)} operations on {len(paths)} paths as {commit.hexsha}"
+        )
+        return commit
+
+    @staticmethod
+    def commit_message(entries: List[JournalEntry]) -> str:
+        if len(entries) == 1:
+            subject = entries[0].message
+        else:
+            subject = f"{entries[0].message} (and {len(entries) - 1} more changes)"
+        lines = [subject, ""]
+        if len(entries) > 1:
+            lines += [f"- {entry.message}" for entry in entries] + [""]
+        lines += [
+            f"{EVENT_TRAILER}: {entry.event_id}" for entry in entries if entry.event_id
+        ]
+        return "\n".join(lines).strip() + "\n"
@@ -0,0 +1,89 @@
+import codecs
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional
+
+import git
+
+PATCH_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class FileStat:
+    path: str
+    insertions: Optional[int]  # None for binary files
+    deletions: Optional[int]
+    old_path: Optional[str] = None  # Set for renames
+
+
+@dataclass
+class DiffStat:
+    files: List[FileStat] = field(default_factory=list)
+
+    @property
+    def insertions(self) -> int:
+        return sum(file.insertions or 0 for file in self.files)
+
+    @property
+    def deletions(self) -> int:
+        return sum(file.deletions or 0 for file in self.files)
+
+    def __bool__(self):
+        return bool(self.files)
+
+    def __str__(self):
+        return (
+            f"{len(self.files)} files changed, "
+            f"{self.insertions} insertions(+), {self.deletions} deletions(-)"
+        )
+
+
+def parse_numstat(output: str) -> DiffStat:
+    """Parse the output of `git diff --numstat -z`."""
+    tokens = output.split("\0")
+    files = []
+    i = 0
+    while i < len(tokens) and tokens[i]:
+        insertions, deletions, path = tokens[i].split("\t", 2)
+        old_path = None
+        if not path:
+            # Renames are followed by the old and the new path
+            old_path, path = tokens[i + 1], tokens[i + 2]
+            i += 2
+        files.append(
+            FileStat(
+                path=path,
+                insertions=None if insertions == "-" else int(insertions),
+                deletions=None if deletions == "-" else int(deletions),
+                old_path=old_path,
+            )
+        )
+        i += 1
+    return DiffStat(files)
+
+
+def diff_stat(repo: git.Repo, *revs: str) -> DiffStat:
+    """Count changed lines per file, without producing the patch."""
+    return parse_numstat(repo.git.diff("--numstat", "-z", "-M", *revs))
+
+
+def stream_patch(
+    repo: git.Repo, *revs: str, chunk_size: int = PATCH_CHUNK_SIZE
+) -> Iterator[str]:
+    """Yield the patch between revisions in chunks, as git writes it."""
+    process = repo.git.diff(*revs, as_process=True)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    stdout = process.proc.stdout
+    finished = False
+    try:
+        while chunk := stdout.read(chunk_size):
+            yield decoder.decode(chunk)
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+        finished = True
+    finally:
+        if not finished:
+            # The caller stopped reading early
+            process.proc.kill()
+        stdout.close()
+        process.proc.wait()
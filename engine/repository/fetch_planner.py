@@ -0,0 +1,63 @@
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from github import GithubException
+from github.Repository import Repository
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FetchPlan:
+    """The branches a task needs and how much of their history.
+
+    `depth` only applies to mirrors that have no full history yet. None means
+    the complete history of the branches.
+    """
+
+    branches: List[str] = field(default_factory=list)
+    depth: Optional[int] = None
+
+    @property
+    def refspecs(self) -> List[str]:
+        return [
+            f"+refs/heads/{branch}:refs/remotes/origin/{branch}"
+            for branch in self.branches
+        ]
+
+
+def plan_fetch(
+    github_repo: Repository, head: str = None, base: str = None
+) -> FetchPlan:
+    """
+    Plan the fetch of a task.
+    :param github_repo: The Github repository
+    :param head: Head branch of the PR of the task, if any
+    :param base: Base branch of the PR of the task, if any
+    :return: The default branch, plus head and base of the PR. New branches
+        only need the tip of the default branch. PRs need enough history to
+        reach the merge base of head and base, and the merge base of head and
+        the default branch, which diffs of the task are taken against.
+    """
+    default_branch = github_repo.default_branch
+    branches = [default_branch]
+    if not head:
+        return FetchPlan(branches=branches, depth=1)
+    base = base or default_branch
+    for branch in (head, base):
+        if branch not in branches:
+            branches.append(branch)
+    depth = 1
+    for other in dict.fromkeys((base, default_branch)):
+        try:
+            comparison = github_repo.compare(other, head)
+        except GithubException as e:
+            logger.warning(
+                f"Cannot compare {other}...{head}, fetching full history: {e}"
+            )
+            return FetchPlan(branches=branches)
+        # The merge base is never further away from a tip than the number of
+        # commits that only that tip contains
+        depth = max(depth, comparison.ahead_by + 1, comparison.behind_by + 1)
+    return FetchPlan(branches=branches, depth=depth)
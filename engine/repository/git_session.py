@@ -0,0 +1,124 @@
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+import git
+
+from .commit_journal import CommitJournal
+
+logger = logging.getLogger(__name__)
+
+_sessions: Dict[Path, "GitSession"] = {}
+_sessions_lock = threading.Lock()
+
+
+class GitSession:
+    """A long-lived handle on the repository of a task.
+
+    The session keeps one `git.Repo` and its persistent `git cat-file --batch`
+    and `--batch-check` processes, so object reads and ref lookups do not
+    spawn a new git process per call. Use `GitSession.for_root` to share the
+    session of a working directory.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.repo = git.Repo(self.root)
+        self.journal = CommitJournal(self.repo)
+        # The cat-file processes serve one request at a time
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def for_root(root) -> "GitSession":
+        """Return the session of a working directory, opening it if necessary."""
+        root = Path(root)
+        with _sessions_lock:
+            session = _sessions.get(root)
+            if session is None:
+                session = _sessions[root] = GitSession(root)
+            return session
+
+    @staticmethod
+    def close_root(root):
+        """Close the session of a working directory, if there is one."""
+        with _sessions_lock:
+            session = _sessions.pop(Path(root), None)
+        if session:
+            session.close()
+
+    def close(self):
+        """Terminate the persistent git processes of this session."""
+        with self._lock:
+            self.repo.close()
+
+    def object_header(self, rev: str) -> Optional[Tuple[str, str, int]]:
+        """
+        Look up an object without reading its content.
+        :param rev: Any revision expression, e.g. `HEAD`, `origin/main` or `HEAD:README.md`
+        :return: Object ID, type and size, or None if the object does not exist
+        """
+        with self._lock:
+            try:
+                object_id, object_type, size = self.repo.git.get_object_header(rev)
+            except ValueError:
+                return None
+        return object_id.decode(), object_type.decode(), size
+
+    def resolve(self, rev: str) -> Optional[str]:
+        """Return the object ID a revision points to, or None if it does not exist."""
+        header = self.object_header(rev)
+        return header[0] if header else None
+
+    def object_type(self, rev: str, path: str = "") -> Optional[str]:
+        """Return `blob`, `tree` or `commit` for a path in a revision, or None."""
+        header = self.object_header(f"{rev}:{path.strip('/')}")
+        return header[1] if header else None
+
+    def read_blob(self, rev: str, path: str) -> Optional[bytes]:
+        """
+        Read the content of a file in a revision.
+        :param rev: Revision to read from
+        :param path: Path of the file, relative to the repository root
+        :return: Content of the file, or None if it is not a file in that revision
+        """
+        with self._lock:
+            try:
+                _, object_type, _, data = self.repo.git.get_object_data(
+                    f"{rev}:{path.strip('/')}"
+                )
+            except ValueError:
+                return None
+        return data if object_type == b"blob" else None
+
+    def is_dirty(self) -> bool:
+        """Check for staged, unstaged and untracked changes with one `git status`."""
+        with self._lock:
+            return bool(self.repo.git.status("--porcelain", "--untracked-files=normal"))
+
+    @property
+    def active_branch(self) -> Optional[str]:
+        """Name of the checked out branch, or None on a detached HEAD."""
+        head = self.repo.head
+        return None if head.is_detached else head.reference.name
+
+    def branch_names(self, prefix: str = "") -> Set[str]:
+        """
+        Names of local branches and branches on `origin` that start with a prefix.
+        Remote branches are listed on the remote, because a mirror only
+        fetches the branches its tasks need.
+        """
+        with self._lock:
+            names = {
+                branch.name
+                for branch in self.repo.branches
+                if branch.name.startswith(prefix)
+            }
+            if not any(remote.name == "origin" for remote in self.repo.remotes):
+                return names
+            remote_refs = self.repo.git.ls_remote(
+                "--heads", "origin", f"refs/heads/{prefix}*"
+            )
+        for line in remote_refs.splitlines():
+            names.add(line.split("\t", 1)[1].removeprefix("refs/heads/"))
+        return names
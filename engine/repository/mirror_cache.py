@@ -0,0 +1,242 @@
+import fcntl
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional
+
+import git
+from django.conf import settings
+
+from .fetch_planner import FetchPlan
+
+logger = logging.getLogger(__name__)
+
+# Remote branches are mirrored into refs/remotes/origin/* so that local
+# branches created on top of the mirror are never touched by a fetch
+MIRROR_REFSPEC = "+refs/heads/*:refs/remotes/origin/*"
+LAST_USED_FILE = "pr-pilot-last-used"
+SIZE_FILE = "pr-pilot-size"
+# Kept in the administrative directory of a worktree while a task uses it
+LEASE_FILE = "pr-pilot-leased"
+BLOBLESS_FILTER = "blob:none"
+SHALLOW_DEPTH_CONFIG = "prpilot.shallowdepth"
+
+
+def disk_usage(path: Path) -> int:
+    """Return the number of bytes used by all files below `path`."""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except FileNotFoundError:
+                continue
+    return total
+
+
+def configure_partial_clone(git_cmd: git.Git, blob_filter: str):
+    """Make `origin` a promisor remote, so missing objects are fetched on demand."""
+    git_cmd.config("core.repositoryformatversion", "1")
+    git_cmd.config("extensions.partialClone", "origin")
+    git_cmd.config("remote.origin.promisor", "true")
+    git_cmd.config("remote.origin.partialclonefilter", blob_filter)
+
+
+def partial_clone_filter(git_cmd: git.Git) -> Optional[str]:
+    """Return the object filter of a partial clone, or None for a full clone."""
+    blob_filter = git_cmd.config(
+        "--default", "", "--get", "remote.origin.partialclonefilter"
+    )
+    return blob_filter or None
+
+
+def sparse_checkout_enabled(git_cmd: git.Git) -> bool:
+    sparse = git_cmd.config(
+        "--bool", "--default", "false", "--get", "core.sparseCheckout"
+    )
+    return sparse == "true"
+
+
+class MirrorCache:
+    """Bare mirrors of GitHub repositories, kept on local disk across tasks.
+
+    Each task only fetches the objects that changed since the last task on the
+    same repository and works in a worktree of the mirror (see `WorktreePool`).
+    Least recently used mirrors are evicted together with their idle
+    worktrees once the cache grows beyond its disk budget. Mirrors with a
+    worktree in use are kept.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes: Optional[int] = None):
+        self.cache_dir = Path(cache_dir or settings.REPO_CACHE_DIR)
+        self.max_bytes = (
+            max_bytes if max_bytes is not None else settings.REPO_CACHE_MAX_BYTES
+        )
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def mirror_path(self, github_project: str) -> Path:
+        return self.cache_dir / (github_project.replace("/", "__") + ".git")
+
+    @contextmanager
+    def lock(self, mirror_path: Path, blocking=True):
+        """Hold an exclusive lock on a mirror. Yields False if not acquired."""
+        with open(mirror_path.with_suffix(".lock"), "w") as lock_file:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(lock_file, flags)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def sync(
+        self,
+        github_project: str,
+        remote_url: str,
+        blob_filter: Optional[str] = None,
+        fetch_plan: Optional[FetchPlan] = None,
+    ) -> Path:
+        """
+        Create or update the mirror of a repository.
+        :param github_project: Full name of the Github project
+        :param remote_url: URL to fetch from, including credentials
+        :param blob_filter: Object filter for a new mirror, e.g. `blob:none`.
+            An existing mirror keeps the mode it was created with.
+        :param fetch_plan: Branches to fetch, all branches if not given
+        :return: Path of the bare mirror
+        """
+        path = self.mirror_path(github_project)
+        with self.lock(path):
+            # Commands run inside the mirror directory. Worktrees with their own
+            # config move `core.bare` out of the shared config, which would make
+            # git.Repo mistake the mirror for a working tree.
+            mirror_git = git.Git(path)
+            is_new = not (path / "HEAD").exists()
+            if not is_new:
+                logger.info(f"Updating mirror of {github_project} in {path}")
+                # Installation tokens expire, so the URL changes between tasks
+                mirror_git.remote("set-url", "origin", remote_url)
+            else:
+                logger.info(f"Creating mirror of {github_project} in {path}")
+                shutil.rmtree(path, ignore_errors=True)
+                git.Repo.init(path, bare=True).close()
+                mirror_git.remote("add", "origin", remote_url)
+                mirror_git.config("remote.origin.fetch", MIRROR_REFSPEC)
+                if blob_filter:
+                    configure_partial_clone(mirror_git, blob_filter)
+            self._fetch(mirror_git, path, fetch_plan, is_new)
+            (path / LAST_USED_FILE).touch()
+            (path / SIZE_FILE).write_text(str(disk_usage(path)))
+        self.evict(keep=path)
+        return path
+
+    def _fetch(
+        self,
+        mirror_git: git.Git,
+        path: Path,
+        fetch_plan: Optional[FetchPlan],
+        is_new: bool,
+    ):
+        is_shallow = (path / "shallow").exists()
+        if not fetch_plan:
+            mirror_git.fetch("origin", prune=True, no_tags=True, unshallow=is_shallow)
+            return
+        # Only mirrors without full history are fetched shallow
+        options = {}
+        if fetch_plan.depth and is_shallow and self._is_leased(path):
+            # A shallower boundary would cut off the base commits of running
+            # tasks. Without a depth, the fetch stops at the commits the
+            # mirror already has and keeps its boundary.
+            logger.info(f"Fetching {', '.join(fetch_plan.branches)} (incremental)")
+            mirror_git.fetch("origin", *fetch_plan.refspecs, no_tags=True)
+            return
+        if fetch_plan.depth and (is_new or is_shallow):
+            # A smaller depth would cut off history other tasks may still use
+            depth = max(
+                fetch_plan.depth,
+                int(mirror_git.config("--default", "0", "--get", SHALLOW_DEPTH_CONFIG)),
+            )
+            mirror_git.config(SHALLOW_DEPTH_CONFIG, str(depth))
+            options["depth"] = depth
+        elif is_shallow:
+            # The plan needs more history than the mirror has
+            options["unshallow"] = True
+        logger.info(f"Fetching {', '.join(fetch_plan.branches)} ({options or 'full'})")
+        mirror_git.fetch("origin", *fetch_plan.refspecs, no_tags=True, **options)
+
+    @staticmethod
+    def _is_leased(mirror_path: Path) -> bool:
+        """Whether a task works in one of the worktrees of a mirror."""
+        return any((mirror_path / "worktrees").glob(f"*/{LEASE_FILE}"))
+
+    def _last_used(self, mirror_path: Path) -> float:
+        try:
+            return (mirror_path / LAST_USED_FILE).stat().st_mtime
+        except FileNotFoundError:
+            return 0.0
+
+    def size(self, mirror_path: Path) -> int:
+        """Bytes used by a mirror, as measured after its last fetch."""
+        try:
+            return int((mirror_path / SIZE_FILE).read_text())
+        except (FileNotFoundError, ValueError):
+            pass
+        if not (mirror_path / "HEAD").exists():
+            return 0
+        # Mirrors created before sizes were recorded
+        size = disk_usage(mirror_path)
+        (mirror_path / SIZE_FILE).write_text(str(size))
+        return size
+
+    @staticmethod
+    def _worktree_paths(mirror_path: Path) -> List[Path]:
+        """Working directories of the worktrees of a mirror."""
+        paths = []
+        for admin_dir in (mirror_path / "worktrees").glob("*"):
+            try:
+                # `gitdir` points to the `.git` file in the working directory
+                git_file = Path((admin_dir / "gitdir").read_text().strip())
+            except FileNotFoundError:
+                continue
+            paths.append(git_file.parent)
+        return paths
+
+    def _remove_mirror(self, mirror_path: Path):
+        from engine.file_system import FileSystemWatcher
+
+        for worktree_path in self._worktree_paths(mirror_path):
+            FileSystemWatcher.close_root(worktree_path)
+            shutil.rmtree(worktree_path, ignore_errors=True)
+        shutil.rmtree(mirror_path, ignore_errors=True)
+
+    def evict(self, keep: Optional[Path] = None):
+        """
+        Delete least recently used mirrors and their idle worktrees until the
+        cache fits its disk budget.
+        """
+        mirrors = [path for path in self.cache_dir.glob("*.git") if path.is_dir()]
+        usage = {path: self.size(path) for path in mirrors}
+        total = sum(usage.values())
+        for path in sorted(mirrors, key=self._last_used):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            with self.lock(path, blocking=False) as acquired:
+                # Worktrees are leased while holding the lock, see `WorktreePool`
+                if not acquired or self._is_leased(path):
+                    logger.info(f"Mirror {path} is in use, not evicting")
+                    continue
+                idle_hours = (time.time() - self._last_used(path)) / 3600
+                logger.info(
+                    f"Evicting mirror {path} ({usage[path]} bytes, idle for {idle_hours:.1f}h)"
+                )
+                self._remove_mirror(path)
+            total -= usage[path]
+        return total
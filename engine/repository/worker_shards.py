@@ -0,0 +1,58 @@
+import logging
+import re
+import socket
+import zlib
+from typing import List
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def repository_shard(github_project: str) -> int:
+    """Shard of the worker that runs the tasks of a repository."""
+    return zlib.crc32(github_project.lower().encode()) % settings.TASK_WORKER_SHARDS
+
+
+def own_shard() -> int:
+    """
+    Shard of this worker: `TASK_WORKER_SHARD` if set, otherwise the ordinal
+    of its StatefulSet pod, e.g. 1 for `pr-pilot-worker-1`.
+    """
+    if settings.TASK_WORKER_SHARD is not None:
+        return int(settings.TASK_WORKER_SHARD)
+    ordinal = re.search(r"-(\d+)$", socket.gethostname())
+    if ordinal is None:
+        logger.warning("Cannot tell the shard of this worker, using shard 0")
+        return 0
+    return int(ordinal.group(1)) % settings.TASK_WORKER_SHARDS
+
+
+def _sharded(queue: str, shard: int) -> str:
+    return queue if settings.TASK_WORKER_SHARDS == 1 else f"{queue}:{shard}"
+
+
+def task_queue(github_project: str) -> str:
+    """Redis queue for the tasks of a repository."""
+    return _sharded(settings.REDIS_QUEUE, repository_shard(github_project))
+
+
+def prefetch_queue(github_project: str) -> str:
+    """Redis queue for the prefetch hints of a repository, read by the same worker as its tasks."""
+    return _sharded(settings.REDIS_PREFETCH_QUEUE, repository_shard(github_project))
+
+
+def own_task_queues() -> List[str]:
+    """
+    Queues this worker takes tasks from. The unsharded queue is drained too,
+    e.g. of tasks scheduled before sharding was turned on.
+    """
+    return list(
+        dict.fromkeys(
+            [_sharded(settings.REDIS_QUEUE, own_shard()), settings.REDIS_QUEUE]
+        )
+    )
+
+
+def own_prefetch_queue() -> str:
+    return _sharded(settings.REDIS_PREFETCH_QUEUE, own_shard())
@@ -0,0 +1,190 @@
+import logging
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Optional
+
+import git
+from django.conf import settings
+
+from engine.util import get_current_task_id
+
+from .git_session import GitSession
+
+if TYPE_CHECKING:
+    from engine.code_search import RelevanceIndex, SymbolIndex, TrigramIndex
+    from engine.code_search.symbol_parsers import FileSymbols
+    from engine.file_system import FileSystem
+
+logger = logging.getLogger(__name__)
+
+_workspaces: Dict[str, "Workspace"] = {}
+_workspaces_lock = threading.Lock()
+
+
+@dataclass
+class Workspace:
+    """The working directory of a task.
+
+    `Project`, `FileSystem` and the agent tools resolve their root through the
+    workspace of the current task, so several tasks can run side by side in one
+    worker process. The file tree and the code search index are built once per
+    workspace and shared by all tools of the task.
+    """
+
+    root: Path
+    github_project: Optional[str] = None
+    _file_system: Optional["FileSystem"] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _code_index: Optional["TrigramIndex"] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _symbol_index: Optional["SymbolIndex"] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _relevance_index: Optional["RelevanceIndex"] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False, compare=False
+    )
+
+    @staticmethod
+    def current() -> "Workspace":
+        """Return the workspace of the current task, or one rooted at REPO_DIR."""
+        task_id = get_current_task_id()
+        workspace = _workspaces.get(str(task_id)) if task_id else None
+        if workspace is None:
+            return Workspace(root=Path(settings.REPO_DIR))
+        return workspace
+
+    @property
+    def git(self) -> GitSession:
+        """The git session of this workspace."""
+        return GitSession.for_root(self.root)
+
+    def _git_or_none(self) -> Optional[GitSession]:
+        """The git session, or None if the workspace is not a git repository."""
+        try:
+            return self.git
+        except (git.InvalidGitRepositoryError, git.NoSuchPathError):
+            return None
+
+    @property
+    def file_system(self) -> "FileSystem":
+        """The file tree of this workspace, scanned on first use."""
+        from engine.file_system import FileSystem, FileSystemWatcher
+
+        if settings.FILE_SYSTEM_WATCHER != "off":
+            # Outlives the task, along with the worktree
+            return FileSystemWatcher.for_root(self.root).sync()
+        with self._lock:
+            if self._file_system is None:
+                self._file_system = FileSystem(self.root)
+            return self._file_system
+
+    @property
+    def code_index(self) -> "TrigramIndex":
+        """The code search index of this workspace, loaded or built on first use."""
+        from engine.code_search import open_index
+
+        file_system = self.file_system
+        with self._lock:
+            if self._code_index is None:
+                self._code_index = open_index(file_system, self._git_or_none())
+            return self._code_index
+
+    @property
+    def symbol_index(self) -> "SymbolIndex":
+        """Definitions and references of symbols in this workspace, built on first use."""
+        from engine.code_search import open_symbol_index
+
+        file_system = self.file_system
+        with self._lock:
+            if self._symbol_index is None:
+                self._symbol_index = open_symbol_index(file_system, self._git_or_none())
+            return self._symbol_index
+
+    @property
+    def relevance_index(self) -> "RelevanceIndex":
+        """The BM25 index of the files of this workspace, loaded or built on first use."""
+        from engine.code_search import open_relevance_index
+
+        file_system = self.file_system
+        with self._lock:
+            if self._relevance_index is None:
+                self._relevance_index = open_relevance_index(
+                    file_system, self._git_or_none()
+                )
+            return self._relevance_index
+
+    def file_symbols(self, path) -> Optional["FileSymbols"]:
+        """
+        The symbols of one file, parsed unless the same blob was parsed before.
+        :return: None if no parser handles the file, or it is not a text file
+        """
+        from engine.code_search import parse_file, symbol_cache_directory
+
+        return parse_file(
+            self.root,
+            str(path).lstrip("/"),
+            cache_directory=symbol_cache_directory(self._git_or_none()),
+        )
+
+    @property
+    def repository_map(self) -> str:
+        """Outline of the directories, files and top-level symbols of this workspace."""
+        from engine.code_search import load_repository_map
+
+        return load_repository_map(
+            self.file_system, self._git_or_none(), lambda: self.symbol_index
+        )
+
+    def update_code_indexes(self, paths):
+        """Index files again after they were written, if the indexes are loaded."""
+        with self._lock:
+            indexes = [
+                index
+                for index in (
+                    self._code_index,
+                    self._symbol_index,
+                    self._relevance_index,
+                )
+                if index is not None
+            ]
+        if not indexes:
+            # Changes are picked up from `git status` when they are loaded
+            return
+        file_system = self.file_system
+        # Deleted files, and files that are not ignored
+        paths = [
+            path
+            for path in paths
+            if file_system.exists(path) or not (self.root / path).exists()
+        ]
+        for index in indexes:
+            index.update(paths)
+
+    def invalidate_file_system(self):
+        """
+        Drop the file tree and the code indexes, e.g. after a checkout
+        replaced the working tree.
+        """
+        with self._lock:
+            self._file_system = None
+            self._code_index = None
+            self._symbol_index = None
+            self._relevance_index = None
+
+    def activate(self, task_id):
+        """Bind this workspace to a task."""
+        with _workspaces_lock:
+            _workspaces[str(task_id)] = self
+
+    @staticmethod
+    def deactivate(task_id):
+        with _workspaces_lock:
+            workspace = _workspaces.pop(str(task_id), None)
+        if workspace:
+            GitSession.close_root(workspace.root)
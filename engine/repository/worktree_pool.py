@@ -0,0 +1,185 @@
+import logging
+import shutil
+import threading
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import git
+from django.conf import settings
+
+from .fetch_planner import FetchPlan
+from .mirror_cache import (
+    LEASE_FILE,
+    MirrorCache,
+    partial_clone_filter,
+    sparse_checkout_enabled,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _lease_file(path: Path) -> Path:
+    """Lease marker of a worktree, in its administrative directory in the mirror."""
+    git_file = (path / ".git").read_text()
+    return Path(git_file.removeprefix("gitdir:").strip()) / LEASE_FILE
+
+
+@dataclass
+class Worktree:
+    github_project: str
+    path: Path
+    mirror: Path
+    blob_filter: Optional[str] = None
+    fetched_bytes: int = 0
+    # Local branch of the task, deleted when the worktree is released
+    branch: Optional[str] = None
+
+
+class WorktreePool:
+    """Git worktrees that share the object store of a repository mirror.
+
+    Each task gets its own worktree, so one worker can run several tasks for
+    the same or different repositories at once. Released worktrees are reset,
+    cleaned and handed to the next task on the same repository.
+    """
+
+    _shared: Optional["WorktreePool"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        mirror_cache: Optional[MirrorCache] = None,
+        pool_dir=None,
+        max_idle: Optional[int] = None,
+    ):
+        self.mirror_cache = mirror_cache or MirrorCache()
+        self.pool_dir = Path(pool_dir or settings.WORKTREE_POOL_DIR)
+        self.max_idle = (
+            max_idle if max_idle is not None else settings.WORKTREE_POOL_SIZE
+        )
+        self._idle: Dict[str, List[Path]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self.pool_dir.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def shared(cls) -> "WorktreePool":
+        """Return the pool of this worker process."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+                cls._shared.remove_stale_worktrees()
+            return cls._shared
+
+    def acquire(
+        self,
+        github_project: str,
+        remote_url: str,
+        branch: str,
+        blob_filter: Optional[str] = None,
+        sparse_paths: Optional[List[str]] = None,
+        fetch_plan: Optional[FetchPlan] = None,
+    ) -> Worktree:
+        """
+        Hand out a worktree with a detached HEAD at the tip of `origin/<branch>`.
+        :param github_project: Full name of the Github project
+        :param remote_url: URL to fetch from, including credentials
+        :param branch: Branch to check out
+        :param blob_filter: Object filter for a new mirror, e.g. `blob:none`
+        :param sparse_paths: Directories to check out, everything if empty
+        :param fetch_plan: Branches to fetch, all branches if not given
+        :return: The worktree
+        """
+        mirror = self.mirror_cache.mirror_path(github_project)
+        mirror_size = self.mirror_cache.size(mirror)
+        mirror = self.mirror_cache.sync(
+            github_project, remote_url, blob_filter, fetch_plan
+        )
+        # The lease keeps the mirror from being evicted while the task runs
+        with self.mirror_cache.lock(mirror):
+            path = None
+            with self._lock:
+                idle = self._idle[github_project]
+                while idle and path is None:
+                    path = idle.pop()
+                    if not (path / ".git").exists():
+                        # Evicted with its mirror
+                        path = None
+            if path:
+                logger.info(f"Reusing worktree {path} for {github_project}")
+            else:
+                path = (
+                    self.pool_dir / github_project.replace("/", "__") / uuid.uuid4().hex
+                )
+                logger.info(f"Adding worktree {path} for {github_project}")
+                git.Git(mirror).worktree(
+                    "add", "--no-checkout", "--detach", str(path), f"origin/{branch}"
+                )
+            _lease_file(path).touch()
+        repo = git.Repo(path)
+        if sparse_paths:
+            repo.git.sparse_checkout("set", "--cone", *sparse_paths)
+        elif sparse_checkout_enabled(repo.git):
+            repo.git.sparse_checkout("disable")
+        repo.git.reset("--hard", f"origin/{branch}")
+        repo.close()
+        return Worktree(
+            github_project=github_project,
+            path=path,
+            mirror=mirror,
+            blob_filter=partial_clone_filter(git.Git(mirror)),
+            fetched_bytes=self.mirror_cache.size(mirror) - mirror_size,
+        )
+
+    def release(self, worktree: Worktree):
+        """Reset and clean a worktree and put it back into the pool."""
+        try:
+            with git.Repo(worktree.path) as repo:
+                branches = {worktree.branch}
+                if not repo.head.is_detached:
+                    branches.add(repo.active_branch.name)
+                repo.git.reset("--hard")
+                repo.git.clean("-ffdx")
+                repo.git.checkout("--detach")
+                # Branches live in the shared mirror, pushed ones are on Github.
+                # Tasks usually end on a detached HEAD, so go by name.
+                local_branches = {head.name for head in repo.heads}
+                for branch in branches & local_branches:
+                    repo.git.branch("-D", branch)
+        except git.GitCommandError as e:
+            logger.warning(f"Failed to recycle worktree {worktree.path}: {e}")
+            self.remove(worktree)
+            return
+        worktree.branch = None
+        _lease_file(worktree.path).unlink(missing_ok=True)
+        with self._lock:
+            idle = self._idle[worktree.github_project]
+            if len(idle) < self.max_idle:
+                idle.append(worktree.path)
+                return
+        self.remove(worktree)
+
+    def remove(self, worktree: Worktree):
+        from engine.file_system import FileSystemWatcher
+
+        logger.info(f"Removing worktree {worktree.path}")
+        FileSystemWatcher.close_root(worktree.path)
+        with self.mirror_cache.lock(worktree.mirror):
+            shutil.rmtree(worktree.path, ignore_errors=True)
+            mirror_git = git.Git(worktree.mirror)
+            mirror_git.worktree("prune")
+            if worktree.branch:
+                try:
+                    mirror_git.branch("-D", worktree.branch)
+                except git.GitCommandError:
+                    pass  # Deleted by the task already
+
+    def remove_stale_worktrees(self):
+        """Remove worktrees left behind by a previous worker process."""
+        for project_dir in self.pool_dir.iterdir():
+            shutil.rmtree(project_dir, ignore_errors=True)
+        for mirror in self.mirror_cache.cache_dir.glob("*.git"):
+            with self.mirror_cache.lock(mirror):
+                git.Git(mirror).worktree("prune")
@@ -5,10 +5,11 @@ import redis
 
 from accounts.models import UserBudget
 from engine.job import KubernetesJob
+from engine.repository.prefetch import schedule_prefetch
+from engine.repository.worker_shards import task_queue
 from engine.util import run_task_in_background
 from prpilot import settings
 
-
 logger = logging.getLogger(__name__)
 
 
@@ -37,6 +38,9 @@ class TaskScheduler:
         return rate_limit.core.remaining == 0
 
     def schedule(self):
+        if settings.JOB_STRATEGY == "redis":
+            # Let a worker warm the repository while we run the checks below
+            schedule_prefetch(self.redis_queue, self.task)
         self.context.acknowledge_user_prompt()
         if self.user_budget_empty():
             logger.info(f"User {self.task.github_user} has no budget")
@@ -85,7 +89,9 @@ class TaskScheduler:
             logger.info(f"Running task in log mode: {self.task.id}")
         elif settings.JOB_STRATEGY == "redis":
             logger.info(f"Scheduling task via Redis: {self.task.id}")
-            self.redis_queue.rpush(settings.REDIS_QUEUE, str(self.task.id))
+            self.redis_queue.rpush(
+                task_queue(self.task.github_project), str(self.task.id)
+            )
         else:
             raise ValueError(f"Invalid JOB_STRATEGY: {settings.JOB_STRATEGY}")
 
@@ -1,12 +1,15 @@
 import logging
-import os
+import threading
 
 import redis
 from django.conf import settings
 from sentry_sdk import configure_scope
 
 from engine.models.task import Task
+from engine.repository.prefetch import PrefetchWorker
+from engine.repository.worker_shards import own_task_queues
 from engine.task_engine import TaskEngine
+from engine.util import current_task_id
 
 logger = logging.getLogger(__name__)
 
@@ -19,19 +22,39 @@ class TaskWorker:
         )
 
     def run(self):
-        logger.info("Running task worker")
+        logger.info(
+            f"Running task worker with {settings.TASK_WORKER_CONCURRENCY} task slots"
+        )
+        threads = [
+            threading.Thread(target=self.process_tasks, name=f"task-slot-{i}")
+            for i in range(settings.TASK_WORKER_CONCURRENCY)
+        ]
+        # Prefetches warm the mirrors and worktrees of this worker
+        prefetch_worker = PrefetchWorker(self.redis_queue)
+        threads.append(threading.Thread(target=prefetch_worker.run, name="prefetch"))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def process_tasks(self):
+        queues = own_task_queues()
         while True:
-            _, task_id = self.redis_queue.blpop([settings.REDIS_QUEUE])
+            _, task_id = self.redis_queue.blpop(queues)
             task_id = task_id.decode("utf-8")
-            settings.TASK_ID = task_id
-            os.environ["TASK_ID"] = task_id
+            # Each task slot runs in its own thread, so the task ID is bound to
+            # the thread's context instead of the global settings
+            current_task_id.set(task_id)
             logger.info(f"Received task {task_id}")
-            task = Task.objects.get(id=task_id)
-            engine = TaskEngine(task)
-            with configure_scope() as scope:
-                scope.set_tag("task_id", str(task.id))
-                scope.set_tag("github_user", task.github_user)
-                scope.set_tag("github_project", task.github_project)
-                scope.set_tag("github_issue", task.issue_number)
-                scope.set_tag("github_pr", task.pr_number)
-                engine.run()
+            try:
+                task = Task.objects.get(id=task_id)
+                engine = TaskEngine(task)
+                with configure_scope() as scope:
+                    scope.set_tag("task_id", str(task.id))
+                    scope.set_tag("github_user", task.github_user)
+                    scope.set_tag("github_project", task.github_project)
+                    scope.set_tag("github_issue", task.issue_number)
+                    scope.set_tag("github_pr", task.pr_number)
+                    engine.run()
+            except Exception as e:
+                logger.error(f"Failed to run task {task_id}", exc_info=e)
@@ -0,0 +1,46 @@
+import pytest
+
+from engine.repository import GitSession
+from engine.repository.commit_journal import EVENT_TRAILER
+from engine.tests.test_mirror_cache import commit_file, git
+
+
+@pytest.fixture
+def session(tmp_path):
+    git(tmp_path, "init", "-q", "-b", "main")
+    git(tmp_path, "config", "user.name", "Test")
+    git(tmp_path, "config", "user.email", "test@example.com")
+    commit_file(tmp_path, "README.md", "Hello\n")
+    commit_file(tmp_path, "old.md", "Old\n")
+    session = GitSession(tmp_path)
+    yield session
+    session.close()
+
+
+def test_flush_coalesces_operations_into_one_commit(session, tmp_path):
+    head = session.resolve("HEAD")
+    (tmp_path / "a.py").write_text("a")
+    session.journal.record("Add a.py", ["a.py"], event_id="event-1")
+    (tmp_path / "old.md").unlink()
+    session.journal.record("Delete old.md", ["/old.md"], event_id="event-2")
+    (tmp_path / "scratch.txt").write_text("not touched by a tool")
+
+    commit = session.journal.flush()
+
+    assert commit.parents[0].hexsha == head
+    assert set(commit.stats.files) == {"a.py", "old.md"}
+    assert f"{EVENT_TRAILER}: event-1" in commit.message
+    assert f"{EVENT_TRAILER}: event-2" in commit.message
+    assert "scratch.txt" in session.repo.untracked_files
+    assert session.journal.flush() is None
+
+
+def test_flush_without_changes_does_not_commit(session, tmp_path):
+    head = session.resolve("HEAD")
+    (tmp_path / "README.md").write_text("Hello\n")
+    session.journal.record("Rewrite README.md", ["README.md"])
+    (tmp_path / "temp.txt").write_text("temp")
+    (tmp_path / "temp.txt").unlink()
+    session.journal.record("Delete temp.txt", ["temp.txt"])
+    assert session.journal.flush() is None
+    assert session.resolve("HEAD") == head
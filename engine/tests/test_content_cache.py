@@ -0,0 +1,63 @@
+import os
+
+from engine.file_system.content_cache import (
+    MIN_ENTRY_WEIGHT,
+    MMAP_THRESHOLD_BYTES,
+    ContentCache,
+    read_content,
+)
+
+
+def test_reads_text_and_counts_non_empty_lines(tmp_path):
+    path = tmp_path / "main.py"
+    path.write_text("import os\n\n   \nprint(os.name)\n")
+    content = read_content(path)
+    assert content.text == "import os\n\n   \nprint(os.name)\n"
+    assert content.non_empty_lines == 2
+    assert content.readable
+
+
+def test_detects_binary_oversized_and_invalid_utf8(tmp_path):
+    (tmp_path / "image.png").write_bytes(b"\x89PNG\r\n\x1a\n\0\0\0")
+    assert read_content(tmp_path / "image.png").binary
+    (tmp_path / "big.txt").write_text("x" * 100)
+    content = read_content(tmp_path / "big.txt", max_bytes=10)
+    assert content.oversized and content.text == ""
+    (tmp_path / "latin1.txt").write_bytes("café\n".encode("latin-1"))
+    assert read_content(tmp_path / "latin1.txt").text == "caf�\n"
+
+
+def test_large_files_are_mapped(tmp_path):
+    path = tmp_path / "large.txt"
+    path.write_text("line\n" * (MMAP_THRESHOLD_BYTES // 5 + 1))
+    content = read_content(path)
+    assert content.non_empty_lines == MMAP_THRESHOLD_BYTES // 5 + 1
+    assert len(content.text) == content.size
+
+
+def test_cache_follows_changes_and_evicts(tmp_path):
+    # Room for one small file
+    cache = ContentCache(max_bytes=MIN_ENTRY_WEIGHT + 10)
+    path = tmp_path / "a.txt"
+    path.write_text("one\n")
+    assert cache.read(path).text == "one\n"
+    assert cache.read(path).text == "one\n"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    path.write_text("two!\n")
+    os.utime(path, ns=(1, 1))
+    assert cache.read(path).text == "two!\n"
+
+    (tmp_path / "b.txt").write_text("another\n")
+    cache.read(tmp_path / "b.txt")
+    # a.txt is evicted, both do not fit
+    cache.read(path)
+    assert cache.misses == 4
+
+
+def test_empty_files_count_against_the_budget(tmp_path):
+    cache = ContentCache(max_bytes=3 * MIN_ENTRY_WEIGHT)
+    for i in range(10):
+        (tmp_path / f"{i}.txt").write_text("")
+        cache.read(tmp_path / f"{i}.txt")
+    assert len(cache._entries) == 3
@@ -0,0 +1,57 @@
+import git as gitpython
+import pytest
+
+from engine.project import Project
+from engine.repository import Workspace
+from engine.repository.diff_stat import diff_stat, parse_numstat, stream_patch
+from engine.tests.test_mirror_cache import commit_file, git
+
+
+@pytest.fixture
+def repo(tmp_path):
+    origin = tmp_path / "origin"
+    origin.mkdir()
+    git(origin, "init", "-q", "-b", "main")
+    commit_file(origin, "README.md", "Hello\n")
+    clone = tmp_path / "clone"
+    git(tmp_path, "clone", "-q", str(origin), str(clone))
+    git(clone, "checkout", "-q", "-b", "feature")
+    return clone
+
+
+def test_parse_numstat_handles_renames_and_binary_files():
+    output = "3\t1\tsrc/a.py\0-\t-\tlogo.png\0" "0\t0\t\0old.md\0new.md\0"
+    stat = parse_numstat(output)
+    assert [file.path for file in stat.files] == ["src/a.py", "logo.png", "new.md"]
+    assert stat.files[1].insertions is None
+    assert stat.files[2].old_path == "old.md"
+    assert (stat.insertions, stat.deletions) == (3, 1)
+
+
+@pytest.mark.django_db
+def test_change_detection_against_main(repo, task):
+    Workspace(root=repo).activate(task.id)
+    try:
+        project = Project(name="owner/project", main_branch="main")
+        assert not project.has_changes_to_main()
+        commit_file(repo, "README.md", "Hello\nWorld\n")
+        assert project.has_changes_to_main()
+        stat = project.get_diff_stat_to_main()
+        assert str(stat) == "1 files changed, 1 insertions(+), 0 deletions(-)"
+        commit_file(repo, "README.md", "Hello\n")
+        assert not project.has_changes_to_main()
+    finally:
+        Workspace.deactivate(task.id)
+
+
+def test_stream_patch_matches_full_diff(repo):
+    commit_file(repo, "data.txt", "".join(f"line {i} ü\n" for i in range(5000)))
+    with gitpython.Repo(repo) as git_repo:
+        chunks = list(stream_patch(git_repo, "origin/main...HEAD", chunk_size=1000))
+        assert len(chunks) > 1
+        assert "".join(chunks) == git_repo.git.diff("origin/main...HEAD") + "\n"
+        assert diff_stat(git_repo, "origin/main...HEAD").insertions == 5000
+        # Stopping early terminates git
+        stream = stream_patch(git_repo, "origin/main...HEAD", chunk_size=1000)
+        next(stream)
+        stream.close()
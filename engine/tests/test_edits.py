@@ -0,0 +1,84 @@
+import pytest
+
+from engine.file_system.edits import (
+    EditError,
+    apply_edits,
+    parse_edits,
+    unified_diff,
+)
+
+CODE = """\
+def greet(name):
+    message = f"Hello {name}"
+    return message
+
+
+def leave(name):
+    return f"Bye {name}"
+"""
+
+
+def block(search, replace):
+    return f"<<<<<<< SEARCH\n{search}\n=======\n{replace}\n>>>>>>> REPLACE\n"
+
+
+def test_search_replace_blocks():
+    edits = parse_edits(
+        block('    message = f"Hello {name}"', '    message = f"Hi {name}"')
+        + block("def leave(name):", "def leave(name, loudly=False):")
+    )
+    text, inexact = apply_edits(CODE, edits)
+    assert text == CODE.replace("Hello", "Hi").replace(
+        "leave(name)", "leave(name, loudly=False)"
+    )
+    assert inexact == 0
+
+
+def test_unified_diff_hunks():
+    edits = parse_edits(
+        "--- a/greet.py\n+++ b/greet.py\n"
+        "@@ -6,2 +6,2 @@\n"
+        " def leave(name):\n"
+        '-    return f"Bye {name}"\n'
+        '+    return f"Goodbye {name}"\n'
+    )
+    assert edits[0].line_hint == 6
+    text, _ = apply_edits(CODE, edits)
+    assert text == CODE.replace("Bye", "Goodbye")
+    assert unified_diff("greet.py", CODE, text).startswith(
+        "--- a/greet.py\n+++ b/greet.py\n@@ -4,4 +4,4 @@"
+    )
+
+
+def test_inexact_matches_are_reindented():
+    # Indented with tabs instead of spaces, and a typo
+    edits = parse_edits(
+        block(
+            '\tmessage = f"Hello {nme}"\n\treturn message', '\treturn f"Hello {name}"'
+        )
+    )
+    text, inexact = apply_edits(CODE, edits)
+    assert inexact == 1
+    assert text.startswith('def greet(name):\n    return f"Hello {name}"\n\n\n')
+
+
+def test_ambiguous_and_missing_lines():
+    code = "x = 1\ny = 2\nx = 1\n"
+    with pytest.raises(EditError, match="occur 2 times"):
+        apply_edits(code, parse_edits(block("x = 1", "x = 3")))
+    with pytest.raises(EditError, match="Edit 2: The lines to replace are not in"):
+        apply_edits(
+            code,
+            parse_edits(block("y = 2", "y = 3") + block("z = 4", "z = 5")),
+        )
+    with pytest.raises(EditError, match="not closed"):
+        parse_edits("<<<<<<< SEARCH\nx = 1\n=======\n")
+    with pytest.raises(EditError, match="No search/replace blocks"):
+        parse_edits("x = 3")
+
+
+def test_line_endings_are_kept():
+    text, _ = apply_edits("a\r\nb\r\nc", parse_edits(block("b", "B")))
+    assert text == "a\r\nB\r\nc"
+    text, _ = apply_edits("", parse_edits(block("", "new")))
+    assert text == "new\n"
@@ -0,0 +1,42 @@
+from unittest.mock import MagicMock
+
+from github import GithubException
+
+from engine.repository.fetch_planner import plan_fetch
+
+
+def test_new_branch_only_needs_tip_of_default_branch():
+    github_repo = MagicMock(default_branch="main")
+    plan = plan_fetch(github_repo)
+    assert plan.branches == ["main"]
+    assert plan.depth == 1
+
+
+def test_pr_depth_reaches_merge_base():
+    github_repo = MagicMock(default_branch="main")
+    github_repo.compare.return_value = MagicMock(ahead_by=3, behind_by=10)
+    plan = plan_fetch(github_repo, head="feature", base="main")
+    github_repo.compare.assert_called_once_with("main", "feature")
+    assert plan.branches == ["main", "feature"]
+    assert plan.depth == 11
+
+
+def test_pr_on_other_base_also_reaches_merge_base_with_default_branch():
+    github_repo = MagicMock(default_branch="main")
+    comparisons = {
+        ("develop", "feature"): MagicMock(ahead_by=3, behind_by=10),
+        ("main", "feature"): MagicMock(ahead_by=40, behind_by=2),
+    }
+    github_repo.compare.side_effect = lambda base, head: comparisons[(base, head)]
+    plan = plan_fetch(github_repo, head="feature", base="develop")
+    assert plan.branches == ["main", "feature", "develop"]
+    assert plan.depth == 41
+    assert plan.refspecs[1] == "+refs/heads/feature:refs/remotes/origin/feature"
+
+
+def test_pr_without_comparison_fetches_full_history():
+    github_repo = MagicMock(default_branch="main")
+    github_repo.compare.side_effect = GithubException(404, "Not Found", None)
+    plan = plan_fetch(github_repo, head="feature", base="main")
+    assert plan.branches == ["main", "feature"]
+    assert plan.depth is None
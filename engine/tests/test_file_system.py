@@ -0,0 +1,94 @@
+from pathlib import Path
+
+import pytest
+
+from engine.file_system import FileSystem
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / "src" / "app").mkdir(parents=True)
+    (tmp_path / "src" / "app" / "main.py").write_text("print('hello')\n")
+    (tmp_path / "src" / "util.py").write_text("")
+    (tmp_path / "README.md").write_text("# Project\n")
+    (tmp_path / "__pycache__").mkdir()
+    (tmp_path / "__pycache__" / "main.pyc").write_text("")
+    return tmp_path
+
+
+def test_get_node_by_relative_and_absolute_path(root):
+    file_system = FileSystem(root)
+    node = file_system.get_node(Path("src/app/main.py"))
+    assert node.content == "print('hello')\n"
+    assert file_system.get_node(root / "src" / "app" / "main.py") == node
+    assert file_system.get_node(Path(".")) == file_system.tree
+    assert file_system.exists("src/app")
+    assert not file_system.exists("__pycache__/main.pyc")
+    assert file_system.get_node(Path("missing.py")) is None
+
+
+def test_list_directory(root):
+    file_system = FileSystem(root)
+    names = [node.path.name for node in file_system.list_directory("src")]
+    assert names == ["app", "util.py"]
+    assert [node.path.name for node in file_system.list_directory("")] == [
+        "README.md",
+        "src",
+    ]
+    assert file_system.list_directory("README.md") is None
+    assert file_system.list_directory("missing") is None
+
+
+def assert_matches_rescan(file_system):
+    rescanned = FileSystem(file_system.root_directory)
+    paths = {path: node.is_directory for path, node in walk(file_system.tree)}
+    assert paths == {path: node.is_directory for path, node in walk(rescanned.tree)}
+    for path in paths:
+        assert file_system.get_node(path).path_relative_to_cwd == Path(path)
+
+
+def walk(node, prefix=""):
+    for child in node.nodes:
+        path = f"{prefix}/{child.path.name}" if prefix else child.path.name
+        yield path, child
+        yield from walk(child, path)
+
+
+def test_mutations_update_tree_in_place(root, monkeypatch):
+    file_system = FileSystem(root)
+    monkeypatch.setattr(
+        file_system, "rescan", lambda: pytest.fail("Mutations must not rescan")
+    )
+    node = file_system.save("x = 1\n", Path("src/new/deep/module.py"))
+    assert node.parent == file_system.get_node("src/new/deep")
+    file_system.save("ignored", Path("__pycache__/other.pyc"))
+    file_system.copy_file("README.md", "docs/README.md")
+    file_system.move_file("src/app/main.py", "src/main.py")
+    assert file_system.get_node("src/main.py").parent == file_system.get_node("src")
+    file_system.delete_file("src/util.py")
+    file_system.create_directory("empty")
+    file_system.move_file("src/new", "lib")
+    assert file_system.get_node("lib/deep/module.py").content == "x = 1\n"
+    assert_matches_rescan(file_system)
+
+
+def test_tree_representations(root):
+    file_system = FileSystem(root)
+    # Files come before directories, otherwise in the order of the scan
+    assert file_system.tree.simple_dict() == {
+        ".": ["README.md", {"src": ["util.py", {"src/app": ["main.py"]}]}]
+    }
+    assert sorted(file_system.list_files()) == [
+        root / "README.md",
+        root / "src" / "app" / "main.py",
+        root / "src" / "util.py",
+    ]
+    tree = {node["id"]: node for node in file_system.get_directory_tree()}
+    assert tree.keys() == {"README.md", "src"}
+    assert tree["src"]["type"] == "default"
+    assert {child["id"] for child in tree["src"]["children"]} == {
+        "src/app",
+        "src/util.py",
+    }
+    assert file_system.get_node("src").is_directory
+    assert file_system.get_node("README.md").is_file
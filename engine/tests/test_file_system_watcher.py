@@ -0,0 +1,108 @@
+import subprocess
+
+import pytest
+
+from engine.file_system import FileSystemWatcher
+from engine.file_system.watcher import InconsistentTreeError, InotifyBackend
+
+
+def inotify_available():
+    try:
+        InotifyBackend().close()
+        return True
+    except (OSError, AttributeError):
+        return False
+
+
+BACKENDS = [
+    "poll",
+    pytest.param(
+        "inotify",
+        marks=pytest.mark.skipif(
+            not inotify_available(), reason="inotify is not available"
+        ),
+    ),
+]
+
+
+def git(root, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+        cwd=root,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.fixture
+def repo(tmp_path):
+    git(tmp_path, "init", "-q", "-b", "main")
+    (tmp_path / "src" / "app").mkdir(parents=True)
+    (tmp_path / "src" / "app" / "main.py").write_text("print('hello')\n")
+    (tmp_path / "src" / "util.py").write_text("")
+    (tmp_path / ".gitignore").write_text("build/\n")
+    git(tmp_path, "add", "-A")
+    git(tmp_path, "commit", "-q", "-m", "Initial")
+    git(tmp_path, "checkout", "-q", "-b", "feature")
+    git(tmp_path, "rm", "-q", "-r", "src/app")
+    (tmp_path / "docs" / "api").mkdir(parents=True)
+    (tmp_path / "docs" / "api" / "index.md").write_text("# API\n")
+    (tmp_path / "src" / ".gitignore").write_text("*.log\n")
+    git(tmp_path, "add", "-A")
+    git(tmp_path, "commit", "-q", "-m", "Feature")
+    git(tmp_path, "checkout", "-q", "main")
+    return tmp_path
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_follows_git_operations(repo, backend):
+    watcher = FileSystemWatcher(repo, backend=backend, check=True)
+    assert watcher.backend == backend
+    file_system = watcher.sync()
+    assert file_system.exists("src/app/main.py")
+
+    git(repo, "checkout", "-q", "feature")
+    watcher.sync()
+    assert not file_system.exists("src/app")
+    assert file_system.exists("docs/api/index.md")
+
+    (repo / "src" / "debug.log").write_text("")
+    (repo / "build").mkdir()
+    (repo / "build" / "out.js").write_text("")
+    watcher.sync()
+    assert not file_system.exists("src/debug.log")
+    assert not file_system.exists("build")
+
+    # Un-ignoring a directory brings back its content
+    (repo / ".gitignore").write_text("")
+    watcher.sync()
+    assert file_system.exists("build/out.js")
+
+    git(repo, "reset", "-q", "--hard")
+    git(repo, "clean", "-q", "-ffdx")
+    watcher.sync()
+    git(repo, "checkout", "-q", "main")
+    (repo / "docs").mkdir()
+    (repo / "docs" / "moved").mkdir()
+    (repo / "src" / "app").rename(repo / "docs" / "moved" / "app")
+    watcher.sync()
+    assert file_system.exists("docs/moved/app/main.py")
+    assert not file_system.exists("src/app")
+    watcher.close()
+
+
+def test_check_mode_detects_a_stale_tree(repo):
+    watcher = FileSystemWatcher(repo, backend="poll", check=True)
+    file_system = watcher.sync()
+    file_system.store.remove(file_system.store.find("src/util.py"))
+    with pytest.raises(InconsistentTreeError):
+        watcher.sync()
+    watcher.close()
+
+
+def test_watchers_are_shared_per_root(repo):
+    watcher = FileSystemWatcher.for_root(repo)
+    assert FileSystemWatcher.for_root(repo) is watcher
+    FileSystemWatcher.close_root(repo)
+    assert FileSystemWatcher.for_root(repo) is not watcher
+    FileSystemWatcher.close_root(repo)
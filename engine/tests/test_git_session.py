@@ -0,0 +1,45 @@
+import pytest
+
+from engine.repository import GitSession
+from engine.tests.test_mirror_cache import commit_file, git
+
+
+@pytest.fixture
+def session(tmp_path):
+    git(tmp_path, "init", "-q", "-b", "main")
+    commit_file(tmp_path, "README.md", "Hello\n")
+    session = GitSession(tmp_path)
+    yield session
+    session.close()
+
+
+def test_reads_objects_and_refs(session, tmp_path):
+    assert session.read_blob("HEAD", "README.md") == b"Hello\n"
+    assert session.object_type("HEAD", "README.md") == "blob"
+    assert session.object_type("HEAD") == "tree"
+    assert session.resolve("refs/heads/missing") is None
+    assert session.read_blob("HEAD", "missing.md") is None
+    assert session.active_branch == "main"
+    assert "main" in session.branch_names()
+
+
+def test_sees_commits_made_after_it_was_opened(session, tmp_path):
+    first_commit = session.resolve("HEAD")
+    commit_file(tmp_path, "README.md", "Changed\n")
+    assert session.resolve("HEAD") != first_commit
+    assert session.read_blob("HEAD", "README.md") == b"Changed\n"
+
+
+def test_is_dirty(session, tmp_path):
+    assert not session.is_dirty()
+    (tmp_path / "new.txt").write_text("untracked")
+    assert session.is_dirty()
+
+
+def test_sessions_are_shared_per_root(tmp_path):
+    git(tmp_path, "init", "-q", "-b", "main")
+    session = GitSession.for_root(tmp_path)
+    assert GitSession.for_root(tmp_path) is session
+    GitSession.close_root(tmp_path)
+    assert GitSession.for_root(tmp_path) is not session
+    GitSession.close_root(tmp_path)
@@ -0,0 +1,57 @@
+import pytest
+
+from engine.file_system import FileSystem
+from engine.file_system.ignore import IgnoreMatcher, IgnoreRules
+
+
+@pytest.mark.parametrize(
+    "pattern, path, is_dir, ignored",
+    [
+        ("*.log", "debug.log", False, True),
+        ("*.log", "logs/debug.log", False, True),
+        ("/build", "build", True, True),
+        ("/build", "src/build", True, None),
+        ("build/", "src/build", True, True),
+        ("build/", "build", False, None),
+        ("docs/*.md", "docs/index.md", False, True),
+        ("docs/*.md", "docs/api/index.md", False, None),
+        ("docs/**/*.md", "docs/api/index.md", False, True),
+        ("**/node_modules", "web/app/node_modules", True, True),
+        ("node_modules", "web/node_modules/react/index.js", False, True),
+        ("*.py[cod]", "main.pyc", False, True),
+        ("\\#notes", "#notes", False, True),
+    ],
+)
+def test_gitignore_patterns(pattern, path, is_dir, ignored):
+    assert IgnoreRules([pattern]).match(path, is_dir) is ignored
+
+
+def test_last_matching_pattern_wins():
+    rules = IgnoreRules(["*.md", "!README.md", "# comment", ""])
+    assert rules.match("CHANGELOG.md", False) is True
+    assert rules.match("README.md", False) is False
+
+
+def test_nested_gitignore_files_and_pilotignore(tmp_path):
+    (tmp_path / ".gitignore").write_text("*.tmp\n")
+    (tmp_path / ".pilotignore").write_text("secrets/\n")
+    (tmp_path / "web").mkdir()
+    (tmp_path / "web" / ".gitignore").write_text("dist/\n!keep.tmp\n")
+    matcher = IgnoreMatcher(tmp_path)
+    assert matcher.is_ignored("cache.tmp", False)
+    assert matcher.is_ignored("web/dist", True)
+    assert not matcher.is_ignored("dist", True)
+    assert not matcher.is_ignored("web/keep.tmp", False)
+    assert matcher.is_ignored("web/other.tmp", False)
+    assert matcher.is_ignored("secrets", True)
+
+
+def test_file_system_prunes_ignored_directories(tmp_path):
+    (tmp_path / ".gitignore").write_text("node_modules/\n")
+    (tmp_path / "node_modules" / "react").mkdir(parents=True)
+    (tmp_path / "node_modules" / "react" / "index.js").write_text("")
+    (tmp_path / "index.js").write_text("")
+    file_system = FileSystem(tmp_path)
+    assert file_system.exists("index.js")
+    assert not file_system.exists("node_modules")
+    assert file_system.should_be_ignored("node_modules/react/index.js")
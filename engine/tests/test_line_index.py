@@ -0,0 +1,46 @@
+from engine.file_system.line_index import (
+    LineIndexCache,
+    build_line_index,
+    find_line,
+    read_lines,
+)
+
+
+def test_line_index(tmp_path):
+    path = tmp_path / "main.py"
+    path.write_text("one\ntwo\n\nfour")
+    index = build_line_index(path)
+    assert index.line_count == 4
+    assert index.span(2, 3) == (4, 9)
+    assert index.line_at(0) == 1
+    assert index.line_at(9) == 4
+
+    path.write_text("one\n")
+    assert build_line_index(path).line_count == 1
+    path.write_text("")
+    assert build_line_index(path).line_count == 0
+    path.write_bytes(b"\0\1\2")
+    assert build_line_index(path).binary
+
+
+def test_read_and_find_lines(tmp_path):
+    path = tmp_path / "main.py"
+    path.write_text("".join(f"line {i}\n" for i in range(1, 1001)))
+    assert read_lines(path, 10, 11) == "line 10\nline 11\n"
+    assert read_lines(path, 1000, 1000) == "line 1000\n"
+    # Ranges past the end of the file, e.g. of a file that shrank
+    assert read_lines(path, 999, 1200) == "line 999\nline 1000\n"
+    assert read_lines(path, 1001, 1001) == ""
+    assert read_lines(path, 0, 1) == "line 1\n"
+    assert read_lines(path, 5, 4) == ""
+    assert find_line(path, "line 500\n") == 500
+    assert find_line(path, "missing") is None
+
+
+def test_cache_is_reused_until_the_file_changes(tmp_path):
+    cache = LineIndexCache(max_bytes=1024)
+    path = tmp_path / "main.py"
+    path.write_text("a\nb\n")
+    assert cache.read(path) is cache.read(path)
+    path.write_text("a\nb\nc\n")
+    assert cache.read(path).line_count == 3
@@ -0,0 +1,97 @@
+import os
+import subprocess
+
+import pytest
+
+from engine.repository import MirrorCache
+from engine.repository.fetch_planner import FetchPlan
+
+
+def git(cwd, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    )
+
+
+def commit_file(repo_path, name, content):
+    (repo_path / name).write_text(content)
+    git(repo_path, "add", name)
+    git(repo_path, "commit", "-q", "-m", f"Update {name}")
+
+
+@pytest.fixture
+def origin(tmp_path):
+    path = tmp_path / "origin"
+    path.mkdir()
+    git(path, "init", "-q", "-b", "main")
+    commit_file(path, "README.md", "Hello\n")
+    return path
+
+
+def test_sync_creates_and_updates_mirror(origin, tmp_path):
+    cache = MirrorCache(cache_dir=tmp_path / "cache", max_bytes=10**9)
+    mirror = cache.sync("owner/project", origin.as_uri())
+    assert mirror == cache.mirror_path("owner/project")
+    commit_file(origin, "CHANGELOG.md", "New\n")
+    cache.sync("owner/project", origin.as_uri())
+    head = subprocess.run(
+        ["git", "rev-parse", "HEAD"], cwd=origin, capture_output=True, text=True
+    ).stdout.strip()
+    mirrored = subprocess.run(
+        ["git", "rev-parse", "refs/remotes/origin/main"],
+        cwd=mirror,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+    assert mirrored == head
+
+
+def test_least_recently_used_mirror_is_evicted(origin, tmp_path):
+    cache = MirrorCache(cache_dir=tmp_path / "cache", max_bytes=10**9)
+    old_mirror = cache.sync("owner/old", origin.as_uri())
+    os.utime(old_mirror / "pr-pilot-last-used", (0, 0))
+    cache.max_bytes = 1
+    new_mirror = cache.sync("owner/new", origin.as_uri())
+    assert not old_mirror.exists()
+    assert new_mirror.exists()
+
+
+def test_fetch_plan_limits_branches_and_history(origin, tmp_path):
+    for i in range(5):
+        commit_file(origin, "README.md", f"Revision {i}\n")
+    git(origin, "branch", "feature")
+    git(origin, "branch", "unrelated")
+    cache = MirrorCache(cache_dir=tmp_path / "cache", max_bytes=10**9)
+    plan = FetchPlan(branches=["main", "feature"], depth=2)
+    mirror = cache.sync("owner/project", origin.as_uri(), fetch_plan=plan)
+    refs = subprocess.run(
+        ["git", "for-each-ref", "--format=%(refname)"],
+        cwd=mirror,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+    assert refs == ["refs/remotes/origin/feature", "refs/remotes/origin/main"]
+    commits = subprocess.run(
+        ["git", "rev-list", "--count", "origin/main"],
+        cwd=mirror,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+    assert commits == "2"
+    # A plan without a depth needs the full history
+    cache.sync("owner/project", origin.as_uri(), fetch_plan=FetchPlan(["main"]))
+    assert not (mirror / "shallow").exists()
+
+
+def test_size_is_recorded_after_fetch(origin, tmp_path):
+    cache = MirrorCache(cache_dir=tmp_path / "cache", max_bytes=10**9)
+    mirror = cache.sync("owner/project", origin.as_uri())
+    size = cache.size(mirror)
+    assert size == int((mirror / "pr-pilot-size").read_text()) > 0
+    commit_file(origin, "CHANGELOG.md", "New\n" * 1000)
+    cache.sync("owner/project", origin.as_uri())
+    assert cache.size(mirror) > size
+    assert cache.size(tmp_path / "cache" / "owner__missing.git") == 0
@@ -0,0 +1,49 @@
+from engine.file_system.node_store import NodeStore
+
+
+def test_add_find_and_walk():
+    store = NodeStore()
+    src = store.add(0, "src", is_dir=True)
+    main = store.add(src, "main.py", is_dir=False)
+    assert store.find("src/main.py") == main
+    assert store.find("src/main.py/x") is None
+    assert store.find("") == 0
+    assert store.relative_path(main) == "src/main.py"
+    assert list(store.walk()) == [("src", src), ("src/main.py", main)]
+    assert len(store) == 3
+
+
+def test_remove_recycles_nodes():
+    store = NodeStore()
+    src = store.add(0, "src", is_dir=True)
+    store.add(src, "main.py", is_dir=False)
+    store.remove(src)
+    assert store.find("src") is None
+    assert len(store) == 1
+    docs = store.add(0, "docs", is_dir=True)
+    assert docs in (1, 2)
+    assert store.relative_path(docs) == "docs"
+
+
+def test_move_keeps_subtree():
+    store = NodeStore()
+    src = store.add(0, "src", is_dir=True)
+    main = store.add(src, "main.py", is_dir=False)
+    lib = store.add(0, "lib", is_dir=True)
+    store.move(src, lib, "app")
+    assert store.find("lib/app/main.py") == main
+    assert store.find("src") is None
+
+
+def test_paths_follow_moves_and_removals():
+    store = NodeStore()
+    src = store.add(0, "src", is_dir=True)
+    app = store.add(src, "app", is_dir=True, path="src/app")
+    main = store.add(app, "main.py", is_dir=False)
+    store.move(app, 0, "app")
+    assert store.find("app/main.py") == main
+    assert store.find("src/app/main.py") is None
+    store.remove(app)
+    assert store.find("app") is None
+    assert store.find("app/main.py") is None
+    assert store.find("src") == src
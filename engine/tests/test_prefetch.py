@@ -0,0 +1,41 @@
+import json
+import time
+from unittest.mock import MagicMock
+
+from django.conf import settings
+
+from engine.repository import MirrorCache
+from engine.repository.prefetch import (
+    PREFETCH_STATS_KEY,
+    record_prefetch_outcome,
+    schedule_prefetch,
+)
+
+
+def test_prefetch_is_deduplicated_per_repository():
+    redis_client = MagicMock()
+    redis_client.set.side_effect = [True, None]
+    task = MagicMock(github_project="owner/project", installation_id=1, head="feature")
+    schedule_prefetch(redis_client, task)
+    schedule_prefetch(redis_client, task)
+    redis_client.rpush.assert_called_once_with(
+        settings.REDIS_PREFETCH_QUEUE,
+        json.dumps({"github_project": "owner/project", "installation_id": 1}),
+    )
+    assert redis_client.sadd.call_count == 2
+
+
+def test_prefetch_outcome_counts_hits_and_misses(tmp_path):
+    redis_client = MagicMock()
+    cache = MirrorCache(cache_dir=tmp_path, max_bytes=10**9)
+    marker = cache.mirror_path("owner/project").with_suffix(".prefetched")
+    marker.write_text(json.dumps({"time": time.time(), "duration": 2.5}))
+
+    assert record_prefetch_outcome(redis_client, cache, "owner/project")
+    redis_client.hincrbyfloat.assert_called_once_with(
+        PREFETCH_STATS_KEY, "saved_seconds", 2.5
+    )
+    assert not marker.exists()
+
+    assert not record_prefetch_outcome(redis_client, cache, "owner/project")
+    redis_client.hincrby.assert_called_with(PREFETCH_STATS_KEY, "misses", 1)
@@ -0,0 +1,93 @@
+import subprocess
+
+import pytest
+
+from engine.code_search import RelevanceIndex, open_relevance_index
+from engine.code_search.relevance_index import INDEX_DIR, terms
+from engine.file_system import FileSystem
+from engine.repository import GitSession
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / "billing").mkdir()
+    (tmp_path / "billing" / "invoices.py").write_text(
+        'def create_invoice(customer):\n    """Bill a customer for their plan."""\n'
+    )
+    (tmp_path / "users.py").write_text(
+        "class UserAccount:\n    # The customer behind an account\n    pass\n"
+    )
+    (tmp_path / "README.md").write_text("# Project\nHow to run the project.\n")
+    return tmp_path
+
+
+def commit(root):
+    subprocess.run(["git", "add", "-A"], cwd=root, check=True)
+    subprocess.run(
+        ["git", "-c", "user.name=T", "-c", "user.email=t@t", "commit", "-q", "-m", "x"],
+        cwd=root,
+        check=True,
+    )
+
+
+def test_terms():
+    assert terms("BillingAccount_id = bills.get(self)") == {
+        "bill": 2,
+        "account": 1,
+        "id": 1,
+        "get": 1,
+    }
+    assert set(terms("invoice invoices invoiced invoicing")) == {"invoic"}
+    assert set(terms("class classes")) == {"class"}
+
+
+def test_search(root):
+    index = RelevanceIndex.build(root, ["billing/invoices.py", "users.py", "README.md"])
+    assert [path for path, _ in index.search("billing")] == ["billing/invoices.py"]
+    assert [path for path, _ in index.search("customer account")] == [
+        "users.py",
+        "billing/invoices.py",
+    ]
+    assert index.search("customer", "billing") == [
+        result for result in index.search("customer") if result[0].startswith("billing")
+    ]
+    assert index.search("the") == []
+
+
+def test_update_and_compact(root):
+    index = RelevanceIndex.build(root, ["billing/invoices.py", "users.py"])
+    (root / "users.py").write_text("def refund_invoice():\n    pass\n")
+    (root / "billing" / "invoices.py").unlink()
+    index.update(["users.py", "billing/invoices.py"])
+    assert [path for path, _ in index.search("invoice")] == ["users.py"]
+    compacted = index.compact()
+    assert compacted.paths == ["users.py"]
+    assert compacted.search("invoice") == index.search("invoice")
+    assert compacted.search("customer") == []
+
+
+def test_open_relevance_index_reuses_previous_commit(root, monkeypatch):
+    subprocess.run(["git", "init", "-q"], cwd=root, check=True)
+    commit(root)
+    session = GitSession(root)
+    open_relevance_index(FileSystem(root), session)
+    assert len(list((root / ".git" / INDEX_DIR).iterdir())) == 1
+
+    (root / "payments.py").write_text("def charge_card():\n    pass\n")
+    commit(root)
+    built = []
+    monkeypatch.setattr(
+        RelevanceIndex, "build", classmethod(lambda cls, *args: built.append(args))
+    )
+    index = open_relevance_index(FileSystem(root), session)
+    assert not built
+    assert [path for path, _ in index.search("card")] == ["payments.py"]
+    assert [path for path, _ in index.search("billing")] == ["billing/invoices.py"]
+    assert len(list((root / ".git" / INDEX_DIR).iterdir())) == 2
+
+    (root / "users.py").write_text("card = None\n")
+    index = open_relevance_index(FileSystem(root), session)
+    assert sorted(path for path, _ in index.search("card")) == [
+        "payments.py",
+        "users.py",
+    ]
@@ -0,0 +1,104 @@
+import subprocess
+
+import pytest
+
+from engine.code_search import SymbolIndex, load_repository_map
+from engine.code_search.repository_map import MAP_DIR, render_repository_map
+from engine.file_system import FileSystem
+from engine.repository import GitSession
+
+PATHS = ["README.md", "docs/index.md", "engine/project.py", "engine/agents/agent.py"]
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / "engine" / "agents").mkdir(parents=True)
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "index.md").write_text("# Docs\n")
+    (tmp_path / "README.md").write_text("# Project\n")
+    (tmp_path / "engine" / "project.py").write_text(
+        "class Project:\n    def run(self):\n        pass\n\n\n"
+        "def _repo():\n    pass\n\n\nLIMIT = 1\n"
+    )
+    (tmp_path / "engine" / "agents" / "agent.py").write_text(
+        "def create_agent():\n    pass\n"
+    )
+    return tmp_path
+
+
+def test_render_repository_map(root):
+    symbol_index = SymbolIndex.build(root, {path: None for path in PATHS})
+    assert render_repository_map(PATHS, symbol_index, 1000) == (
+        "README.md\n"
+        "docs/\n"
+        "  index.md\n"
+        "engine/\n"
+        "  project.py: Project\n"
+        "  agents/\n"
+        "    agent.py: create_agent"
+    )
+    # Less detail until the map fits
+    assert render_repository_map(PATHS, symbol_index, 92) == (
+        "README.md\n"
+        "docs/ (1 files)\n"
+        "engine/\n"
+        "  project.py: Project\n"
+        "  agents/\n"
+        "    agent.py: create_agent"
+    )
+    assert render_repository_map(PATHS, symbol_index, 70) == (
+        "README.md\ndocs/\n  index.md\nengine/\n  project.py\n  agents/\n    agent.py"
+    )
+    assert render_repository_map(PATHS, symbol_index, 60) == (
+        "docs/ (1 files)\nengine/ (1 files)\n  agents/ (1 files)"
+    )
+    assert render_repository_map(PATHS, symbol_index, 40) == (
+        "docs/ (1 files)\nengine/ (1 files)\n..."
+    )
+
+
+def test_load_repository_map_is_saved_by_tree(root):
+    subprocess.run(["git", "init", "-q"], cwd=root, check=True)
+    subprocess.run(["git", "add", "-A"], cwd=root, check=True)
+    session = GitSession(root)
+    builds = []
+
+    def symbol_index():
+        builds.append(True)
+        return SymbolIndex.build(root, {path: None for path in PATHS})
+
+    subprocess.run(
+        ["git", "-c", "user.name=T", "-c", "user.email=t@t", "commit", "-q", "-m", "x"],
+        cwd=root,
+        check=True,
+    )
+    text = load_repository_map(FileSystem(root), session, symbol_index, 1000)
+    assert "project.py: Project" in text
+    assert len(list((root / ".git" / MAP_DIR).iterdir())) == 1
+    assert load_repository_map(FileSystem(root), session, symbol_index, 1000) == text
+    assert len(builds) == 1
+
+    # Uncommitted changes are rendered, not saved
+    (root / "engine" / "new.py").write_text("class New:\n    pass\n")
+    text = load_repository_map(
+        FileSystem(root),
+        session,
+        lambda: SymbolIndex.build(root, {"engine/new.py": None}),
+        1000,
+    )
+    assert "new.py: New" in text
+    assert len(list((root / ".git" / MAP_DIR).iterdir())) == 1
+
+
+def test_load_repository_map_without_git(root):
+    text = load_repository_map(
+        FileSystem(root), None, lambda: SymbolIndex.build(root, {}), 1000
+    )
+    assert text.startswith("README.md\ndocs/\n  index.md\nengine/\n  project.py\n")
+
+
+def test_project_leaves_out_a_disabled_map(settings):
+    from engine.project import Project
+
+    settings.REPOSITORY_MAP_MAX_CHARS = 0
+    assert Project(name="owner/project", main_branch="main").load_repository_map() == ""
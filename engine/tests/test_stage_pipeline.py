@@ -0,0 +1,25 @@
+import time
+
+from engine.stage_pipeline import StagePipeline
+from engine.util import current_task_id, get_current_task_id
+
+
+def test_background_stages_overlap_and_are_timed():
+    pipeline = StagePipeline()
+    token = current_task_id.set("task-1")
+    try:
+        future = pipeline.submit(
+            "background", lambda: (time.sleep(0.2), get_current_task_id())[1]
+        )
+        pipeline.run("foreground", time.sleep, 0.2)
+        assert future.result() == "task-1"
+    finally:
+        current_task_id.reset(token)
+        pipeline.shutdown()
+    background, foreground = (
+        pipeline.timings["background"],
+        pipeline.timings["foreground"],
+    )
+    assert background["duration"] >= 0.2
+    assert foreground["duration"] >= 0.2
+    assert abs(background["start"] - foreground["start"]) < 0.1
@@ -0,0 +1,151 @@
+import subprocess
+
+import pytest
+
+from engine.code_search import SymbolIndex, open_symbol_index
+from engine.code_search.symbol_index import blob_sha, symbol_cache
+from engine.code_search.symbol_parsers import Definition, parse_python, parser_for
+from engine.file_system import FileSystem
+from engine.repository import GitSession
+
+MODELS = """\
+import os
+
+LIMIT = 10
+
+
+class User:
+    name: str = ""
+
+    def greet(self):
+        return os.path.join(self.name, "hi")
+
+
+async def load_user():
+    user = User()
+    return user.greet()
+"""
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / "models.py").write_text(MODELS)
+    (tmp_path / "app.ts").write_text(
+        "export class App {}\nexport function start() {\n  return new App();\n}\n"
+    )
+    (tmp_path / "README.md").write_text("User\n")
+    return tmp_path
+
+
+@pytest.fixture(autouse=True)
+def clear_symbol_cache():
+    symbol_cache.clear()
+    yield
+    symbol_cache.clear()
+
+
+def test_parse_python():
+    symbols = parse_python(MODELS)
+    assert symbols.definitions == [
+        Definition("LIMIT", "variable", "LIMIT", 3, 3),
+        Definition("User", "class", "User", 6, 10),
+        Definition("name", "variable", "User.name", 7, 7),
+        Definition("greet", "method", "User.greet", 9, 10),
+        Definition("load_user", "function", "load_user", 13, 15),
+    ]
+    assert ("User", 14) in symbols.references
+    assert ("greet", 15) in symbols.references
+    assert ("user", 14) not in symbols.references  # Assigned, not used
+    assert parse_python("def broken(:\n").definitions == []
+
+
+def test_regex_parser():
+    symbols = parser_for("web/app.ts").parse(
+        "export class App {}\nconst start = () => new App();\n"
+    )
+    assert [(d.name, d.kind, d.line) for d in symbols.definitions] == [
+        ("App", "class", 1),
+        ("start", "variable", 2),
+    ]
+    assert symbols.references == [("App", 2)]
+    assert parser_for("README.md") is None
+
+
+def test_brace_blocks():
+    symbols = parser_for("Service.java").parse(
+        "public class Service {\n"
+        '    private String name = "}";\n'
+        "    public List<User> findAll(String name,\n"
+        "                              int limit) {\n"
+        "        return repo.find(name);\n"
+        "    }\n"
+        "}\n"
+    )
+    assert [
+        (d.qualified_name, d.kind, d.line, d.end_line) for d in symbols.definitions
+    ] == [
+        ("Service", "class", 1, 7),
+        ("Service.findAll", "method", 3, 6),
+    ]
+    symbols = parser_for("app.ts").parse(
+        "export class App {\n  async start() {\n    const s = 1;\n  }\n}\ntype Id = string;\n"
+    )
+    assert [(d.qualified_name, d.line, d.end_line) for d in symbols.definitions] == [
+        ("App", 1, 5),
+        ("App.start", 2, 4),
+        ("Id", 6, 6),
+    ]
+
+
+def test_outline():
+    assert parse_python(MODELS).outline() == [
+        "variable LIMIT (lines 3-3)",
+        "class User (lines 6-10)",
+        "  variable name (lines 7-7)",
+        "  method greet (lines 9-10)",
+        "function load_user (lines 13-15)",
+    ]
+
+
+def test_definitions_and_references(root):
+    index = SymbolIndex.build(root, {"models.py": None, "app.ts": None})
+    assert [(path, d.line) for path, d in index.definitions("User")] == [
+        ("models.py", 6)
+    ]
+    assert [d.qualified_name for _, d in index.definitions("User.greet")] == [
+        "User.greet"
+    ]
+    assert index.definitions("Other.greet") == []
+    assert index.references("greet") == [("models.py", 15)]
+    assert index.references("App") == [("app.ts", 3)]
+    assert index.references("App", "*.py") == []
+
+    (root / "models.py").write_text("def greet():\n    pass\n")
+    (root / "app.ts").unlink()
+    index.update(["models.py", "app.ts"])
+    assert index.definitions("User") == []
+    assert [d.kind for _, d in index.definitions("greet")] == ["function"]
+    assert index.references("App") == []
+
+
+def test_parse_results_are_cached_by_blob_sha(root):
+    (root / "copy.py").write_text(MODELS)
+    SymbolIndex.build(root, {"models.py": None, "copy.py": None})
+    assert (symbol_cache.misses, symbol_cache.hits) == (1, 1)
+
+
+def test_open_symbol_index_caches_on_disk(root):
+    subprocess.run(["git", "init", "-q"], cwd=root, check=True)
+    subprocess.run(["git", "add", "-A"], cwd=root, check=True)
+    session = GitSession(root)
+    index = open_symbol_index(FileSystem(root), session)
+    assert sorted(index.files) == ["app.ts", "models.py"]
+    sha = blob_sha(MODELS.encode())
+    assert (root / ".git" / "pr-pilot-symbols" / "python-1" / sha[:2]).is_dir()
+
+    # Unchanged files are looked up by the SHA git has, without reading them
+    symbol_cache.clear()
+    (root / "app.ts").write_text("export class Changed {}\n")
+    index = open_symbol_index(FileSystem(root), session)
+    assert symbol_cache.hits == 1
+    assert [path for path, _ in index.definitions("Changed")] == ["app.ts"]
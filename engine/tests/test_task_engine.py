@@ -67,11 +67,10 @@ def mock_project_class():
 
 
 @pytest.fixture(autouse=True)
-def mock_repo_class():
-    with patch("engine.task_engine.Repo") as MockClass:
-        MockClass.return_value = MagicMock(
-            branches=[],
-            active_branch=MagicMock(name="main"),
+def mock_workspace_class():
+    with patch("engine.task_engine.Workspace") as MockClass:
+        MockClass.current.return_value = MagicMock(
+            git=MagicMock(branch_names=MagicMock(return_value=set())),
         )
         yield
 
@@ -115,3 +114,48 @@ def test_task_status_set_correctly(
     task.refresh_from_db()
     assert task.status == "completed"
     # Additional assertions can be made for different scenarios, such as when an exception occurs
+
+
+@pytest.mark.django_db
+def test_stage_timings_are_recorded(
+    mock_generate_pr_info, mock_project_from_github, mock_task_project, task
+):
+    TaskEngine(task).run()
+    task.refresh_from_db()
+    assert {"clone_repo", "agent", "respond_to_user", "create_bill"} <= set(
+        task.stage_timings
+    )
+
+
+@pytest.mark.django_db
+def test_agent_starts_without_slow_repository_map(
+    mock_generate_pr_info, mock_project_from_github, mock_task_project, task, settings
+):
+    import threading
+
+    settings.REPOSITORY_MAP_WAIT_SECONDS = 0.01
+    done = threading.Event()
+    task_engine = TaskEngine(task)
+    task_engine.project.load_repository_map = lambda: done.wait(5) and "map"
+    invoke = task_engine.executor.invoke
+    invoke.side_effect = lambda inputs: done.set() or {"output": "Test Output"}
+    task_engine.run()
+    assert invoke.call_args.args[0]["repository_map"] == ""
+    assert "repository_map" in task_engine.task.stage_timings
+
+
+@pytest.mark.django_db
+def test_pr_on_the_main_branch_is_refused(
+    mock_generate_pr_info, mock_project_from_github, mock_task_project, task
+):
+    task.pr_number = 1
+    task.head = "main"
+    task.save()
+    task_engine = TaskEngine(task)
+    task_engine.project.main_branch = "main"
+    task_engine.run()
+    task.refresh_from_db()
+    assert task.status == "failed"
+    assert task.result == "Cannot work on the main branch main."
+    task_engine.executor.invoke.assert_not_called()
+    task_engine.project.push_branch.assert_not_called()
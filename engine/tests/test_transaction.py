@@ -0,0 +1,144 @@
+import os
+import stat
+from pathlib import Path
+
+import pytest
+
+from engine.file_system import FileSystem
+from engine.file_system.transaction import FileTransaction, TransactionError
+
+
+@pytest.fixture
+def file_system(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "shop.py").write_text(
+        "def total(prices):\n    return sum(prices)\n"
+    )
+    (tmp_path / "src" / "old.py").write_text("OLD = True\n")
+    (tmp_path / "README.md").write_text("# Shop\n")
+    return FileSystem(tmp_path)
+
+
+def edit(search, replace):
+    return f"<<<<<<< SEARCH\n{search}\n=======\n{replace}\n>>>>>>> REPLACE\n"
+
+
+def test_commit_applies_all_operations(file_system):
+    root = file_system.root_directory
+    transaction = FileTransaction(file_system)
+    transaction.edit(
+        "src/shop.py", edit("def total(prices):", "def total(prices, tax=0):")
+    )
+    transaction.move("src/old.py", "src/legacy/old.py")
+    transaction.write("src/new.py", "NEW = True\n")
+    transaction.delete("README.md")
+    # Later operations see the result of earlier ones
+    transaction.edit("src/new.py", edit("NEW = True", "NEW = False"))
+    assert not (root / "src" / "new.py").exists()
+
+    paths = transaction.commit()
+
+    assert sorted(paths) == [
+        "README.md",
+        "src/legacy/old.py",
+        "src/new.py",
+        "src/old.py",
+        "src/shop.py",
+    ]
+    assert (
+        (root / "src" / "shop.py").read_text().startswith("def total(prices, tax=0):")
+    )
+    assert (root / "src" / "legacy" / "old.py").read_text() == "OLD = True\n"
+    assert (root / "src" / "new.py").read_text() == "NEW = False\n"
+    assert not (root / "src" / "old.py").exists()
+    assert not (root / "README.md").exists()
+    assert file_system.get_node(Path("src/legacy/old.py")) is not None
+    assert file_system.get_node(Path("src/new.py")) is not None
+    assert file_system.get_node(Path("src/old.py")) is None
+    assert file_system.get_node(Path("README.md")) is None
+
+
+@pytest.mark.parametrize(
+    "operation",
+    [
+        lambda t: t.edit("src/shop.py", edit("def missing():", "")),
+        lambda t: t.edit("src/missing.py", edit("a", "b")),
+        lambda t: t.delete("src/missing.py"),
+        lambda t: t.move("src/missing.py", "src/other.py"),
+        lambda t: t.write("src", "not a file"),
+        lambda t: t.write("../outside.py", "print('escaped')\n"),
+    ],
+)
+def test_invalid_operations_are_rejected(file_system, operation):
+    transaction = FileTransaction(file_system)
+    transaction.write("src/new.py", "NEW = True\n")
+    with pytest.raises(TransactionError):
+        operation(transaction)
+    assert not (file_system.root_directory / "src" / "new.py").exists()
+
+
+def test_failed_write_rolls_back(file_system, monkeypatch):
+    root = file_system.root_directory
+    transaction = FileTransaction(file_system)
+    transaction.write("README.md", "# Changed\n")
+    transaction.delete("src/old.py")
+    transaction.write("src/new.py", "NEW = True\n")
+    replace = os.replace
+
+    def fail_for_new_files(source, destination):
+        if Path(destination).name == "new.py":
+            raise OSError("Disk full")
+        replace(source, destination)
+
+    monkeypatch.setattr("engine.file_system.transaction.os.replace", fail_for_new_files)
+    with pytest.raises(OSError):
+        transaction.commit()
+
+    assert (root / "README.md").read_text() == "# Shop\n"
+    assert (root / "src" / "old.py").read_text() == "OLD = True\n"
+    assert sorted(path.name for path in (root / "src").iterdir()) == [
+        "old.py",
+        "shop.py",
+    ]
+    assert file_system.get_node(Path("src/old.py")) is not None
+
+
+def test_diff_and_unchanged_files(file_system):
+    transaction = FileTransaction(file_system)
+    transaction.write("README.md", "# Shop\n")
+    transaction.write("src/old.py", "OLD = False\n")
+    assert transaction.paths == ["src/old.py"]
+    assert transaction.diff() == (
+        "--- a/src/old.py\n+++ b/src/old.py\n@@ -1 +1 @@\n-OLD = True\n+OLD = False\n"
+    )
+
+
+def test_modes_and_symlinks_are_kept(file_system):
+    root = file_system.root_directory
+    script = root / "build.sh"
+    script.write_text("echo build\n")
+    script.chmod(0o755)
+    (root / "link.py").symlink_to("src/old.py")
+    transaction = FileTransaction(file_system)
+    transaction.edit("build.sh", edit("echo build", "echo test"))
+    transaction.move("build.sh", "scripts/test.sh")
+    transaction.write("link.py", "OLD = False\n")
+    assert "src/old.py" in transaction.commit()
+
+    moved = root / "scripts" / "test.sh"
+    assert moved.read_text() == "echo test\n"
+    assert stat.S_IMODE(moved.stat().st_mode) == 0o755
+    assert (root / "link.py").is_symlink()
+    assert (root / "src" / "old.py").read_text() == "OLD = False\n"
+    assert file_system.get_node(Path("src/old.py")).content == "OLD = False\n"
+
+
+def test_edit_keeps_executable_bit(file_system):
+    script = file_system.root_directory / "build.sh"
+    script.write_text("echo build\n")
+    script.chmod(0o755)
+    transaction = FileTransaction(file_system)
+    transaction.edit("build.sh", edit("echo build", "echo test"))
+    transaction.commit()
+    assert script.read_text() == "echo test\n"
+    assert stat.S_IMODE(script.stat().st_mode) == 0o755
@@ -0,0 +1,97 @@
+import subprocess
+
+import pytest
+
+from engine.code_search import TrigramIndex, open_index
+from engine.code_search.regex_query import AllOf, AnyOf, Literal, required_literals
+from engine.code_search.trigram_index import path_filter
+from engine.file_system import FileSystem
+from engine.repository import GitSession
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "views.py").write_text(
+        "class UserController:\n    pass\n\n\ndef handle_request():\n    pass\n"
+    )
+    (tmp_path / "src" / "models.py").write_text("class User:\n    name = ''\n")
+    (tmp_path / "src" / "main.c").write_text("int main() { return 0; }\n")
+    (tmp_path / "logo.bin").write_bytes(b"\0Controller")
+    return tmp_path
+
+
+def test_required_literals():
+    assert required_literals(r"def \w+_handler") == AllOf(
+        [Literal("def "), Literal("_handler")]
+    )
+    assert required_literals("(Foo|Bar)Baz") == AllOf(
+        [AnyOf([Literal("Foo"), Literal("Bar")]), Literal("Baz")]
+    )
+    assert required_literals(r"\w+(?:abc)?") is None
+
+
+def test_candidates_and_search(root):
+    index = TrigramIndex.build(
+        root, ["src/views.py", "src/models.py", "src/main.c", "logo.bin"]
+    )
+    assert "logo.bin" not in index.paths
+    assert index.candidates("Controller") == ["src/views.py"]
+    assert index.candidates("(?i)CLASS user") == ["src/views.py", "src/models.py"]
+    assert list(index.search(r"def \w+_request")) == [
+        "src/views.py:5:def handle_request():"
+    ]
+    assert list(index.search("pass")) == [
+        "src/views.py:2:    pass",
+        "src/views.py:6:    pass",
+    ]
+    assert list(index.search("main|User", "*.{c,h}")) == [
+        "src/main.c:1:int main() { return 0; }"
+    ]
+
+
+def test_search_windows(root):
+    (root / "src" / "long.py").write_text("".join(f"line {i}\n" for i in range(1, 21)))
+    index = TrigramIndex.build(root, ["src/long.py", "src/views.py"])
+    windows = list(index.search_windows(r"line (3|5|15)$", context=1))
+    assert [(w.path, w.start, w.end, w.matches) for w in windows] == [
+        ("src/long.py", 2, 6, [3, 5]),
+        ("src/long.py", 14, 16, [15]),
+    ]
+    assert windows[1].lines == ["line 14", "line 15", "line 16"]
+    windows = list(index.search_windows("pass", "src/views.py", context=5))
+    assert [(w.start, w.end, w.matches) for w in windows] == [(1, 6, [2, 6])]
+
+
+def test_update(root):
+    index = TrigramIndex.build(root, ["src/views.py", "src/models.py"])
+    (root / "src" / "models.py").write_text("class Controller:\n    pass\n")
+    (root / "src" / "views.py").unlink()
+    index.update(["src/models.py", "src/views.py"])
+    assert list(index.search("Controller")) == ["src/models.py:1:class Controller:"]
+
+
+def test_path_filter():
+    assert path_filter("src")("src/app/main.py")
+    assert not path_filter("src")("srcs/main.py")
+    assert path_filter("*.{c,h}")("lib/util.h")
+    assert path_filter("")("anything")
+
+
+def test_open_index_saves_clean_checkouts(root):
+    subprocess.run(["git", "init", "-q"], cwd=root, check=True)
+    subprocess.run(["git", "add", "-A"], cwd=root, check=True)
+    subprocess.run(
+        ["git", "-c", "user.name=T", "-c", "user.email=t@t", "commit", "-q", "-m", "x"],
+        cwd=root,
+        check=True,
+    )
+    session = GitSession(root)
+    index = open_index(FileSystem(root), session)
+    assert list((root / ".git" / "pr-pilot-search").iterdir())
+
+    (root / "src" / "new.py").write_text("Controller = None\n")
+    loaded = open_index(FileSystem(root), session)
+    assert loaded is not index
+    assert loaded.candidates("Controller") == ["src/views.py", "src/new.py"]
+    session.close()
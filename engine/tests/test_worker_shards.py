@@ -0,0 +1,34 @@
+from django.conf import settings
+
+from engine.repository import worker_shards
+from engine.repository.worker_shards import (
+    own_prefetch_queue,
+    own_task_queues,
+    prefetch_queue,
+    repository_shard,
+    task_queue,
+)
+
+
+def test_single_shard_uses_plain_queues():
+    assert task_queue("owner/project") == settings.REDIS_QUEUE
+    assert prefetch_queue("owner/project") == settings.REDIS_PREFETCH_QUEUE
+    assert own_task_queues() == [settings.REDIS_QUEUE]
+
+
+def test_tasks_and_prefetches_of_a_repository_go_to_one_worker(settings, monkeypatch):
+    settings.TASK_WORKER_SHARDS = 2
+    settings.TASK_WORKER_SHARD = None
+    projects = [f"owner/project-{i}" for i in range(20)]
+    assert {repository_shard(project) for project in projects} == {0, 1}
+    project = next(project for project in projects if repository_shard(project) == 1)
+    assert task_queue(project) == f"{settings.REDIS_QUEUE}:1"
+    assert prefetch_queue(project) == f"{settings.REDIS_PREFETCH_QUEUE}:1"
+
+    monkeypatch.setattr(
+        worker_shards.socket, "gethostname", lambda: "pr-pilot-worker-1"
+    )
+    assert own_task_queues() == [task_queue(project), settings.REDIS_QUEUE]
+    assert own_prefetch_queue() == prefetch_queue(project)
+    settings.TASK_WORKER_SHARD = "0"
+    assert own_prefetch_queue() == f"{settings.REDIS_PREFETCH_QUEUE}:0"
@@ -0,0 +1,195 @@
+import os
+import subprocess
+
+import pytest
+
+from engine.project import Project
+from engine.repository.fetch_planner import FetchPlan
+from engine.repository import (
+    BLOBLESS_FILTER,
+    MirrorCache,
+    Workspace,
+    WorktreePool,
+)
+from engine.tests.test_mirror_cache import commit_file, git
+
+
+@pytest.fixture
+def origin(tmp_path):
+    path = tmp_path / "origin"
+    path.mkdir()
+    git(path, "init", "-q", "-b", "main")
+    git(path, "config", "uploadpack.allowFilter", "true")
+    commit_file(path, "README.md", "Hello\n")
+    for directory in ("docs", "src"):
+        (path / directory).mkdir()
+        commit_file(path, f"{directory}/index.md", f"{directory}\n")
+    return path
+
+
+@pytest.fixture
+def pool(tmp_path):
+    cache = MirrorCache(cache_dir=tmp_path / "cache", max_bytes=10**9)
+    return WorktreePool(mirror_cache=cache, pool_dir=tmp_path / "pool", max_idle=1)
+
+
+def test_worktrees_are_isolated_and_recycled(origin, pool):
+    first = pool.acquire("owner/project", origin.as_uri(), "main")
+    second = pool.acquire("owner/project", origin.as_uri(), "main")
+    assert first.path != second.path
+    assert (first.path / "README.md").read_text() == "Hello\n"
+    (first.path / "scratch.txt").write_text("leftover")
+    (first.path / "README.md").write_text("changed")
+    pool.release(first)
+    pool.release(second)
+    assert not second.path.exists()
+    recycled = pool.acquire("owner/project", origin.as_uri(), "main")
+    assert recycled.path == first.path
+    assert not (recycled.path / "scratch.txt").exists()
+    assert (recycled.path / "README.md").read_text() == "Hello\n"
+
+
+def test_blobless_sparse_worktree(origin, pool):
+    worktree = pool.acquire(
+        "owner/project",
+        origin.as_uri(),
+        "main",
+        blob_filter=BLOBLESS_FILTER,
+        sparse_paths=["src"],
+    )
+    assert worktree.blob_filter == BLOBLESS_FILTER
+    assert worktree.fetched_bytes > 0
+    assert (worktree.path / "README.md").exists()
+    assert (worktree.path / "src" / "index.md").exists()
+    assert not (worktree.path / "docs").exists()
+
+
+@pytest.mark.django_db
+def test_materialize_adds_path_to_sparse_checkout(origin, pool, task):
+    worktree = pool.acquire(
+        "owner/project",
+        origin.as_uri(),
+        "main",
+        blob_filter=BLOBLESS_FILTER,
+        sparse_paths=["src"],
+    )
+    Workspace(root=worktree.path).activate(task.id)
+    try:
+        file_system = Workspace.current().file_system
+        assert not file_system.exists("docs/index.md")
+        assert Project.materialize("docs/index.md")
+        assert (worktree.path / "docs" / "index.md").read_text() == "docs\n"
+        assert file_system.exists("docs/index.md")
+        assert not Project.materialize("missing.md")
+    finally:
+        Workspace.deactivate(task.id)
+
+
+def test_release_deletes_branch_of_task(origin, pool):
+    worktree = pool.acquire("owner/project", origin.as_uri(), "main")
+    git(worktree.path, "checkout", "-q", "-b", "pr-pilot/fix")
+    worktree.branch = "pr-pilot/fix"
+    # Tasks go back to the default branch after pushing
+    git(worktree.path, "checkout", "-q", "--detach", "origin/main")
+    pool.release(worktree)
+    branches = subprocess.run(
+        ["git", "branch", "--list", "pr-pilot/*"],
+        cwd=worktree.mirror,
+        capture_output=True,
+        text=True,
+    ).stdout
+    assert branches == ""
+
+
+@pytest.mark.django_db
+def test_tasks_on_the_same_pr_branch(origin, pool, task):
+    git(origin, "checkout", "-q", "-b", "feature")
+    commit_file(origin, "feature.md", "Feature\n")
+    git(origin, "checkout", "-q", "main")
+    project = Project(name="owner/project", main_branch="main")
+    first, second = [
+        pool.acquire("owner/project", origin.as_uri(), "main") for _ in range(2)
+    ]
+    for worktree in (first, second):
+        Workspace(root=worktree.path).activate(task.id)
+        try:
+            project.checkout_branch("feature")
+        finally:
+            Workspace.deactivate(task.id)
+        assert (worktree.path / "feature.md").read_text() == "Feature\n"
+    # A shared local branch would be checked out in both worktrees, which
+    # recent git versions refuse
+    local_branches = subprocess.run(
+        ["git", "branch", "--list", "feature"],
+        cwd=first.mirror,
+        capture_output=True,
+        text=True,
+    ).stdout
+    assert local_branches == ""
+    commit_file(first.path, "feature.md", "Changed\n")
+    Workspace(root=first.path).activate(task.id)
+    try:
+        project.push_branch("feature")
+    finally:
+        Workspace.deactivate(task.id)
+    pushed = subprocess.run(
+        ["git", "show", "feature:feature.md"],
+        cwd=origin,
+        capture_output=True,
+        text=True,
+    ).stdout
+    assert pushed == "Changed\n"
+
+
+def test_mirrors_with_idle_worktrees_are_evicted(origin, pool):
+    cache = pool.mirror_cache
+    idle = pool.acquire("owner/idle", origin.as_uri(), "main")
+    pool.release(idle)
+    leased = pool.acquire("owner/leased", origin.as_uri(), "main")
+    for worktree in (idle, leased):
+        os.utime(worktree.mirror / "pr-pilot-last-used", (0, 0))
+    cache.max_bytes = 1
+    current = pool.acquire("owner/current", origin.as_uri(), "main")
+    assert not idle.mirror.exists()
+    assert not idle.path.exists()
+    assert leased.mirror.exists()
+    assert current.mirror.exists()
+    # The idle worktree went with its mirror, so a new one is added
+    cache.max_bytes = 10**9
+    recreated = pool.acquire("owner/idle", origin.as_uri(), "main")
+    assert recreated.path != idle.path
+    assert (recreated.path / "README.md").read_text() == "Hello\n"
+
+
+def test_shallow_sync_keeps_history_of_running_tasks(origin, pool):
+    plan = FetchPlan(branches=["main"], depth=1)
+    running = pool.acquire("owner/project", origin.as_uri(), "main", fetch_plan=plan)
+    commit_file(running.path, "task.md", "Work of the task\n")
+    commit_file(origin, "README.md", "Moved on\n")
+    pool.acquire("owner/project", origin.as_uri(), "main", fetch_plan=plan)
+    merge_base = subprocess.run(
+        ["git", "merge-base", "origin/main", "HEAD"],
+        cwd=running.path,
+        capture_output=True,
+        text=True,
+    )
+    assert merge_base.returncode == 0
+    diff = subprocess.run(
+        ["git", "diff", "--name-only", "origin/main...HEAD"],
+        cwd=running.path,
+        capture_output=True,
+        text=True,
+    ).stdout
+    assert diff == "task.md\n"
+
+
+@pytest.mark.django_db
+def test_pull_request_needs_a_head_branch(origin, pool, task):
+    worktree = pool.acquire("owner/project", origin.as_uri(), "main")
+    project = Project(name="owner/project", main_branch="main")
+    Workspace(root=worktree.path).activate(task.id)
+    try:
+        with pytest.raises(ValueError, match="without a head branch"):
+            project.create_pull_request("Title", "Body", head=None)
+    finally:
+        Workspace.deactivate(task.id)
@@ -1,9 +1,18 @@
 import os
 import re
+from contextvars import ContextVar
 
 from django.conf import settings
 from django.core.management import call_command
 
+# ID of the task running in the current thread, so one worker can run several tasks
+current_task_id: ContextVar = ContextVar("current_task_id", default=None)
+
+
+def get_current_task_id():
+    """Return the ID of the current task, falling back to settings.TASK_ID."""
+    return current_task_id.get() or settings.TASK_ID
+
 
 def slugify(text: str) -> str:
     """Remove special characters from a string."""
@@ -226,8 +226,36 @@ PRIVATE_KEY_PATH = os.getenv(
 )
 TASK_ID = os.getenv("TASK_ID")
 REPO_DIR = os.getenv("REPO_DIR", "/repo")
+# Bare mirrors of repositories, reused across tasks on the same worker
+REPO_CACHE_DIR = os.getenv("REPO_CACHE_DIR", "/repo-cache")
+REPO_CACHE_MAX_BYTES = int(os.getenv("REPO_CACHE_MAX_BYTES", 10 * 1024**3))
+# Worktrees of the mirrors, recycled between tasks
+WORKTREE_POOL_DIR = os.getenv("WORKTREE_POOL_DIR", "/repo-worktrees")
+WORKTREE_POOL_SIZE = int(os.getenv("WORKTREE_POOL_SIZE", 2))  # Idle per repository
+# Keep the file trees of worktrees in sync with the disk: inotify, poll, auto or off
+FILE_SYSTEM_WATCHER = os.getenv("FILE_SYSTEM_WATCHER", "off")
+# Compare the watched tree with a full rescan after every sync, for debugging
+FILE_SYSTEM_WATCHER_CHECK = (
+    os.getenv("FILE_SYSTEM_WATCHER_CHECK", "false").lower() == "true"
+)
+# Repositories larger than this are cloned without blobs unless configured otherwise
+PARTIAL_CLONE_SIZE_THRESHOLD_KB = int(
+    os.getenv("PARTIAL_CLONE_SIZE_THRESHOLD_KB", 1024 * 1024)
+)
 MAX_FILE_LINES = 600
+MAX_FILE_BYTES = 8 * 1024**2  # Larger files are not read
+CONTENT_CACHE_MAX_BYTES = int(os.getenv("CONTENT_CACHE_MAX_BYTES", 64 * 1024**2))
+LINE_INDEX_CACHE_MAX_BYTES = 16 * 1024**2
+CODE_SEARCH_INDEXES_PER_REPOSITORY = 3  # Saved trigram indexes, by commit
+MAX_CODE_SEARCH_LINES = 150
+MAX_CODE_SEARCH_CHARS = 16_000  # About 4000 tokens
 MAX_FILE_SEARCH_RESULTS = 50
+MAX_RELEVANT_FILES = 10
+# Outline of the repository in the prompt, 0 leaves it out
+REPOSITORY_MAP_MAX_CHARS = int(os.getenv("REPOSITORY_MAP_MAX_CHARS", 8000))
+# The agent starts without the map if building it takes longer
+REPOSITORY_MAP_WAIT_SECONDS = float(os.getenv("REPOSITORY_MAP_WAIT_SECONDS", 3))
+SYMBOL_CACHE_ENTRIES = 50_000  # Parsed files kept in memory, by blob SHA
 MAX_READ_FILES = 5
 IGNORE_FILE_PATH = Path(os.getcwd()) / ".pilotignore"
 CREDIT_MULTIPLIER = 2
@@ -311,5 +339,15 @@ TASK_RATE_LIMIT = 10  # per 10 minutes
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = os.getenv("REDIS_PORT", 6379)
 REDIS_QUEUE = os.getenv("REDIS_QUEUE", "tasks")
+TASK_WORKER_CONCURRENCY = int(os.getenv("TASK_WORKER_CONCURRENCY", 1))
+REDIS_PREFETCH_QUEUE = os.getenv("REDIS_PREFETCH_QUEUE", "prefetch")
+PREFETCH_DEDUPE_SECONDS = 120
+PREFETCH_MAX_AGE_SECONDS = 900  # Older prefetches count as misses
+# Repository mirrors live on the disk of each worker. Tasks and prefetch hints
+# of a repository go to the queues of one worker, chosen by hashing its name,
+# so they find its mirror warm. Set to the number of worker replicas.
+TASK_WORKER_SHARDS = int(os.getenv("TASK_WORKER_SHARDS", 1))
+# Shard of this worker, by default the ordinal of its StatefulSet pod name
+TASK_WORKER_SHARD = os.getenv("TASK_WORKER_SHARD")
 
 DEFAULT_GPT_MODEL = "gpt-4-turbo"
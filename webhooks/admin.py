@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from webhooks.models import GitHubAppInstallation
+from webhooks.models import GitHubAppInstallation, GithubRepository
 
 
 class GitHubAppInstallationAdmin(admin.ModelAdmin):
@@ -18,5 +18,12 @@ class GitHubAppInstallationAdmin(admin.ModelAdmin):
     )  # Specify fields to filter by
 
 
+class GithubRepositoryAdmin(admin.ModelAdmin):
+    list_display = ("full_name", "clone_mode")
+    search_fields = ["full_name"]
+    list_filter = ("clone_mode",)
+
+
 # Register your models here.
 admin.site.register(GitHubAppInstallation)
+admin.site.register(GithubRepository, GithubRepositoryAdmin)
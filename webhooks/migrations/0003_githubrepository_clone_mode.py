@@ -0,0 +1,27 @@
+# Generated by Django 5.0.3 on 2026-10-18 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webhooks", "0002_githubrepository"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="githubrepository",
+            name="clone_mode",
+            field=models.CharField(
+                choices=[("auto", "auto"), ("full", "full"), ("blobless", "blobless")],
+                default="auto",
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="githubrepository",
+            name="sparse_checkout_paths",
+            field=models.TextField(blank=True, default=""),
+        ),
+    ]
@@ -1,3 +1,5 @@
+from enum import Enum
+
 from django.db import models
 
 
@@ -11,6 +13,12 @@ class GitHubAccount(models.Model):
         return self.login
 
 
+class CloneMode(Enum):
+    AUTO = "auto"
+    FULL = "full"
+    BLOBLESS = "blobless"
+
+
 class GithubRepository(models.Model):
     id = models.IntegerField(unique=True, primary_key=True)
     full_name = models.CharField(max_length=255)
@@ -18,6 +26,13 @@ class GithubRepository(models.Model):
     installation = models.ForeignKey(
         "GitHubAppInstallation", on_delete=models.CASCADE, related_name="repositories"
     )
+    clone_mode = models.CharField(
+        max_length=20,
+        choices=[(mode.value, mode.value) for mode in CloneMode],
+        default=CloneMode.AUTO.value,
+    )
+    # Newline-separated directories to check out, everything if empty
+    sparse_checkout_paths = models.TextField(blank=True, default="")
 
 
 class GitHubAppInstallation(models.Model):